@@ -1,5 +1,6 @@
 from typing import Dict, Any, List
 from app.logging_utils import JsonSqlLogger
+from app import artifacts
 from utils import csv_utils
 
 
@@ -7,7 +8,7 @@ def run(state: Dict[str, Any], settings, logger: JsonSqlLogger) -> Dict[str, Any
     run_id = state.get("run_id", "")
     rows: List[Dict[str, Any]] = state.get("data") or []
     try:
-        csv_path = csv_utils.write_csv_rows(rows)
+        csv_path = artifacts.save(logger.db, run_id, "data", ".csv", lambda tmp: csv_utils.write_csv_rows(rows, tmp))
         logger.info(run_id, "csv", "csv_created", {"path": csv_path})
         return {"status": "success", "data": {"csv_path": csv_path}, "log": {"event": "csv_created"}}
     except Exception as e:
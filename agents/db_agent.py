@@ -1,21 +1,26 @@
-from typing import Dict, Any, List
+import time
+from typing import Dict, Any, List, Optional
 from app.logging_utils import JsonSqlLogger
-from mcp_client import call_mcp_tool_sync
+from mcp_client import call_mcp_tool_sync, call_mcp_tools_sync
+from app import metrics
+from utils import chart_utils, db_utils, incremental_utils, pdf_utils, sql_tokens
 
 
 def run(state: Dict[str, Any], settings, logger: JsonSqlLogger) -> Dict[str, Any]:
     run_id = state.get("run_id", "")
     nlp_query = state.get("query") or ""
-    # Try NLP query first if present; on failure, fall back to SELECT * FROM DATA_TABLE
+    # Try NLP query first if present; on failure, one repair attempt, then a bounded sample of DATA_TABLE
     tried_queries: List[str] = []
+    rejected: Optional[Dict[str, Any]] = None
     
-    def _exec_via_mcp(q: str) -> List[Dict[str, Any]]:
-        """Execute query via MCP db.query_supabase tool"""
+    def _mcp_args(q: str, limit: int = 500, explain: bool = False) -> Dict[str, Any]:
         # Build MCP tool arguments with connection parameters
         mcp_args = {
             "query": q,
-            "limit": 500,
+            "limit": limit,
         }
+        if explain:
+            mcp_args["explain"] = True
         
         # Pass connection parameters if available
         if getattr(settings, "DATA_DB_TYPE", ""):
@@ -34,22 +39,204 @@ def run(state: Dict[str, Any], settings, logger: JsonSqlLogger) -> Dict[str, Any
             mcp_args["password"] = settings.DATA_PASSWORD
         if getattr(settings, "DATA_SSLMODE", ""):
             mcp_args["sslmode"] = settings.DATA_SSLMODE
-        
+        return mcp_args
+
+    def _exec_via_mcp(q: str, limit: int = 500, meta: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Execute query via MCP db.query_supabase tool; `meta` receives the planner cost and DB time."""
+        mcp_args = _mcp_args(q, limit, explain=meta is not None)
         result = call_mcp_tool_sync("db", "db.query_supabase", mcp_args)
+        if meta is not None:
+            if result.get("cost") is not None:
+                meta["cost"] = result["cost"]
+            if result.get("elapsed_ms") is not None:
+                meta["db_ms"] = result["elapsed_ms"]
         
         if result.get("status") == "success":
-            return result.get("rows", [])
+            rows = result.get("rows", [])
+            if result.get("elapsed_ms") is not None:
+                metrics.observe_query(mcp_args.get("db_type", ""), result["elapsed_ms"] / 1000.0, len(rows))
+                if result.get("endpoint"):
+                    metrics.observe_endpoint_query(result["endpoint"], result.get("role") or "", result["elapsed_ms"] / 1000.0)
+            return rows
+        elif result.get("code"):
+            metrics.observe_query_rejected(mcp_args.get("db_type", ""), result["code"])
+            raise db_utils.QueryRejected(result["code"], result.get("error", ""), **(result.get("detail") or {}))
         else:
             raise Exception(result.get("error", "Unknown error from MCP"))
     
+    def _log_tier(tier: str, q: str, started: float, meta: Dict[str, Any],
+                  rows: Optional[List[Dict[str, Any]]] = None, error: Optional[Exception] = None) -> None:
+        """One step of the question -> repair -> sample ladder with its latency and planner cost."""
+        entry: Dict[str, Any] = {"tier": tier, "query": q, "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 1)}
+        entry.update(meta)
+        if rows is not None:
+            entry["rows"] = len(rows)
+        if error is not None:
+            entry["error"] = str(error)
+            if isinstance(error, db_utils.QueryRejected):
+                entry["code"] = error.code
+                if "cost" in error.detail:
+                    entry["cost"] = error.detail["cost"]
+            logger.error(run_id, "db", "db_fallback_tier", entry)
+        else:
+            logger.info(run_id, "db", "db_fallback_tier", entry)
+
+    def _summarize(named: Dict[str, List[Dict[str, Any]]], category: Optional[str], numeric: List[str]) -> Dict[str, Any]:
+        """Companion query results ("stats", "category" rows) -> {row_count, numeric, category}."""
+        out: Dict[str, Any] = {}
+        if named.get("stats"):
+            stats = named["stats"][0]
+            out["row_count"] = stats.get("row_count")
+            out["numeric"] = {
+                col: {k: stats.get(f"{k}_{i}") for k in ("sum", "avg", "min", "max")}
+                for i, col in enumerate(numeric)
+            }
+        if "category" in named:
+            out["category"] = {"column": category, "counts": [[r.get("value"), r.get("count")] for r in named["category"]]}
+        return out
+
+    def _mongo_aggregates(mongo_utils, pipeline: List[Dict[str, Any]], rows: List[Dict[str, Any]],
+                          limit: int = 500) -> Optional[Dict[str, Any]]:
+        """Server-side counterpart of _aggregates for a Mongo pipeline cut off at `limit` documents."""
+        if len(rows) < limit or not getattr(settings, "REPORT_AGGREGATE_PUSHDOWN", True):
+            return None
+        own_limit = (pipeline[-1] if pipeline else {}).get("$limit")
+        if own_limit is not None and own_limit < limit:
+            return None
+        category = chart_utils.pick_categorical_column(rows)
+        numeric = pdf_utils.numeric_columns(rows)
+        named: Dict[str, List[Dict[str, Any]]] = {}
+        for name, stages in mongo_utils.aggregate_pipelines(pipeline, category, numeric).items():
+            try:
+                named[name] = mongo_utils.run_pipeline(settings, stages, limit=50)
+            except Exception as e:
+                logger.error(run_id, "db", "db_aggregate_failed", {"pipeline": name, "error": str(e)})
+        out = _summarize(named, category, numeric)
+        if out:
+            logger.info(run_id, "db", "db_aggregates", {
+                "row_count": out.get("row_count"), "category": category, "numeric": numeric, "pipelines": len(named),
+            })
+        return out or None
+
+    def _aggregates(q: str, rows: List[Dict[str, Any]], limit: int = 500) -> Optional[Dict[str, Any]]:
+        """Chart counts and numeric totals over the full result when `rows` were cut off at `limit`.
+
+        The companion queries wrap the uncapped query and go to the DB tool concurrently.
+        """
+        if not rows or not getattr(settings, "REPORT_AGGREGATE_PUSHDOWN", True):
+            return None
+        base = db_utils.uncapped_query(q, len(rows), limit)
+        if base is None:
+            return None
+        db_type = str(getattr(settings, "DATA_DB_TYPE", "")).strip().lower()
+        category = chart_utils.pick_categorical_column(rows)
+        numeric = pdf_utils.numeric_columns(rows)
+        queries = db_utils.aggregate_queries(base, category, numeric, db_type)
+        names = list(queries)
+        try:
+            results = call_mcp_tools_sync([("db", "db.query_supabase", _mcp_args(queries[n], limit=50)) for n in names])
+        except Exception as e:
+            # The report falls back to the fetched rows
+            logger.error(run_id, "db", "db_aggregate_failed", {"error": str(e)})
+            return None
+        named: Dict[str, List[Dict[str, Any]]] = {}
+        for name, res in zip(names, results):
+            if res.get("status") != "success":
+                logger.error(run_id, "db", "db_aggregate_failed", {"query": queries[name], "error": res.get("error")})
+                continue
+            named[name] = res.get("rows") or []
+        out = _summarize(named, category, numeric)
+        if out:
+            logger.info(run_id, "db", "db_aggregates", {
+                "row_count": out.get("row_count"), "category": category, "numeric": numeric, "queries": len(names),
+            })
+        return out or None
+
+    def _exec_incremental(q: str) -> Optional[Dict[str, Any]]:
+        """Refresh a scheduled query from its stored high-water mark; None means run it in full."""
+        job = state.get("scheduled_job") or {}
+        inc = job.get("incremental") or {}
+        plan = incremental_utils.build_plan(q, inc.get("column") or "")
+        if plan is None:
+            return None
+        prev = (inc.get("state") or {}).get("incremental") or {}
+        # Formatting-only edits to the scheduled SQL keep the stored high-water mark
+        if sql_tokens.normalize(prev.get("query") or "") != sql_tokens.normalize(q) or prev.get("mode") != plan.mode or prev.get("column") != plan.column:
+            prev = {}
+
+        hw_rows = _exec_via_mcp(plan.high_water_query(), limit=1)
+        high = (hw_rows[0] if hw_rows else {}).get("high_water")
+        low = prev.get("high_water")
+        previous_rows = prev.get("rows") or []
+        if high is None:
+            new_rows: List[Dict[str, Any]] = []
+            high = low
+        elif low is not None and str(high) == str(low):
+            new_rows = []
+        else:
+            max_groups = int(getattr(settings, "SCHEDULER_INCREMENTAL_MAX_GROUPS", 10000))
+            fetch_limit = max_groups + 1 if plan.mode == "aggregate" else plan.limit
+            new_rows = _exec_via_mcp(plan.fetch_query(low, high), limit=fetch_limit)
+            if plan.mode == "aggregate" and len(new_rows) > max_groups:
+                return None
+
+        merged = incremental_utils.merge(plan, previous_rows, new_rows)
+        if plan.mode == "aggregate" and len(merged) > int(getattr(settings, "SCHEDULER_INCREMENTAL_MAX_GROUPS", 10000)):
+            return None
+        rows = incremental_utils.present(plan, merged)
+        logger.info(run_id, "db", "db_query_incremental", {
+            "mode": plan.mode,
+            "column": plan.column,
+            "low": low,
+            "high": high,
+            "new_rows": len(new_rows),
+            "rows": len(rows),
+            "cold_start": not prev,
+        })
+        return {
+            "status": "success",
+            "data": {
+                "rows": rows,
+                "query_used": q,
+                "incremental_state": {
+                    "query": q,
+                    "mode": plan.mode,
+                    "column": plan.column,
+                    "high_water": high,
+                    "rows": merged,
+                },
+            },
+            "log": {"rows": len(rows), "incremental": True},
+        }
+
     try:
-        # MongoDB path: sample documents (basic support - fallback to direct call)
+        # MongoDB path: the compiled SQL runs as an aggregation pipeline (direct call, pooled client);
+        # SQL outside the supported subset falls back to sampling documents
         if str(getattr(settings, "DATA_DB_TYPE", "")).strip().lower() == "mongodb":
             try:
                 from utils import mongo_utils
+                pipeline = None
+                if nlp_query:
+                    tried_queries.append(nlp_query)
+                    try:
+                        pipeline = mongo_utils.pipeline_from_sql(nlp_query, mongo_utils.infer_columns(settings))
+                    except ValueError as e:
+                        logger.error(run_id, "db", "mongo_query_unsupported", {"error": str(e), "query": nlp_query})
+                if pipeline is not None:
+                    started = time.perf_counter()
+                    rows = mongo_utils.run_pipeline(settings, pipeline, limit=500)
+                    metrics.observe_query("mongodb", time.perf_counter() - started, len(rows))
+                    logger.info(run_id, "db", "mongo_pipeline_executed", {
+                        "rows": len(rows), "stages": [next(iter(stage)) for stage in pipeline],
+                        "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 1),
+                    })
+                    data = {"rows": rows, "query_used": nlp_query, "aggregates": _mongo_aggregates(mongo_utils, pipeline, rows)}
+                    return {"status": "success", "data": data, "log": {"rows": len(rows), "pipeline": True}}
                 rows = mongo_utils.sample_rows(settings, limit=500)
                 logger.info(run_id, "db", "mongo_sampled", {"rows": len(rows)})
-                return {"status": "success", "data": {"rows": rows, "query_used": "mongodb_sample"}, "log": {"rows": len(rows)}}
+                # Chart counts and totals still cover the whole collection
+                data = {"rows": rows, "query_used": "mongodb_sample", "aggregates": _mongo_aggregates(mongo_utils, [], rows)}
+                return {"status": "success", "data": data, "log": {"rows": len(rows)}}
             except Exception as e:
                 logger.exception(run_id, "db", "mongo_error", {"error": str(e)})
                 return {"status": "error", "data": {}, "log": {"error": str(e)}}
@@ -57,22 +244,83 @@ def run(state: Dict[str, Any], settings, logger: JsonSqlLogger) -> Dict[str, Any
         # Use MCP for SQL queries (PostgreSQL/MySQL/SQLite)
         if nlp_query:
             tried_queries.append(nlp_query)
+            if ((state.get("scheduled_job") or {}).get("incremental") or {}).get("column"):
+                try:
+                    res = _exec_incremental(nlp_query)
+                    if res is not None:
+                        return res
+                except Exception as e:
+                    logger.error(run_id, "db", "db_incremental_failed", {"error": str(e), "query": nlp_query})
+            meta: Dict[str, Any] = {}
+            started = time.perf_counter()
             try:
                 rows = _exec_via_mcp(nlp_query)
                 logger.info(run_id, "db", "db_query_executed_mcp", {"rows": len(rows), "via": "mcp"})
-                return {"status": "success", "data": {"rows": rows, "query_used": nlp_query}, "log": {"rows": len(rows)}}
+                data = {"rows": rows, "query_used": nlp_query, "aggregates": _aggregates(nlp_query, rows)}
+                return {"status": "success", "data": data, "log": {"rows": len(rows)}}
+            except db_utils.QueryRejected as e:
+                # Too expensive or too slow for the data source: try a repaired query, then a bounded sample
+                rejected = {"code": e.code, "detail": e.detail}
+                failure = e
+                logger.error(run_id, "db", "db_query_rejected", {"error": str(e), "query": nlp_query, **rejected})
             except Exception as e:
+                failure = e
                 logger.error(run_id, "db", "db_nlp_query_failed", {"error": str(e), "query": nlp_query})
+            _log_tier("question", nlp_query, started, meta, error=failure)
+
+            if getattr(settings, "DB_FALLBACK_REPAIR", True):
+                from agents import nlp_agent
+                started = time.perf_counter()
+                repair = nlp_agent.repair_query(
+                    state.get("user_input", ""), nlp_query, str(failure), settings, logger, run_id,
+                    code=getattr(failure, "code", ""),
+                )
+                if repair and repair["query"] not in tried_queries:
+                    repaired = repair["query"]
+                    tried_queries.append(repaired)
+                    meta = {"repair": repair["used"], "repair_ms": round((time.perf_counter() - started) * 1000.0, 1)}
+                    started = time.perf_counter()
+                    try:
+                        rows = _exec_via_mcp(repaired, meta=meta)
+                        _log_tier("repair", repaired, started, meta, rows=rows)
+                        data = {"rows": rows, "query_used": repaired, "aggregates": _aggregates(repaired, rows)}
+                        log: Dict[str, Any] = {"rows": len(rows), "repaired": repair["used"]}
+                        if repair.get("llm"):
+                            log["llm"] = repair["llm"]
+                        return {"status": "success", "data": data, "log": log}
+                    except Exception as e:
+                        _log_tier("repair", repaired, started, meta, error=e)
         
         table = getattr(settings, "DATA_TABLE", "")
         if not table:
             return {"status": "error", "data": {}, "log": {"error": "No DATA_TABLE configured and NLP query failed/absent"}}
         
-        fallback = f"SELECT * FROM {table}"
-        tried_queries.append(fallback)
-        rows = _exec_via_mcp(fallback)
+        # A bounded read instead of the whole table; no aggregate pushdown, which would scan it anyway
+        db_type = str(getattr(settings, "DATA_DB_TYPE", "")).strip().lower()
+        samples = db_utils.sample_queries(
+            table, db_type, getattr(settings, "DB_FALLBACK_ROWS", 100), getattr(settings, "DB_FALLBACK_SAMPLE_PERCENT", 1.0),
+        )
+        for i, fallback in enumerate(samples):
+            last = i == len(samples) - 1
+            tried_queries.append(fallback)
+            meta = {}
+            started = time.perf_counter()
+            try:
+                rows = _exec_via_mcp(fallback, meta=meta)
+            except Exception as e:
+                _log_tier("sample", fallback, started, meta, error=e)
+                if last:
+                    raise
+                continue
+            _log_tier("sample", fallback, started, meta, rows=rows)
+            if rows or last:
+                break
         logger.info(run_id, "db", "db_query_executed_fallback_mcp", {"rows": len(rows), "via": "mcp"})
-        return {"status": "success", "data": {"rows": rows, "query_used": fallback}, "log": {"rows": len(rows)}}
+        data = {"rows": rows, "query_used": fallback, "aggregates": None, "sampled": True}
+        log = {"rows": len(rows), "sampled": True}
+        if rejected:
+            log["rejected"] = rejected
+        return {"status": "success", "data": data, "log": log}
     except Exception as e:
         logger.exception(run_id, "db", "db_error", {"error": str(e), "tried": tried_queries})
         return {"status": "error", "data": {}, "log": {"error": str(e)}}
@@ -33,16 +33,33 @@ def run(state: Dict[str, Any], settings, logger: JsonSqlLogger) -> Dict[str, Any
         {"file_path": pdf_path, "mime_type": "application/pdf", "file_name": os.path.basename(pdf_path)},
     ]
     
+    message = {
+        "subject": "Multi-Agent Data Assistant Report",
+        "body_text": f"Report for: {state.get('user_input','')}",
+        "to_emails": to_emails,
+        "from_email": from_email,
+        "attachments": attachments,
+        "api_key": api_key,
+    }
+
+    # Outbox: persist the message and return; the worker delivers it with retries. A per-run key
+    # override outside a scheduled job has nothing to reference it by and is sent directly
+    from agents import email_outbox
+    job_id = state.get("job_id")
+    if getattr(settings, "EMAIL_OUTBOX_ENABLED", False) and not email_outbox.can_enqueue(api_key, job_id):
+        logger.info(run_id, "email", "email_outbox_bypassed", {"reason": "api_key_override"})
+    elif getattr(settings, "EMAIL_OUTBOX_ENABLED", False):
+        try:
+            outbox_id = email_outbox.enqueue(logger.db, run_id, message, job_id=job_id)
+            logger.info(run_id, "email", "email_queued", {"outbox_id": outbox_id, "to_count": len(to_emails)})
+            return {"status": "queued", "data": {"outbox_id": outbox_id}, "log": {"outbox_id": outbox_id}}
+        except Exception as e:
+            logger.exception(run_id, "email", "email_enqueue_error", {"error": str(e)})
+            return {"status": "error", "data": {}, "log": {"error": str(e)}}
+
     # Use MCP email.send_report tool
     try:
-        res = call_mcp_tool_sync("email", "email.send_report", {
-            "subject": "Multi-Agent Data Assistant Report",
-            "body_text": f"Report for: {state.get('user_input','')}",
-            "to_emails": to_emails,
-            "from_email": from_email,
-            "attachments": attachments,
-            "api_key": api_key,
-        })
+        res = call_mcp_tool_sync("email", "email.send_report", message)
         
         status = res.get("status", "error")
         logger.info(run_id, "email", "email_done_mcp", {"status": status, "via": "mcp"})
@@ -0,0 +1,137 @@
+from typing import Any, Dict, Optional
+import json
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app.config import settings
+from app.database import Database
+from utils import sendgrid_utils
+
+# HTTP statuses worth retrying; other 4xx responses (bad key, invalid address) fail immediately
+_RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Exponential backoff with full jitter for the given number of attempts made."""
+    base = max(1, settings.EMAIL_OUTBOX_BACKOFF_SECONDS)
+    ceiling = min(settings.EMAIL_OUTBOX_BACKOFF_MAX_SECONDS, base * (2 ** max(0, attempts - 1)))
+    return random.uniform(base / 2.0, max(base / 2.0, ceiling))
+
+
+def can_enqueue(api_key: str, job_id: Optional[str]) -> bool:
+    """Whether the worker can resolve the SendGrid key later: the environment's, or a scheduled job's override."""
+    return api_key == settings.SENDGRID_API_KEY or bool(job_id)
+
+
+def enqueue(db: Database, run_id: str, payload: Dict[str, Any], job_id: Optional[str] = None) -> int:
+    """Persist a send request. Keys are never stored: a key other than the environment's is
+    recorded as a reference to the scheduled job whose overrides hold it."""
+    payload = dict(payload)
+    api_key = payload.pop("api_key", "")
+    if not can_enqueue(api_key, job_id):
+        raise ValueError("a SendGrid key override can only be queued for a scheduled job")
+    if api_key != settings.SENDGRID_API_KEY:
+        payload["api_key_ref"] = {"job_id": job_id}
+    outbox_id = db.enqueue_email(run_id, payload, settings.EMAIL_OUTBOX_MAX_ATTEMPTS)
+    EmailOutbox.notify()
+    return outbox_id
+
+
+class EmailOutbox:
+    """Background worker draining email_outbox.
+
+    Rows are leased with FOR UPDATE SKIP LOCKED, so several server processes can run a
+    worker against the same table. A lease that is not completed (crash mid-send) is
+    picked up again once it expires.
+    """
+    _db: Optional[Database] = None
+    _thread: Optional[threading.Thread] = None
+    _pool: Optional[ThreadPoolExecutor] = None
+    _wake = threading.Event()
+    _stop = threading.Event()
+    _lock = threading.Lock()
+
+    @classmethod
+    def start(cls) -> None:
+        with cls._lock:
+            if cls._thread is not None and cls._thread.is_alive():
+                return
+            cls._db = cls._db or Database(settings.DB_PATH)
+            cls._pool = ThreadPoolExecutor(max_workers=max(1, settings.EMAIL_OUTBOX_CONCURRENCY), thread_name_prefix="email-outbox")
+            cls._stop.clear()
+            cls._thread = threading.Thread(target=cls._loop, name="email-outbox", daemon=True)
+            cls._thread.start()
+
+    @classmethod
+    def stop(cls) -> None:
+        cls._stop.set()
+        cls._wake.set()
+        with cls._lock:
+            if cls._pool is not None:
+                cls._pool.shutdown(wait=True)
+            cls._pool = None
+            cls._thread = None
+
+    @classmethod
+    def notify(cls) -> None:
+        cls._wake.set()
+
+    @classmethod
+    def _loop(cls) -> None:
+        lease = max(60, settings.EMAIL_OUTBOX_BACKOFF_SECONDS)
+        while not cls._stop.is_set():
+            claimed = []
+            try:
+                claimed = cls._db.claim_emails(max(1, settings.EMAIL_OUTBOX_CONCURRENCY), lease)
+                futures = [cls._pool.submit(cls._deliver, row) for row in claimed]
+                for f in futures:
+                    f.result()
+            except Exception as e:
+                print(f"[EmailOutbox] poll failed: {e}")
+            if len(claimed) < max(1, settings.EMAIL_OUTBOX_CONCURRENCY):
+                cls._wake.wait(max(1, settings.EMAIL_OUTBOX_POLL_SECONDS))
+                cls._wake.clear()
+
+    @classmethod
+    def _api_key(cls, payload: Dict[str, Any]) -> str:
+        """The SendGrid key for a row, looked up at send time; empty when its job is gone."""
+        ref = payload.get("api_key_ref") or {}
+        if not ref.get("job_id"):
+            return payload.get("api_key") or settings.SENDGRID_API_KEY  # rows queued before key references
+        jobs = cls._db.list_scheduled_jobs(ref["job_id"])
+        return str((jobs[0].get("overrides") or {}).get("SENDGRID_API_KEY") or "") if jobs else ""
+
+    @classmethod
+    def _deliver(cls, row: Dict[str, Any]) -> None:
+        payload = row.get("payload") or {}
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+        api_key = cls._api_key(payload)
+        if not api_key:
+            cls._db.finish_email(row["id"], "failed", error="SendGrid key not found (scheduled job removed?)")
+            return
+        res = sendgrid_utils.send_email(
+            subject=payload.get("subject", ""),
+            body_text=payload.get("body_text", ""),
+            to_emails=payload.get("to_emails") or [],
+            from_email=payload.get("from_email", ""),
+            attachments=payload.get("attachments") or [],
+            api_key=api_key,
+            host=settings.SENDGRID_API_HOST,
+        )
+        status = res.get("status")
+        if status == "success":
+            cls._db.finish_email(row["id"], "sent")
+            return
+        log = res.get("log") or {}
+        error = str(log.get("error") or log.get("reason") or status)
+        code = log.get("status_code")
+        retryable = status == "error" and log.get("retryable", True) and (code is None or code in _RETRYABLE_STATUS)
+        attempts = int(row.get("attempts") or 1)
+        if retryable and attempts < int(row.get("max_attempts") or settings.EMAIL_OUTBOX_MAX_ATTEMPTS):
+            retry_at = (datetime.utcnow() + timedelta(seconds=backoff_seconds(attempts))).isoformat()
+            cls._db.finish_email(row["id"], "pending", error=error, next_attempt_at=retry_at)
+        else:
+            cls._db.finish_email(row["id"], "failed", error=error)
@@ -1,7 +1,10 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 import re
+import time
 from app.logging_utils import JsonSqlLogger
 from app.config import settings as _settings
+from app import metrics
+from utils import sql_tokens
 
 
 def _extract_sql(text: str) -> str:
@@ -12,11 +15,8 @@ def _extract_sql(text: str) -> str:
         return m.group(1).strip()
     m = re.search(r"select\b[\s\S]*", text, re.IGNORECASE)
     if m:
-        sql = m.group(0)
-        semi = sql.find(";")
-        if semi != -1:
-            sql = sql[:semi]
-        return sql.strip()
+        # A ';' inside a string literal does not end the statement
+        return sql_tokens.first_statement(m.group(0))
     return text.strip()
 
 
@@ -43,59 +43,442 @@ def _heuristic_groupby_query(table: str, columns: List[Dict[str, Any]], user_inp
     return f"SELECT * FROM {table} LIMIT 50"
 
 
-def run(state: Dict[str, Any], settings, logger: JsonSqlLogger) -> Dict[str, Any]:
-    run_id = state.get("run_id", "")
-    user_input = state.get("user_input", "")
+# Template fast path: common question shapes are compiled straight from the schema.
+# Words the matcher cannot account for lower the confidence so the LLM handles them.
+
+_NUMERIC_TYPES = ("int", "numeric", "decimal", "real", "double", "float", "money", "number")
+_TEMPORAL_TYPES = ("date", "time")
+_AGGREGATES = {
+    "sum": "SUM", "total": "SUM", "average": "AVG", "avg": "AVG", "mean": "AVG",
+    "min": "MIN", "minimum": "MIN", "max": "MAX", "maximum": "MAX",
+}
+_TOP_WORDS = {"top", "highest", "largest", "biggest", "most"}
+_WINDOWS = {"day": 1, "week": 7, "month": 30, "quarter": 90, "year": 365}
+_WINDOW = re.compile(r"\b(?:last|past|previous)\s+(\d+\s+)?(day|week|month|quarter|year)s?\b")
+# Words that do not change the shape of the query
+_FILLER = {
+    "a", "an", "the", "of", "by", "per", "for", "in", "on", "over", "during", "across", "each", "every", "all",
+    "from", "to", "me", "us", "show", "list", "give", "get", "display", "what", "which", "are", "is", "were",
+    "was", "do", "does", "how", "many", "much", "number", "count", "row", "record", "sample", "example",
+    "preview", "data", "some", "few", "please", "last", "past", "previous", "breakdown", "grouped", "group",
+    "there", "have", "has", "value", "table",
+} | set(_AGGREGATES) | _TOP_WORDS | set(_WINDOWS)
+_WORD = re.compile(r"[a-z0-9_]+")
+# Dates and literal values the templates have no filter for
+_MONTHS = {
+    "january", "february", "march", "april", "may", "june", "july", "august", "september", "october", "november",
+    "december", "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+}
+_YEAR = re.compile(r"^(?:19|20)\d\d$")
+
+
+def _column_kind(col_type: str) -> str:
+    t = str(col_type or "").lower()
+    if any(k in t for k in _TEMPORAL_TYPES):
+        return "temporal"
+    if any(k in t for k in _NUMERIC_TYPES):
+        return "numeric"
+    return "text"
+
+
+def _singular(word: str) -> str:
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("sses", "xes", "ches", "shes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def _words(text: str) -> List[str]:
+    return [_singular(w) for w in _WORD.findall(text.lower().replace("_", " "))]
+
+
+def _find_column(words: List[str], offset: int, index: List[Tuple[str, str, Tuple[str, ...]]],
+                 kind: str) -> Optional[Tuple[str, int, int]]:
+    """Longest column of `kind` whose words appear consecutively: (name, start, end)."""
+    best = None
+    for name, col_kind, col_words in index:
+        n = len(col_words)
+        if col_kind != kind or not n:
+            continue
+        for i in range(len(words) - n + 1):
+            if tuple(words[i:i + n]) == col_words and (best is None or n > best[2] - best[1]):
+                best = (name, offset + i, offset + i + n)
+    return best
+
+
+def _time_filter(column: str, column_type: str, days: int, db_type: str) -> str:
+    if db_type == "sqlite":
+        fn = "datetime" if "time" in column_type.lower() else "date"
+        return f"{column} >= {fn}('now', '-{days} days')"
+    if db_type == "mysql":
+        return f"{column} >= NOW() - INTERVAL {days} DAY"
+    return f"{column} >= NOW() - INTERVAL '{days} days'"
+
+
+def match_template(table: str, columns: List[Dict[str, Any]], user_input: str,
+                   db_type: str = "") -> Optional[Dict[str, Any]]:
+    """Compile "top N by X", "count by X", "sum of Y by X [over last week]" and "show
+    sample rows" questions from the schema.
+
+    Returns {"template", "query", "confidence"} or None when no template applies.
+    """
+    text = (user_input or "").lower()
+    raw = _WORD.findall(text)
+    if not table or not columns or not raw:
+        return None
+    words = [_singular(w) for w in raw]
+    index = [
+        (str(c["name"]), _column_kind(c.get("type", "")), tuple(_words(str(c["name"]))))
+        for c in columns if str(c.get("name", "")).isidentifier()
+    ]
+    types = {str(c.get("name")): str(c.get("type", "")) for c in columns}
+    used = set()
+
+    def take(found: Optional[Tuple[str, int, int]]) -> Optional[str]:
+        if not found:
+            return None
+        used.update(range(found[1], found[2]))
+        return found[0]
+
+    where = ""
+    window_n = None
+    m = _WINDOW.search(text)
+    if m:
+        window_n = m.group(1) and m.group(1).strip()
+        days = int(window_n or 1) * _WINDOWS[m.group(2)]
+        time_col = take(_find_column(words, 0, index, "temporal"))
+        if not time_col:
+            temporal = [name for name, kind, _ in index if kind == "temporal"]
+            if len(temporal) != 1:
+                return None
+            time_col = temporal[0]
+        where = " WHERE " + _time_filter(time_col, types.get(time_col, ""), days, db_type)
+    # The first plain number is the row count; a year ("in 2023") is a filter, never a count
+    limit_at = next((i for i, w in enumerate(raw) if w.isdigit() and w != window_n and not _YEAR.match(w)), None)
+    limit = min(int(raw[limit_at]), 500) if limit_at is not None else None
+
+    agg = next((_AGGREGATES[w] for w in raw if w in _AGGREGATES), None)
+    is_top = any(w in _TOP_WORDS for w in raw)
+    is_count = "count" in raw or "number" in raw or ("how" in raw and "many" in raw)
+    is_sample = any(w in ("sample", "preview", "example") for w in words) or (
+        raw[0] in ("show", "list", "display", "give") and any(w in ("row", "record", "data") for w in words)
+    )
+
+    # The group-by dimension follows by/per; the measure precedes it ("top customers by amount" is the reverse)
+    split = next((i for i, w in enumerate(raw) if w in ("by", "per")), None)
+    head, tail = (words[:split], words[split + 1:]) if split is not None else (words, [])
+    tail_dim = _find_column(tail, (split or 0) + 1, index, "text")
+    tail_num = _find_column(tail, (split or 0) + 1, index, "numeric")
+    if tail_dim:
+        dim, measure = take(tail_dim), take(_find_column(head, 0, index, "numeric"))
+    elif tail_num:
+        measure, dim = take(tail_num), take(_find_column(head, 0, index, "text"))
+    else:
+        measure = take(_find_column(head, 0, index, "numeric"))
+        dim = take(_find_column(head, 0, index, "text")) if is_top else None
+    # The table name ("show rows from sales") is not a leftover word
+    table_words = set(_words(table.split(".")[-1])) | {table.split(".")[-1].lower()}
+
+    if is_sample and not (agg or is_count or is_top or dim or measure):
+        template = "sample_rows"
+        query = f"SELECT * FROM {table}{where} LIMIT {limit or 50}"
+        confidence = 0.95
+    elif is_top and measure:
+        fn = agg or "SUM"
+        if dim:
+            alias = f"{'total' if fn == 'SUM' else fn.lower()}_{measure}"
+            template = "top_n_by"
+            query = f"SELECT {dim}, {fn}({measure}) AS {alias} FROM {table}{where} GROUP BY {dim} ORDER BY {alias} DESC LIMIT {limit or 10}"
+        else:
+            template = "top_n_rows"
+            query = f"SELECT * FROM {table}{where} ORDER BY {measure} DESC LIMIT {limit or 10}"
+        confidence = 0.9
+    elif agg and measure and dim:
+        alias = f"{'total' if agg == 'SUM' else agg.lower()}_{measure}"
+        template = "aggregate_by"
+        query = f"SELECT {dim}, {agg}({measure}) AS {alias} FROM {table}{where} GROUP BY {dim} ORDER BY {alias} DESC LIMIT {limit or 100}"
+        confidence = 0.9
+    elif dim and not agg and not measure and (is_count or is_top or split is not None):
+        template = "count_by"
+        query = f"SELECT {dim}, COUNT(*) AS count FROM {table}{where} GROUP BY {dim} ORDER BY count DESC LIMIT {limit or 20}"
+        confidence = 0.9 if (is_count or is_top) else 0.8
+    else:
+        return None
+
+    for i, w in enumerate(raw):
+        if i in used or i == limit_at or (w == window_n and m):
+            continue
+        # Numbers, dates and values ("2023", "january", "q1", "customer_42") are filters the template would drop,
+        # as is a period word that is not part of a "last N days" window
+        if (any(ch.isdigit() for ch in w) or w in _MONTHS or (words[i] in _WINDOWS and not m)):
+            confidence -= 0.5
+            continue
+        if w in _FILLER or words[i] in _FILLER or w in table_words or words[i] in table_words:
+            continue
+        # Any other word is a filter, entity or comparison the template cannot express ("europe" in "top 5
+        # regions by amount in europe", "customers" when there is no customer column): leave it to the LLM
+        confidence -= 0.5
+    return {"template": template, "query": query, "confidence": round(max(0.0, confidence), 2)}
+
+
+# Schema pruning: wide tables only send the columns most relevant to the question
+
+_TIME_HINTS = {"day", "week", "month", "quarter", "year", "date", "time", "daily", "weekly", "monthly", "yearly",
+               "trend", "recent", "latest", "last", "past", "since", "before", "after", "today", "yesterday", "ago"}
+
+
+def _estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English and SQL identifiers
+    return (len(text) + 3) // 4
+
+
+def _columns_str(columns: List[Dict[str, Any]]) -> str:
+    return ", ".join([f"{c.get('name')} ({c.get('type')})" for c in columns])
+
+
+def rank_columns(columns: List[Dict[str, Any]], user_input: str,
+                 memory_msgs: Optional[List[Dict[str, Any]]] = None) -> List[float]:
+    """Lexical relevance of each column to the question (and, weighted lower, recent memory)."""
+    question = set(_words(user_input))
+    memory = set(_words(" ".join(str(m.get("content", "")) for m in (memory_msgs or [])[-5:])))
+    wants_time = bool(question & _TIME_HINTS)
+    wants_number = any(w in _AGGREGATES or w in _TOP_WORDS for w in question)
+    scores: List[float] = []
+    for c in columns:
+        col_words = _words(str(c.get("name", "")))
+        score = 0.0
+        for w in col_words:
+            if w in question:
+                score += 2.0
+            elif len(w) >= 3 and any(q.startswith(w) or (len(q) >= 3 and w.startswith(q)) for q in question):
+                score += 1.0
+            elif w in memory:
+                score += 0.5
+        if col_words:
+            score /= len(col_words) ** 0.5
+            if all(w in question for w in col_words):
+                score += 2.0
+        kind = _column_kind(str(c.get("type", "")))
+        if wants_time and kind == "temporal":
+            # Time filters and buckets need a date column even when none is named
+            score += 1.5
+        elif wants_number and kind == "numeric":
+            score += 0.1
+        scores.append(score)
+    return scores
+
+
+def prune_columns(columns: List[Dict[str, Any]], user_input: str, memory_msgs: Optional[List[Dict[str, Any]]],
+                  max_columns: int, token_budget: int, always: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Columns for the prompt: `always` first, then the most relevant ones, up to max_columns
+    and token_budget (estimated tokens of the column list). Table order is preserved."""
+    if (max_columns <= 0 or len(columns) <= max_columns) and (
+            token_budget <= 0 or _estimate_tokens(_columns_str(columns)) <= token_budget):
+        return list(columns)
+    pinned = {a.strip().lower() for a in (always or []) if a.strip()}
+    scores = rank_columns(columns, user_input, memory_msgs)
+    order = sorted(
+        range(len(columns)),
+        key=lambda i: (str(columns[i].get("name", "")).lower() not in pinned, -scores[i], i),
+    )
+    keep: List[int] = []
+    tokens = 0
+    for i in order:
+        cost = _estimate_tokens(_columns_str([columns[i]])) + 1
+        if str(columns[i].get("name", "")).lower() not in pinned:
+            if (max_columns > 0 and len(keep) >= max_columns) or (token_budget > 0 and tokens + cost > token_budget):
+                break
+        keep.append(i)
+        tokens += cost
+    return [columns[i] for i in sorted(keep)]
+
+
+def _build_prompt(table: str, columns: List[Dict[str, Any]], memory_msgs: List[Dict[str, Any]], user_input: str) -> str:
+    cols_str = _columns_str(columns)
+    mem_str = "; ".join([f"{m.get('role')}: {m.get('content')}" for m in memory_msgs[-5:]]) if memory_msgs else ""
+    return (
+        f"You are a senior data SQL assistant. Given a table name `{table}` and its columns [{cols_str}], "
+        f"and considering recent context/preferences [{mem_str}], "
+        f"write a single safe SELECT query that best answers the question: '{user_input}'. "
+        f"Rules: only SELECT; no CTE unless needed; avoid DDL/DML; prefer GROUP BY or ORDER BY as appropriate; "
+        f"if aggregating categories use COUNT(*) and return top categories; always include LIMIT 500 or fewer. "
+        f"Return only the SQL without explanations or backticks."
+    )
+
+
+def compile_query(user_input: str, settings, logger: JsonSqlLogger, run_id: str = "",
+                  memory_msgs: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Turn a question into SQL for the configured table.
+
+    Returns {"query", "used", "schema_cols", "schema_hash", "llm", "template", "cache"};
+    schema_hash is None when the table's columns could not be read. Questions matching a
+    template with at least NLP_TEMPLATE_MIN_CONFIDENCE skip the LLM (used == "template"), as
+    do paraphrases of earlier questions found in the similarity cache (used == "cache").
+    """
     query = None
     used = "mock"
+    llm: Dict[str, Any] = {}
+    template: Optional[Dict[str, Any]] = None
+    cache: Optional[Dict[str, Any]] = None
     schema_cols: List[Dict[str, Any]] = []
-    memory_msgs: List[Dict[str, Any]] = state.get("memory_messages") or []
+    schema_hash: Optional[str] = None
+    memory_msgs = memory_msgs or []
     table = getattr(settings, "DATA_TABLE", "")
-    try:
-        if getattr(settings, "DATA_DB_TYPE", "") and table:
-            try:
-                from utils import db_utils
-                schema_cols = db_utils.get_table_columns(settings, table)
-            except Exception as e:
-                logger.error(run_id, "nlp", "schema_fetch_failed", {"error": str(e)})
-        if getattr(settings, "OPENAI_API_KEY", ""):
-            try:
-                from openai import OpenAI
+    if getattr(settings, "DATA_DB_TYPE", "") and table:
+        try:
+            from utils import db_utils
+            schema_cols = db_utils.get_table_columns(settings, table)
+            schema_hash = db_utils.schema_hash(settings, table, schema_cols)
+        except Exception as e:
+            logger.error(run_id, "nlp", "schema_fetch_failed", {"error": str(e)})
+    if getattr(settings, "NLP_TEMPLATES_ENABLED", True) and schema_cols:
+        started = time.perf_counter()
+        template = match_template(table, schema_cols, user_input, str(getattr(settings, "DATA_DB_TYPE", "")).strip().lower())
+        if template:
+            template["elapsed_us"] = round((time.perf_counter() - started) * 1e6, 1)
+            if template["confidence"] >= getattr(settings, "NLP_TEMPLATE_MIN_CONFIDENCE", 0.8):
+                query = template["query"]
+                used = "template"
+    db = getattr(logger, "db", None)
+    if not query and getattr(settings, "NLP_SIMILARITY_ENABLED", False) and schema_hash and db is not None:
+        try:
+            from utils import question_cache
+            cache = question_cache.lookup(
+                db, schema_hash, user_input, schema_cols,
+                settings.NLP_SIMILARITY_THRESHOLD, settings.NLP_SIMILARITY_MAX_ENTRIES,
+                settings.NLP_SIMILARITY_RELOAD_SECONDS,
+            )
+            if cache:
+                query = cache["query"]
+                used = "cache"
+        except Exception as e:
+            logger.error(run_id, "nlp", "similarity_lookup_failed", {"error": str(e)})
+    if not query and getattr(settings, "OPENAI_API_KEY", ""):
+        try:
+            from utils import db_utils, openai_utils
+            prompt_cols = prune_columns(
+                schema_cols, user_input, memory_msgs,
+                int(getattr(settings, "NLP_SCHEMA_MAX_COLUMNS", 0)), int(getattr(settings, "NLP_SCHEMA_TOKEN_BUDGET", 0)),
+                str(getattr(settings, "NLP_SCHEMA_ALWAYS_COLUMNS", "")).split(","),
+            )
+            prompt = _build_prompt(table, prompt_cols, memory_msgs, user_input)
+            schema_stats = {
+                "columns": len(schema_cols),
+                "prompt_columns": len(prompt_cols),
+                "prompt_tokens_est": _estimate_tokens(prompt),
+            }
+            if len(prompt_cols) < len(schema_cols):
+                schema_stats["unpruned_tokens_est"] = _estimate_tokens(_build_prompt(table, schema_cols, memory_msgs, user_input))
+            llm = openai_utils.complete(prompt, settings.OPENAI_API_KEY, stop_when=openai_utils.sql_is_complete)
+            llm["schema"] = schema_stats
+            content = llm.pop("content")
+            sql = _extract_sql(content)
+            if sql and table:
+                sql = sql_tokens.qualify_table(sql, table)
+            if sql:
                 from utils import db_utils
-                client = OpenAI(api_key=settings.OPENAI_API_KEY)
-                cols_str = ", ".join([f"{c.get('name')} ({c.get('type')})" for c in schema_cols]) or ""
-                mem_str = "; ".join([f"{m.get('role')}: {m.get('content')}" for m in memory_msgs[-5:]]) if memory_msgs else ""
-                prompt = (
-                    f"You are a senior data SQL assistant. Given a table name `{table}` and its columns [{cols_str}], "
-                    f"and considering recent context/preferences [{mem_str}], "
-                    f"write a single safe SELECT query that best answers the question: '{user_input}'. "
-                    f"Rules: only SELECT; no CTE unless needed; avoid DDL/DML; prefer GROUP BY or ORDER BY as appropriate; "
-                    f"if aggregating categories use COUNT(*) and return top categories; always include LIMIT 500 or fewer. "
-                    f"Return only the SQL without explanations or backticks."
-                )
-                resp = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.0,
-                )
-                content = resp.choices[0].message.content if resp and resp.choices else ""
-                sql = _extract_sql(content)
-                if sql and table and table not in sql:
-                    sql = sql.replace("FROM ", f"FROM {table} ")
-                if sql:
-                    from utils import db_utils
-                    if not db_utils.is_safe_select(sql):
-                        sql = _heuristic_groupby_query(table, schema_cols, user_input)
-                    sql = db_utils.ensure_limit(sql, 500)
-                query = sql
-                used = "openai"
-            except Exception as e:
-                query = None
-                used = "mock"
-        if not query:
-            query = _heuristic_groupby_query(table, schema_cols, user_input) if table else "SELECT 1"
-        logger.info(run_id, "nlp", "nlp_done", {"used": used, "query": query, "schema_cols": len(schema_cols)})
-        return {"status": "success", "data": {"query": query}, "log": {"used": used}}
+                if not db_utils.is_safe_select(sql):
+                    sql = _heuristic_groupby_query(table, schema_cols, user_input)
+                sql = db_utils.ensure_limit(sql, 500)
+            query = sql
+            used = "openai"
+        except Exception as e:
+            query = None
+            used = "mock"
+            llm = {"error": str(e)}
+    if not query:
+        query = _heuristic_groupby_query(table, schema_cols, user_input) if table else "SELECT 1"
+    metrics.observe_nlp(used)
+    return {"query": query, "used": used, "schema_cols": schema_cols, "schema_hash": schema_hash, "llm": llm, "template": template,
+            "cache": cache}
+
+
+def _repair_prompt(table: str, columns: List[Dict[str, Any]], user_input: str, failed_sql: str, error: str,
+                   code: str = "") -> str:
+    if code in ("cost_exceeded", "timeout"):
+        problem = (f"was refused as too expensive ({error}). Write a cheaper query: filter early, aggregate in the "
+                   f"database, avoid cross joins and sorting large intermediate results")
+    else:
+        problem = f"failed with the database error: {error}. Fix the error"
+    return (
+        f"You are a senior data SQL assistant. Table `{table}` has columns [{_columns_str(columns)}]. "
+        f"This SQL, written for the question '{user_input}', {problem}. "
+        f"SQL: {failed_sql} "
+        f"Rules: a single SELECT; avoid DDL/DML; always include LIMIT 500 or fewer. "
+        f"Return only the SQL without explanations or backticks."
+    )
+
+
+def repair_query(user_input: str, failed_sql: str, error: str, settings, logger: JsonSqlLogger, run_id: str = "",
+                 code: str = "") -> Optional[Dict[str, Any]]:
+    """One repair attempt for SQL the data source refused or failed on (`code` as in QueryRejected).
+
+    A confident template match wins when it differs from the failed SQL; otherwise the LLM gets
+    the error. Returns {"query", "used", "llm"} or None when there is nothing new to try.
+    """
+    table = getattr(settings, "DATA_TABLE", "")
+    if not table or not getattr(settings, "DATA_DB_TYPE", ""):
+        return None
+    from utils import db_utils
+    try:
+        columns = db_utils.get_table_columns(settings, table)
+    except Exception as e:
+        logger.error(run_id, "nlp", "schema_fetch_failed", {"error": str(e)})
+        return None
+    failed = sql_tokens.normalize(failed_sql)
+    if getattr(settings, "NLP_TEMPLATES_ENABLED", True) and columns:
+        template = match_template(table, columns, user_input, str(getattr(settings, "DATA_DB_TYPE", "")).strip().lower())
+        if (template and template["confidence"] >= getattr(settings, "NLP_TEMPLATE_MIN_CONFIDENCE", 0.8)
+                and sql_tokens.normalize(template["query"]) != failed):
+            metrics.observe_nlp("repair")
+            return {"query": template["query"], "used": "template", "llm": {}}
+    if not getattr(settings, "OPENAI_API_KEY", ""):
+        return None
+    from utils import openai_utils
+    prompt_cols = prune_columns(
+        columns, user_input, None,
+        int(getattr(settings, "NLP_SCHEMA_MAX_COLUMNS", 0)), int(getattr(settings, "NLP_SCHEMA_TOKEN_BUDGET", 0)),
+        str(getattr(settings, "NLP_SCHEMA_ALWAYS_COLUMNS", "")).split(","),
+    )
+    try:
+        llm = openai_utils.complete(_repair_prompt(table, prompt_cols, user_input, failed_sql, error, code),
+                                    settings.OPENAI_API_KEY, stop_when=openai_utils.sql_is_complete)
+    except Exception as e:
+        logger.error(run_id, "nlp", "sql_repair_failed", {"error": str(e)})
+        return None
+    sql = _extract_sql(llm.pop("content"))
+    if not sql:
+        return None
+    sql = sql_tokens.qualify_table(sql, table)
+    if not db_utils.is_safe_select(sql):
+        return None
+    sql = db_utils.ensure_limit(sql, 500)
+    if sql_tokens.normalize(sql) == failed:
+        return None
+    metrics.observe_nlp("repair")
+    return {"query": sql, "used": "openai", "llm": llm}
+
+
+def run(state: Dict[str, Any], settings, logger: JsonSqlLogger) -> Dict[str, Any]:
+    run_id = state.get("run_id", "")
+    user_input = state.get("user_input", "")
+    memory_msgs: List[Dict[str, Any]] = state.get("memory_messages") or []
+    try:
+        started = time.perf_counter()
+        compiled = compile_query(user_input, settings, logger, run_id, memory_msgs)
+        query, used = compiled["query"], compiled["used"]
+        logger.info(run_id, "nlp", "nlp_done", {
+            "used": used, "query": query, "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 1), "schema_cols": len(compiled["schema_cols"]), "llm": compiled["llm"],
+            "template": compiled["template"], "cache": compiled["cache"],
+        })
+        data = {"query": query, "schema_hash": compiled["schema_hash"], "used": used}
+        if used == "openai":
+            from utils import question_cache
+            data["key_terms"] = question_cache.key_terms(user_input, compiled["schema_cols"])
+        return {"status": "success", "data": data, "log": {"used": used}}
     except Exception as e:
         logger.exception(run_id, "nlp", "nlp_error", {"error": str(e)})
         return {"status": "error", "data": {}, "log": {"error": str(e)}}
@@ -3,11 +3,17 @@ from typing import Any, Dict
 
 def decide_next(last_node: str, state: Dict[str, Any]) -> str:
     if last_node == "memory_load":
+        # Scheduled jobs with SQL pinned at schedule time skip query generation
+        if (state.get("scheduled_job") or {}).get("pinned_query"):
+            return "db"
         return "nlp"
     if last_node == "nlp":
         # DB is mandatory
         return "db"
     if last_node == "db":
+        # Scheduled result identical to the previous run: artifacts were reused
+        if state.get("unchanged"):
+            return "memory_save"
         return "csv"
     if last_node == "csv":
         return "report"
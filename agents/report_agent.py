@@ -1,21 +1,28 @@
 from typing import Dict, Any, List
 from app.logging_utils import JsonSqlLogger
+from app import artifacts
 from utils import chart_utils, pdf_utils
 
 
 def run(state: Dict[str, Any], settings, logger: JsonSqlLogger) -> Dict[str, Any]:
     run_id = state.get("run_id", "")
     rows: List[Dict[str, Any]] = state.get("data") or []
+    # Full-result counts and totals computed by the database when rows were truncated
+    aggregates: Dict[str, Any] = state.get("aggregates") or {}
+    category = aggregates.get("category") or {}
     chart_path = None
     try:
         try:
-            chart_path = chart_utils.make_bar_chart_from_rows(rows, top_k=10, title="Top categories")
+            chart_path = artifacts.save(logger.db, run_id, "chart", ".png", lambda tmp: chart_utils.make_bar_chart_from_rows(
+                rows, column=category.get("column"), top_k=10, title="Top categories", file_path=tmp,
+                counts=category.get("counts") if category else None))
         except Exception:
             chart_path = None
-        pdf_path = pdf_utils.create_pdf_summary(state.get("user_input", ""), rows, chart_path=chart_path)
-        artifacts = dict(state.get("artifacts") or {})
-        artifacts["pdf_path"] = pdf_path
-        logger.info(run_id, "report", "pdf_created", {"path": pdf_path, "chart": chart_path})
+        pdf_path = artifacts.save(logger.db, run_id, "report", ".pdf", lambda tmp: pdf_utils.create_pdf_summary(
+            state.get("user_input", ""), rows, file_path=tmp, chart_path=chart_path, aggregates=aggregates))
+        logger.info(run_id, "report", "pdf_created", {
+            "path": pdf_path, "chart": chart_path, "full_result": bool(aggregates),
+        })
         return {"status": "success", "data": {"pdf_path": pdf_path, "chart_path": chart_path}, "log": {"event": "pdf_created"}}
     except Exception as e:
         logger.exception(run_id, "report", "pdf_error", {"error": str(e)})
@@ -1,92 +1,544 @@
-from typing import Callable, Any, Dict, List, Optional
+from typing import Callable, Any, Dict, Iterator, List, Optional
+import hashlib
 import json
-from datetime import datetime
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import replace
+from datetime import datetime, timedelta
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
+from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_MISSED
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.util import obj_to_ref, ref_to_obj
+from app.config import settings
+from app.database import Database, _pg_dsn_from_settings
 from app.logging_utils import JsonSqlLogger
+from app import metrics
+
+# Arbitrary constant key for pg_advisory_lock; only the holder executes jobs
+_LEADER_LOCK_KEY = 784512093
+
+# Overrides that only affect delivery; excluded from the fingerprint and applied per subscriber
+_DELIVERY_KEYS = ("EMAIL_TO", "EMAIL_FROM", "SENDGRID_API_KEY")
+
+
+def job_fingerprint(question: str, overrides: Optional[Dict[str, Any]], incremental_column: Optional[str] = None) -> str:
+    """Hash of what determines a run's output: the question and the data-source overrides."""
+    normalized = " ".join((question or "").split()).lower()
+    data = {k: v for k, v in sorted((overrides or {}).items()) if k not in _DELIVERY_KEYS}
+    body: Dict[str, Any] = {"q": normalized, "o": data}
+    if incremental_column:
+        body["i"] = incremental_column
+    payload = json.dumps(body, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def group_id_for(question: str, overrides: Optional[Dict[str, Any]], frequency: str, time_str: str,
+                 incremental_column: Optional[str] = None) -> str:
+    fp = job_fingerprint(question, overrides, incremental_column)
+    return f"group_{fp[:16]}_{frequency}_{time_str.replace(':', '')}"
+
+
+def stagger_offset(group_id: str) -> int:
+    """Deterministic second (0-59) within the cron minute at which a group fires."""
+    window = min(max(0, int(settings.SCHEDULER_STAGGER_SECONDS)), 60)
+    if window <= 1:
+        return 0
+    return int(hashlib.sha256(group_id.encode("utf-8")).hexdigest(), 16) % window
+
+
+def source_key(cfg) -> str:
+    """Short, credential-free identifier for the data source a run will query."""
+    parts = [str(getattr(cfg, k, "") or "") for k in ("DATA_DB_TYPE", "DATA_DSN", "DATA_HOST", "DATA_PORT", "DATA_NAME")]
+    return "src_" + hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:12]
+
+
+def _settings_with(overrides: Dict[str, Any]):
+    try:
+        return replace(settings, **{k: v for k, v in overrides.items() if hasattr(settings, k)})
+    except Exception:
+        return settings
+
+
+def compile_pinned_query(question: str, overrides: Dict[str, Any], logger: JsonSqlLogger,
+                         run_id: str = "scheduler") -> Dict[str, Any]:
+    """Compile a scheduled question to SQL; {"pinned_query", "schema_hash"} or empty when unavailable."""
+    from agents import nlp_agent
+    cfg = _settings_with(overrides)
+    if not settings.SCHEDULER_PIN_SQL or str(getattr(cfg, "DATA_DB_TYPE", "")).strip().lower() == "mongodb":
+        return {}
+    try:
+        compiled = nlp_agent.compile_query(question, cfg, logger, run_id)
+    except Exception as e:
+        logger.error(run_id, "scheduler", "pin_compile_failed", {"error": str(e)})
+        return {}
+    if compiled.get("schema_hash") is None:
+        # Without a schema fingerprint the pin could never be invalidated
+        return {}
+    logger.info(run_id, "scheduler", "query_pinned", {"query": compiled["query"], "used": compiled["used"]})
+    return {"pinned_query": compiled["query"], "schema_hash": compiled["schema_hash"]}
+
+
+def _current_schema_hash(overrides: Dict[str, Any]) -> Optional[str]:
+    from utils import db_utils
+    cfg = _settings_with(overrides)
+    table = getattr(cfg, "DATA_TABLE", "")
+    if not getattr(cfg, "DATA_DB_TYPE", "") or not table:
+        return None
+    try:
+        return db_utils.schema_hash(cfg, table)
+    except Exception:
+        return None
+
+
+def _on_job_event(event) -> None:
+    """Record scheduler lag (submit time minus scheduled time) and missed runs."""
+    if event.code == EVENT_JOB_MISSED:
+        metrics.scheduler_job_missed()
+        return
+    now = datetime.now().astimezone()
+    for scheduled in getattr(event, "scheduled_run_times", None) or []:
+        metrics.observe_scheduler_lag((now - scheduled).total_seconds())
+
+
+def _scheduler_dsn() -> str:
+    # Session advisory locks do not survive a transaction-mode pooler; prefer the direct DSN
+    return settings.SUPABASE_DIRECT_DSN or _pg_dsn_from_settings()
+
+
+class _LeaderLock:
+    """Session-level Postgres advisory lock held on a dedicated connection."""
+
+    def __init__(self, dsn: str):
+        self._dsn = dsn
+        self._conn = None
+
+    def held(self) -> bool:
+        if self._conn is None or self._conn.closed:
+            return False
+        try:
+            with self._conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except Exception:
+            self.release()
+            return False
+
+    def try_acquire(self) -> bool:
+        if self.held():
+            return True
+        import psycopg2
+        try:
+            conn = psycopg2.connect(self._dsn)
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(%s)", (_LEADER_LOCK_KEY,))
+                got = bool(cur.fetchone()[0])
+        except Exception:
+            return False
+        if got:
+            self._conn = conn
+        else:
+            conn.close()
+        return got
+
+    def release(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+        self._conn = None
 
 
 class SchedulerService:
-    """Singleton scheduler service for managing scheduled jobs"""
+    """Singleton scheduler service for managing scheduled jobs.
+
+    With SCHEDULER_JOBSTORE=postgres, triggers are persisted in the app-store database
+    (apscheduler_jobs) and job metadata in scheduled_jobs, so jobs survive restarts and
+    every worker sees the same list. Each process runs a scheduler, but only the one
+    holding the advisory lock executes jobs; the others stay paused and take over if
+    the leader goes away.
+    """
     _instance: Optional[BackgroundScheduler] = None
-    _jobs_db: Dict[str, Dict[str, Any]] = {}  # In-memory job store
-    
-    @classmethod
-    def get_scheduler(cls, timezone: str = "UTC") -> BackgroundScheduler:
-        if cls._instance is None:
-            cls._instance = BackgroundScheduler(timezone=timezone)
-            cls._instance.start()
-        return cls._instance
-    
-    @classmethod
-    def add_job(cls, job_id: str, question: str, frequency: str, time_str: str, 
-                overrides: Dict[str, Any], func: Callable, logger: Optional[JsonSqlLogger] = None) -> str:
-        """Add a scheduled job with cron trigger"""
+    _db: Optional[Database] = None
+    _leader: Optional[_LeaderLock] = None
+    _lock = threading.Lock()
+    # scheduled minute -> {"groups", "executions", "subscribers", "unchanged"}; recent ticks only, leader-local
+    _tick_stats: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+    # data source -> run slots, groups deferred for a slot, and {"running", "waiting", "max_wait_seconds"}
+    # for /scheduler/stats
+    _source_slots: Dict[str, threading.BoundedSemaphore] = {}
+    _source_waiting: Dict[str, set] = {}
+    _source_stats: Dict[str, Dict[str, Any]] = {}
+
+    @classmethod
+    def get_db(cls) -> Database:
+        if cls._db is None:
+            cls._db = Database(settings.DB_PATH)
+        return cls._db
+
+    @classmethod
+    def get_scheduler(cls, timezone: Optional[str] = None) -> BackgroundScheduler:
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls._build_scheduler(timezone or settings.SCHEDULER_TIMEZONE or "UTC")
+            return cls._instance
+
+    @classmethod
+    def _build_scheduler(cls, timezone: str) -> BackgroundScheduler:
+        shared = str(settings.SCHEDULER_JOBSTORE).strip().lower() == "postgres"
+        jobstores: Dict[str, Any] = {"default": MemoryJobStore()}
+        if shared:
+            import psycopg2
+            from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+            from sqlalchemy import create_engine
+            dsn = _scheduler_dsn()
+            engine = create_engine("postgresql+psycopg2://", creator=lambda: psycopg2.connect(dsn), pool_pre_ping=True)
+            jobstores["default"] = SQLAlchemyJobStore(engine=engine, tablename="apscheduler_jobs")
+        scheduler = BackgroundScheduler(
+            timezone=timezone,
+            jobstores=jobstores,
+            executors={"default": ThreadPoolExecutor(max_workers=settings.SCHEDULER_MAX_WORKERS)},
+            job_defaults={
+                "coalesce": settings.SCHEDULER_COALESCE,
+                "misfire_grace_time": settings.SCHEDULER_MISFIRE_GRACE_SECONDS,
+                "max_instances": 1,
+            },
+        )
+        if metrics.ENABLED:
+            scheduler.add_listener(_on_job_event, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED)
+        if not shared:
+            scheduler.start()
+            return scheduler
+        cls._leader = _LeaderLock(_scheduler_dsn())
+        scheduler.start(paused=not cls._leader.try_acquire())
+        t = threading.Thread(target=cls._leader_loop, args=(scheduler,), name="scheduler-leader", daemon=True)
+        t.start()
+        return scheduler
+
+    @classmethod
+    def _leader_loop(cls, scheduler: BackgroundScheduler) -> None:
+        """Keep leadership current and make the leader notice jobs added by other workers."""
+        while True:
+            time.sleep(max(1, settings.SCHEDULER_SYNC_SECONDS))
+            leader = cls._leader
+            if leader is None:
+                return
+            try:
+                if leader.held():
+                    scheduler.wakeup()
+                elif leader.try_acquire():
+                    scheduler.resume()
+                else:
+                    scheduler.pause()
+            except Exception:
+                pass
+
+    @classmethod
+    def is_leader(cls) -> bool:
+        return cls._leader is None or cls._leader.held()
+
+    @classmethod
+    def add_job(cls, job_id: str, question: str, frequency: str, time_str: str,
+                overrides: Dict[str, Any], func: Callable, logger: Optional[JsonSqlLogger] = None,
+                incremental_column: Optional[str] = None) -> str:
+        """Add a scheduled job with cron trigger.
+
+        incremental_column names a monotonically increasing column (id, created_at); when set,
+        each run only reads rows past the previous run's high-water mark.
+        """
         scheduler = cls.get_scheduler()
-        
+
         # Parse time (HH:MM format)
         hour, minute = 0, 0
         if ":" in time_str:
             parts = time_str.split(":")
             hour = int(parts[0])
             minute = int(parts[1])
-        
+
+        # Jobs asking the same question of the same source at the same time share one trigger;
+        # members are resolved when it fires (func must be importable by reference)
+        group_id = group_id_for(question, overrides, frequency, time_str, incremental_column)
+
+        # Groups on the same HH:MM are spread across the minute (stagger) and optionally jittered
+        spread = {"second": stagger_offset(group_id), "jitter": settings.SCHEDULER_JITTER_SECONDS or None}
+
         # Build cron trigger based on frequency
         if frequency == "daily":
-            trigger = CronTrigger(hour=hour, minute=minute)
+            trigger = CronTrigger(hour=hour, minute=minute, **spread)
         elif frequency == "weekly":
-            trigger = CronTrigger(day_of_week=0, hour=hour, minute=minute)  # Monday
+            trigger = CronTrigger(day_of_week=0, hour=hour, minute=minute, **spread)  # Monday
         elif frequency == "monthly":
-            trigger = CronTrigger(day=1, hour=hour, minute=minute)  # 1st of month
+            trigger = CronTrigger(day=1, hour=hour, minute=minute, **spread)  # 1st of month
         else:
-            trigger = CronTrigger(hour=hour, minute=minute)  # Default: daily
-        
-        # Add job to scheduler
-        job = scheduler.add_job(
-            func,
+            trigger = CronTrigger(hour=hour, minute=minute, **spread)  # Default: daily
+        scheduler.add_job(
+            run_group,
             trigger=trigger,
-            id=job_id,
-            kwargs={"question": question, "overrides": overrides, "user_id": "scheduler"},
+            id=group_id,
+            kwargs={"group_id": group_id, "pipeline": obj_to_ref(func)},
             replace_existing=True
         )
-        
+
+        # Members of a group share its pinned SQL; compile only for the first one
+        db = cls.get_db()
+        peers = db.list_scheduled_jobs(group_id=group_id)
+        if peers and peers[0].get("pinned_query"):
+            pin = {"pinned_query": peers[0]["pinned_query"], "schema_hash": peers[0].get("schema_hash")}
+        else:
+            pin = compile_pinned_query(question, overrides, logger or JsonSqlLogger(db, settings.LOG_FILE))
+
         # Store job metadata
-        cls._jobs_db[job_id] = {
+        db.upsert_scheduled_job({
             "id": job_id,
             "question": question,
             "frequency": frequency,
             "time": time_str,
+            "user_id": "scheduler",
             "overrides": overrides,
             "created_at": datetime.utcnow().isoformat(),
-            "next_run": job.next_run_time.isoformat() if job.next_run_time else None,
-        }
-        
+            "group_id": group_id,
+            "incremental_column": incremental_column,
+            **pin,
+        })
+
         if logger:
-            logger.info("scheduler", "scheduler", "job_added", {"job_id": job_id, "frequency": frequency, "time": time_str})
-        
+            logger.info("scheduler", "scheduler", "job_added", {
+                "job_id": job_id, "frequency": frequency, "time": time_str, "incremental_column": incremental_column,
+            })
+
         return job_id
-    
+
     @classmethod
     def remove_job(cls, job_id: str) -> bool:
-        """Remove a scheduled job"""
+        """Remove a scheduled job; its group trigger goes away with the last member"""
         scheduler = cls.get_scheduler()
+        db = cls.get_db()
+        removed = False
         try:
-            scheduler.remove_job(job_id)
-            if job_id in cls._jobs_db:
-                del cls._jobs_db[job_id]
-            return True
+            existing = db.list_scheduled_jobs(job_id)
+            group_id = existing[0].get("group_id") if existing else None
+            removed = db.delete_scheduled_job(job_id)
+            trigger_ids = [job_id]
+            if group_id and not db.list_scheduled_jobs(group_id=group_id):
+                trigger_ids += [group_id, retry_job_id(group_id)]
         except Exception:
             return False
-    
+        for trigger_id in trigger_ids:
+            try:
+                scheduler.remove_job(trigger_id)
+                removed = True
+            except JobLookupError:
+                pass
+            except Exception:
+                return False
+        return removed
+
+    @classmethod
+    def record_tick(cls, scheduled_at: str, executions: int, subscribers: int, unchanged: int = 0) -> None:
+        with cls._lock:
+            tick = cls._tick_stats.setdefault(scheduled_at, {"groups": 0, "executions": 0, "subscribers": 0, "unchanged": 0})
+            tick["groups"] += 1
+            tick["executions"] += executions
+            tick["subscribers"] += subscribers
+            tick["unchanged"] += unchanged
+            while len(cls._tick_stats) > 200:
+                cls._tick_stats.popitem(last=False)
+        metrics.observe_scheduler_group(executions, subscribers)
+
+    @classmethod
+    def tick_stats(cls) -> List[Dict[str, Any]]:
+        with cls._lock:
+            return [{"tick": k, **v} for k, v in reversed(cls._tick_stats.items())]
+
+    @classmethod
+    @contextmanager
+    def source_slot(cls, source: str, group_id: str) -> Iterator[bool]:
+        """Take one of the source's SCHEDULER_SOURCE_CONCURRENCY slots if one is free; yields whether it was.
+
+        Never blocks: a worker parked on a busy source would hold up groups on every other
+        source, so the caller defers the group (defer_group) and it counts as waiting until
+        a retry gets a slot.
+        """
+        with cls._lock:
+            slot = cls._source_slots.get(source)
+            if slot is None:
+                slot = cls._source_slots[source] = threading.BoundedSemaphore(max(1, settings.SCHEDULER_SOURCE_CONCURRENCY))
+            stats = cls._source_stats.setdefault(source, {"running": 0, "waiting": 0, "max_wait_seconds": 0.0})
+            waiting = cls._source_waiting.setdefault(source, set())
+        if not slot.acquire(blocking=False):
+            with cls._lock:
+                waiting.add(group_id)
+                stats["waiting"] = len(waiting)
+            yield False
+            return
+        with cls._lock:
+            waiting.discard(group_id)
+            stats["waiting"] = len(waiting)
+            stats["running"] += 1
+        try:
+            yield True
+        finally:
+            with cls._lock:
+                stats["running"] -= 1
+            slot.release()
+
+    @classmethod
+    def record_queue_wait(cls, source: str, waited: float) -> None:
+        with cls._lock:
+            stats = cls._source_stats.setdefault(source, {"running": 0, "waiting": 0, "max_wait_seconds": 0.0})
+            stats["max_wait_seconds"] = max(stats["max_wait_seconds"], round(waited, 3))
+        metrics.observe_scheduler_queue_wait(source, waited)
+
+    @classmethod
+    def defer_group(cls, group_id: str, pipeline: str, queued_at: float) -> datetime:
+        """Run the group again after SCHEDULER_SOURCE_RETRY_SECONDS (+-50% jitter) as a one-off trigger."""
+        delay = max(1.0, settings.SCHEDULER_SOURCE_RETRY_SECONDS) * random.uniform(0.5, 1.5)
+        run_date = datetime.now().astimezone() + timedelta(seconds=delay)
+        cls.get_scheduler().add_job(
+            run_group,
+            trigger=DateTrigger(run_date=run_date),
+            id=retry_job_id(group_id),
+            kwargs={"group_id": group_id, "pipeline": pipeline, "queued_at": queued_at},
+            replace_existing=True,
+        )
+        return run_date
+
+    @classmethod
+    def source_stats(cls) -> Dict[str, Dict[str, Any]]:
+        with cls._lock:
+            return {k: {"limit": max(1, settings.SCHEDULER_SOURCE_CONCURRENCY), **v} for k, v in cls._source_stats.items()}
+
+    @classmethod
+    def _with_next_run(cls, job: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            ap_job = cls.get_scheduler().get_job(job.get("group_id") or job["id"])
+        except Exception:
+            ap_job = None
+        job["next_run"] = ap_job.next_run_time.isoformat() if ap_job and ap_job.next_run_time else None
+        return job
+
     @classmethod
     def list_jobs(cls) -> List[Dict[str, Any]]:
         """List all scheduled jobs"""
-        return list(cls._jobs_db.values())
-    
+        return [cls._with_next_run(j) for j in cls.get_db().list_scheduled_jobs()]
+
     @classmethod
     def get_job(cls, job_id: str) -> Optional[Dict[str, Any]]:
         """Get job details by ID"""
-        return cls._jobs_db.get(job_id)
+        jobs = cls.get_db().list_scheduled_jobs(job_id)
+        return cls._with_next_run(jobs[0]) if jobs else None
+
+
+def retry_job_id(group_id: str) -> str:
+    """Trigger id of a group's pending retry after its data source was busy."""
+    return f"{group_id}:retry"
+
+
+def run_group(group_id: str, pipeline: str = "main:run_once", queued_at: Optional[float] = None) -> Dict[str, Any]:
+    """Fire a job group: run the pipeline once, then deliver the artifacts to every member.
+
+    The shared run has email suppressed; each member's recipients and sender come from
+    its own overrides, and identical delivery targets are only sent once.
+    """
+    from agents import email_agent
+
+    db = SchedulerService.get_db()
+    logger = JsonSqlLogger(db, settings.LOG_FILE)
+    tick = datetime.utcnow().strftime("%Y-%m-%dT%H:%M")
+    members = db.list_scheduled_jobs(group_id=group_id)
+    if not members:
+        logger.info("scheduler", "scheduler", "group_empty", {"group_id": group_id})
+        return {"status": "skipped", "group_id": group_id, "executions": 0}
+
+    lead = members[0]
+    shared = {k: v for k, v in (lead.get("overrides") or {}).items() if k not in _DELIVERY_KEYS}
+    shared["EMAIL_TO"] = ""
+    run = ref_to_obj(pipeline)
+    job_context: Dict[str, Any] = {"group_id": group_id}
+    incremental_column = lead.get("incremental_column")
+    job_state = db.get_job_state(group_id) if (incremental_column or settings.SCHEDULER_SKIP_UNCHANGED) else {}
+    if incremental_column:
+        job_context["incremental"] = {"column": incremental_column, "state": job_state}
+    if settings.SCHEDULER_SKIP_UNCHANGED and job_state.get("result_hash"):
+        previous_artifacts = job_state.get("artifacts") or {}
+        if previous_artifacts and all(p and os.path.exists(p) for p in previous_artifacts.values()):
+            job_context["previous_result"] = {"result_hash": job_state["result_hash"], "artifacts": previous_artifacts}
+    if settings.SCHEDULER_PIN_SQL:
+        # Reuse the SQL compiled at schedule time; recompile only when the table schema changed
+        pinned, pinned_hash = lead.get("pinned_query"), lead.get("schema_hash")
+        current_hash = _current_schema_hash(shared) if pinned else None
+        if not pinned or (current_hash is not None and current_hash != pinned_hash):
+            pin = compile_pinned_query(lead["question"], shared, logger)
+            if pin:
+                db.set_pinned_query(group_id, pin["pinned_query"], pin["schema_hash"])
+                logger.info("scheduler", "scheduler", "pin_recompiled", {
+                    "group_id": group_id, "reason": "schema_changed" if pinned else "missing",
+                })
+            pinned = pin.get("pinned_query")
+        if pinned:
+            job_context["pinned_query"] = pinned
+    source = source_key(_settings_with(shared))
+    # When the data source is saturated, try again later rather than hold a scheduler worker
+    with SchedulerService.source_slot(source, group_id) as held:
+        if not held:
+            queued_at = queued_at or time.time()
+            retry_at = SchedulerService.defer_group(group_id, pipeline, queued_at)
+            logger.info("scheduler", "scheduler", "group_deferred", {
+                "group_id": group_id, "source": source, "retry_at": retry_at.isoformat(),
+                "queued_seconds": round(time.time() - queued_at, 3),
+            })
+            return {"status": "deferred", "group_id": group_id, "executions": 0, "retry_at": retry_at.isoformat()}
+        queue_wait = time.time() - queued_at if queued_at else 0.0
+        SchedulerService.record_queue_wait(source, queue_wait)
+        out = run(question=lead["question"], overrides=shared, user_id=lead.get("user_id") or "scheduler",
+                  job_context=job_context)
+    run_id = out.get("run_id", "")
+    if incremental_column and out.get("incremental_state"):
+        db.save_job_state(group_id, out["incremental_state"])
+    artifacts = out.get("artifacts") or {}
+    unchanged = out.get("status") == "skipped_unchanged"
+    if settings.SCHEDULER_SKIP_UNCHANGED and out.get("status") == "success" and out.get("result_hash"):
+        db.save_result_state(group_id, out["result_hash"], artifacts)
+
+    deliveries: List[Dict[str, Any]] = []
+    sent: Dict[str, str] = {}
+    for m in members:
+        if unchanged:
+            deliveries.append({"job_id": m["id"], "status": "skipped_unchanged"})
+            continue
+        cfg = _settings_with(m.get("overrides") or {})
+        target = json.dumps([cfg.EMAIL_TO, cfg.EMAIL_FROM, cfg.SENDGRID_API_KEY])
+        if target in sent:
+            deliveries.append({"job_id": m["id"], "status": sent[target], "deduplicated": True})
+            continue
+        res = email_agent.run({"run_id": run_id, "job_id": m["id"], "user_input": m["question"], "artifacts": artifacts},
+                              cfg, logger)
+        sent[target] = res.get("status", "error")
+        deliveries.append({"job_id": m["id"], "status": sent[target]})
+
+    SchedulerService.record_tick(tick, 1, len(members), int(unchanged))
+    logger.info(run_id or "scheduler", "scheduler", "group_fired", {
+        "group_id": group_id,
+        "tick": tick,
+        "subscribers": len(members),
+        "executions": 1,
+        "executions_saved": len(members) - 1,
+        "run_status": out.get("status"),
+        "source": source,
+        "queue_wait_seconds": round(queue_wait, 3),
+        "unchanged": unchanged,
+        "deliveries": deliveries,
+    })
+    return {"status": out.get("status"), "group_id": group_id, "run_id": run_id, "executions": 1, "deliveries": deliveries}
 
 
 def build_cron_dict(frequency: str, time_str: str) -> Dict[str, Any]:
@@ -96,7 +548,7 @@ def build_cron_dict(frequency: str, time_str: str) -> Dict[str, Any]:
         parts = time_str.split(":")
         hour = int(parts[0])
         minute = int(parts[1])
-    
+
     if frequency == "daily":
         return {"hour": hour, "minute": minute}
     elif frequency == "weekly":
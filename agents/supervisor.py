@@ -6,7 +6,7 @@ def check(node_name: str, last_result: Dict[str, Any]):
     if not last_result:
         return False, "no_result"
     status = last_result.get("status")
-    if status not in ("success", "skipped"):
+    if status not in ("success", "skipped", "queued"):
         return False, "node_failed"
     if node_name == "nlp":
         data = last_result.get("data") or {}
@@ -33,6 +33,8 @@ def check(node_name: str, last_result: Dict[str, Any]):
         status = last_result.get("status")
         if status == "skipped":
             return True, "email_skipped"
+        if status == "queued":
+            return True, "email_queued"
         if status != "success":
             return False, "email_not_sent"
     return True, "ok"
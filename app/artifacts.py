@@ -0,0 +1,334 @@
+"""Artifact files (CSV, charts, PDFs): per-run directories, an index table and GC.
+
+Files are written to artifacts/<run_id>/<kind><ext> through a temporary name and
+renamed into place, so concurrent runs never share a path and readers never see a
+partial file. Every file is recorded in the app store's artifacts table, which backs
+the /artifacts listing and the TTL / total-size eviction done by ArtifactGC.
+"""
+import gzip
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.config import settings
+
+try:
+    import brotli  # type: ignore
+except Exception:  # pragma: no cover
+    brotli = None
+
+ROOT = "artifacts"
+# Derived files written next to an artifact (gzip for email, precompressed downloads)
+VARIANT_SUFFIXES = (".gz", ".br")
+# Text formats worth precompressing; PNG/PDF are already compressed
+COMPRESSIBLE_EXTS = (".csv", ".json", ".txt", ".svg", ".html")
+# Moderate levels: near-maximal ratios on CSV at a fraction of gzip -9 / brotli 11 time
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+_CHUNK = 1024 * 1024
+
+_SAFE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def run_dir(run_id: str) -> str:
+    return os.path.join(ROOT, _SAFE.sub("_", run_id or "adhoc") or "adhoc")
+
+
+def sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def save(db, run_id: str, kind: str, ext: str, write: Callable[[str], Any]) -> Optional[str]:
+    """Have write() produce the file at a temporary path, then publish and index it.
+
+    Returns the final path, or None when write() produced nothing (e.g. no chart).
+    """
+    directory = run_dir(run_id)
+    os.makedirs(directory, exist_ok=True)
+    final = os.path.join(directory, f"{kind}{ext}")
+    n = 1
+    while os.path.exists(final):
+        n += 1
+        final = os.path.join(directory, f"{kind}-{n}{ext}")
+    # Keep the extension last: matplotlib picks the output format from it
+    tmp = os.path.join(directory, f".{kind}.{uuid.uuid4().hex}.tmp{ext}")
+    try:
+        write(tmp)
+        if not os.path.exists(tmp):
+            return None
+        os.replace(tmp, final)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    if settings.ARTIFACTS_PRECOMPRESS and ext.lower() in COMPRESSIBLE_EXTS:
+        precompress_async(final)
+    try:
+        db.insert_artifact(run_id, kind, final, os.path.getsize(final), sha256_file(final))
+    except Exception as e:
+        # The file is usable without its index row; GC sweeps it by age
+        print(f"[Artifacts] index insert failed for {final}: {e}")
+    return final
+
+
+def _write_variant(path: str, suffix: str, compressor: Callable[[Any], Any]) -> None:
+    """Stream `path` through compressor(fileobj) into path + suffix, chunk by chunk.
+
+    compressor wraps the output file in a writable object with write() and close().
+    Variants are only kept when they actually save space.
+    """
+    tmp = f"{path}{suffix}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(path, "rb") as src, open(tmp, "wb") as raw:
+            dst = compressor(raw)
+            for chunk in iter(lambda: src.read(_CHUNK), b""):
+                dst.write(chunk)
+            dst.close()
+        if os.path.getsize(tmp) < os.path.getsize(path) * 0.9:
+            os.replace(tmp, path + suffix)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class _BrotliWriter:
+    def __init__(self, raw):
+        self._raw = raw
+        self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def write(self, data: bytes) -> None:
+        self._raw.write(self._c.process(data))
+
+    def close(self) -> None:
+        self._raw.write(self._c.finish())
+
+
+def precompress(path: str) -> None:
+    """Write .gz (and .br when brotli is installed) next to a finished artifact."""
+    if os.path.getsize(path) < 1024:
+        return
+    _write_variant(path, ".gz", lambda raw: gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=GZIP_LEVEL, mtime=0))
+    if brotli is not None:
+        _write_variant(path, ".br", _BrotliWriter)
+
+
+# One background thread: compression never adds to a run's latency, and downloads fall back to
+# the plain file until the variant is in place (select_encoding checks it exists and is current)
+_compress_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="artifact-compress")
+
+
+def _precompress_logged(path: str) -> None:
+    try:
+        precompress(path)
+    except Exception as e:
+        print(f"[Artifacts] precompress failed for {path}: {e}")
+
+
+def precompress_async(path: str) -> None:
+    _compress_pool.submit(_precompress_logged, path)
+
+
+# (path, mtime_ns, size) -> sha256, so repeated downloads do not rehash the file
+_etag_cache: Dict[Tuple[str, int, int], str] = {}
+_etag_lock = threading.Lock()
+
+
+def content_hash(path: str) -> str:
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    with _etag_lock:
+        cached = _etag_cache.get(key)
+    if cached:
+        return cached
+    digest = sha256_file(path)
+    with _etag_lock:
+        if len(_etag_cache) > 4096:
+            _etag_cache.clear()
+        _etag_cache[key] = digest
+    return digest
+
+
+def resolve(rel_path: str) -> Optional[str]:
+    """Map a URL path under /artifacts to a servable file, rejecting traversal and temp files."""
+    root = os.path.abspath(ROOT)
+    full = os.path.abspath(os.path.join(root, rel_path))
+    if os.path.commonpath([root, full]) != root or not os.path.isfile(full):
+        return None
+    if any(part.startswith(".") for part in os.path.relpath(full, root).split(os.sep)):
+        return None
+    return full
+
+
+def is_immutable(path: str) -> bool:
+    # Files inside a run directory are written once under a unique name and never modified
+    return os.path.dirname(os.path.abspath(path)) != os.path.abspath(ROOT)
+
+
+def select_encoding(path: str, accept_encoding: str) -> Tuple[str, Optional[str]]:
+    """Pick the precompressed variant the client accepts: (file to send, content-encoding)."""
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0 and os.path.exists(path + suffix):
+            if os.path.getmtime(path + suffix) >= os.path.getmtime(path):
+                return path + suffix, encoding
+    return path, None
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Single byte range -> (start, end) inclusive; None for absent, multi-range or invalid input.
+
+    Raises ValueError when the range is syntactically valid but unsatisfiable.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    spec = header[len("bytes="):].strip()
+    start_s, sep, end_s = spec.partition("-")
+    if not sep:
+        return None
+    try:
+        if not start_s:
+            length = int(end_s)
+            if length <= 0:
+                raise ValueError("empty suffix range")
+            return max(0, size - length), size - 1
+        start = int(start_s)
+        end = int(end_s) if end_s else size - 1
+    except ValueError:
+        if start_s.isdigit() or end_s.isdigit():
+            raise
+        return None
+    if start >= size:
+        raise ValueError("unsatisfiable range")
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def iter_file(path: str, start: int = 0, end: Optional[int] = None, chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = (end - start + 1) if end is not None else None
+        while remaining is None or remaining > 0:
+            chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def _remove(path: str) -> int:
+    freed = 0
+    for p in [path] + [path + s for s in VARIANT_SUFFIXES]:
+        try:
+            freed += os.path.getsize(p)
+            os.remove(p)
+        except OSError:
+            pass
+    return freed
+
+
+def collect(db) -> Dict[str, int]:
+    """One GC pass: expire by ARTIFACTS_TTL_HOURS, evict oldest above ARTIFACTS_MAX_BYTES,
+    then sweep unindexed files older than the TTL and empty run directories."""
+    deleted, freed = 0, 0
+    ttl = settings.ARTIFACTS_TTL_HOURS
+    cutoff = (datetime.utcnow() - timedelta(hours=ttl)).isoformat() if ttl > 0 else None
+
+    def _evict(rows: List[Dict[str, Any]]) -> None:
+        nonlocal deleted, freed
+        for r in rows:
+            freed += _remove(r["path"])
+        db.delete_artifacts([r["id"] for r in rows])
+        deleted += len(rows)
+
+    if cutoff:
+        while True:
+            rows = db.oldest_artifacts(500, created_before=cutoff)
+            if not rows:
+                break
+            _evict(rows)
+    if settings.ARTIFACTS_MAX_BYTES > 0:
+        excess = db.artifacts_total_bytes() - settings.ARTIFACTS_MAX_BYTES
+        while excess > 0:
+            rows = db.oldest_artifacts(100)
+            if not rows:
+                break
+            batch, size = [], 0
+            for r in rows:
+                batch.append(r)
+                size += int(r.get("size_bytes") or 0)
+                if size >= excess:
+                    break
+            _evict(batch)
+            excess -= size
+
+    if cutoff and os.path.isdir(ROOT):
+        oldest_mtime = time.time() - ttl * 3600
+        for dirpath, dirnames, filenames in os.walk(ROOT, topdown=False):
+            for name in filenames:
+                p = os.path.join(dirpath, name)
+                try:
+                    if os.path.getmtime(p) < oldest_mtime:
+                        freed += os.path.getsize(p)
+                        os.remove(p)
+                except OSError:
+                    pass
+            if dirpath != ROOT:
+                try:
+                    os.rmdir(dirpath)  # only succeeds when empty
+                except OSError:
+                    pass
+    return {"deleted": deleted, "freed_bytes": freed}
+
+
+class ArtifactGC:
+    """Background thread running collect() every ARTIFACTS_GC_INTERVAL_SECONDS."""
+    _thread: Optional[threading.Thread] = None
+    _stop = threading.Event()
+    _lock = threading.Lock()
+
+    @classmethod
+    def start(cls, db) -> None:
+        with cls._lock:
+            if settings.ARTIFACTS_GC_INTERVAL_SECONDS <= 0 or (cls._thread is not None and cls._thread.is_alive()):
+                return
+            cls._stop.clear()
+            cls._thread = threading.Thread(target=cls._loop, args=(db,), name="artifact-gc", daemon=True)
+            cls._thread.start()
+
+    @classmethod
+    def stop(cls) -> None:
+        cls._stop.set()
+        with cls._lock:
+            cls._thread = None
+
+    @classmethod
+    def _loop(cls, db) -> None:
+        while not cls._stop.is_set():
+            try:
+                stats = collect(db)
+                if stats["deleted"] or stats["freed_bytes"]:
+                    print(f"[Artifacts] GC removed {stats['deleted']} artifacts, {stats['freed_bytes']} bytes")
+            except Exception as e:
+                print(f"[Artifacts] GC failed: {e}")
+            cls._stop.wait(settings.ARTIFACTS_GC_INTERVAL_SECONDS)
@@ -7,13 +7,85 @@ load_dotenv()
 @dataclass
 class Settings:
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    # OpenAI-compatible endpoint override (e.g. scripts/openai_stub_server.py); empty uses the SDK default
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "")
+    OPENAI_TIMEOUT_SECONDS: float = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "30"))
+    OPENAI_MAX_RETRIES: int = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+    # Stream completions and stop reading once a complete SQL statement has arrived
+    OPENAI_STREAM: bool = os.getenv("OPENAI_STREAM", "false").strip().lower() in ("1", "true", "yes")
+    # Answer common question shapes (top N, count by, sum by, sample rows) from the schema without the LLM
+    NLP_TEMPLATES_ENABLED: bool = os.getenv("NLP_TEMPLATES_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+    NLP_TEMPLATE_MIN_CONFIDENCE: float = float(os.getenv("NLP_TEMPLATE_MIN_CONFIDENCE", "0.8"))
+    # Reuse SQL of earlier questions (per table schema) whose TF-IDF similarity reaches the threshold
+    NLP_SIMILARITY_ENABLED: bool = os.getenv("NLP_SIMILARITY_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+    NLP_SIMILARITY_THRESHOLD: float = float(os.getenv("NLP_SIMILARITY_THRESHOLD", "0.85"))
+    # Wide tables: prompt only the most relevant columns (0 disables either limit); ALWAYS is comma-separated
+    NLP_SCHEMA_MAX_COLUMNS: int = int(os.getenv("NLP_SCHEMA_MAX_COLUMNS", "60"))
+    NLP_SCHEMA_TOKEN_BUDGET: int = int(os.getenv("NLP_SCHEMA_TOKEN_BUDGET", "1500"))
+    NLP_SCHEMA_ALWAYS_COLUMNS: str = os.getenv("NLP_SCHEMA_ALWAYS_COLUMNS", "")
+    NLP_SIMILARITY_MAX_ENTRIES: int = int(os.getenv("NLP_SIMILARITY_MAX_ENTRIES", "500"))
+    # How often each process checks question_cache for entries added or trimmed by other workers (0: every lookup)
+    NLP_SIMILARITY_RELOAD_SECONDS: float = float(os.getenv("NLP_SIMILARITY_RELOAD_SECONDS", "5"))
+    # When the fetched rows were truncated, compute chart counts and numeric totals in the database
+    REPORT_AGGREGATE_PUSHDOWN: bool = os.getenv("REPORT_AGGREGATE_PUSHDOWN", "true").strip().lower() in ("1", "true", "yes")
+    # Server-side statement timeout for data-source queries (0 disables)
+    QUERY_TIMEOUT_SECONDS: float = float(os.getenv("QUERY_TIMEOUT_SECONDS", "30"))
+    # EXPLAIN queries first and refuse those whose planner estimate is above this (0 disables). Units are
+    # the engine's: Postgres total cost, MySQL query_cost, SQLite estimated rows visited
+    QUERY_MAX_COST: float = float(os.getenv("QUERY_MAX_COST", "0"))
+    # When a question's SQL fails: retry once with the DB error fed to a template/LLM repair step
+    DB_FALLBACK_REPAIR: bool = os.getenv("DB_FALLBACK_REPAIR", "true").strip().lower() in ("1", "true", "yes")
+    # Then answer with a bounded sample of DATA_TABLE: this many rows, TABLESAMPLE percent of pages on Postgres
+    DB_FALLBACK_ROWS: int = int(os.getenv("DB_FALLBACK_ROWS", "100"))
+    DB_FALLBACK_SAMPLE_PERCENT: float = float(os.getenv("DB_FALLBACK_SAMPLE_PERCENT", "1"))
     SENDGRID_API_KEY: str = os.getenv("SENDGRID_API_KEY", "")
     EMAIL_FROM: str = os.getenv("EMAIL_FROM", "")
     EMAIL_TO: str = os.getenv("EMAIL_TO", "")
+    # SendGrid endpoint; point at a local stand-in (scripts/sendgrid_standin.py) for testing
+    SENDGRID_API_HOST: str = os.getenv("SENDGRID_API_HOST", "https://api.sendgrid.com")
+    # CSV attachments above this size are gzipped before sending
+    EMAIL_GZIP_THRESHOLD_BYTES: int = int(os.getenv("EMAIL_GZIP_THRESHOLD_BYTES", str(1024 * 1024)))
+    # Encoded attachment budget per message (SendGrid caps the whole message at 30MB); larger files are linked
+    EMAIL_ATTACHMENT_MAX_BYTES: int = int(os.getenv("EMAIL_ATTACHMENT_MAX_BYTES", str(20 * 1024 * 1024)))
+    # Public URL of the /artifacts mount, used for download links in emails (empty: never link, only attach)
+    ARTIFACTS_BASE_URL: str = os.getenv("ARTIFACTS_BASE_URL", "")
+    # Write .gz/.br copies of text artifacts for compressed downloads
+    ARTIFACTS_PRECOMPRESS: bool = os.getenv("ARTIFACTS_PRECOMPRESS", "true").strip().lower() in ("1", "true", "yes")
+    # Artifact retention: age limit, total size cap (0 disables either) and GC cadence
+    ARTIFACTS_TTL_HOURS: int = int(os.getenv("ARTIFACTS_TTL_HOURS", "168"))
+    ARTIFACTS_MAX_BYTES: int = int(os.getenv("ARTIFACTS_MAX_BYTES", str(5 * 1024 * 1024 * 1024)))
+    ARTIFACTS_GC_INTERVAL_SECONDS: int = int(os.getenv("ARTIFACTS_GC_INTERVAL_SECONDS", "3600"))
+    # Hand emails to the email_outbox table and deliver them from a background worker
+    EMAIL_OUTBOX_ENABLED: bool = os.getenv("EMAIL_OUTBOX_ENABLED", "false").strip().lower() in ("1", "true", "yes")
+    EMAIL_OUTBOX_CONCURRENCY: int = int(os.getenv("EMAIL_OUTBOX_CONCURRENCY", "4"))
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "6"))
+    EMAIL_OUTBOX_BACKOFF_SECONDS: int = int(os.getenv("EMAIL_OUTBOX_BACKOFF_SECONDS", "30"))
+    EMAIL_OUTBOX_BACKOFF_MAX_SECONDS: int = int(os.getenv("EMAIL_OUTBOX_BACKOFF_MAX_SECONDS", "3600"))
+    EMAIL_OUTBOX_POLL_SECONDS: int = int(os.getenv("EMAIL_OUTBOX_POLL_SECONDS", "5"))
     DB_PATH: str = os.getenv("DB_PATH", "logs/app.db")
     LOG_FILE: str = os.getenv("LOG_FILE", "logs/events.jsonl")
     ENV: str = os.getenv("ENV", "dev")
     SCHEDULER_TIMEZONE: str = os.getenv("SCHEDULER_TIMEZONE", "UTC")
+    # Scheduler job store: postgres (shared, survives restarts) | memory
+    SCHEDULER_JOBSTORE: str = os.getenv("SCHEDULER_JOBSTORE", "postgres")
+    SCHEDULER_MAX_WORKERS: int = int(os.getenv("SCHEDULER_MAX_WORKERS", "10"))
+    SCHEDULER_COALESCE: bool = os.getenv("SCHEDULER_COALESCE", "true").strip().lower() in ("1", "true", "yes")
+    SCHEDULER_MISFIRE_GRACE_SECONDS: int = int(os.getenv("SCHEDULER_MISFIRE_GRACE_SECONDS", "300"))
+    # How often the leader re-reads the shared store and followers retry leadership
+    SCHEDULER_SYNC_SECONDS: int = int(os.getenv("SCHEDULER_SYNC_SECONDS", "30"))
+    # Upper bound on stored groups for incremental aggregate refresh; above it jobs refresh in full
+    SCHEDULER_INCREMENTAL_MAX_GROUPS: int = int(os.getenv("SCHEDULER_INCREMENTAL_MAX_GROUPS", "10000"))
+    # Spread jobs sharing a cron time: fixed per-group offset (0-59s) plus random jitter
+    SCHEDULER_STAGGER_SECONDS: int = int(os.getenv("SCHEDULER_STAGGER_SECONDS", "30"))
+    SCHEDULER_JITTER_SECONDS: int = int(os.getenv("SCHEDULER_JITTER_SECONDS", "0"))
+    # Concurrent scheduled runs per data source; further runs are retried after SCHEDULER_SOURCE_RETRY_SECONDS
+    SCHEDULER_SOURCE_CONCURRENCY: int = int(os.getenv("SCHEDULER_SOURCE_CONCURRENCY", "2"))
+    SCHEDULER_SOURCE_RETRY_SECONDS: float = float(os.getenv("SCHEDULER_SOURCE_RETRY_SECONDS", "30"))
+    # Compile a scheduled question to SQL once and reuse it until the table schema changes
+    SCHEDULER_PIN_SQL: bool = os.getenv("SCHEDULER_PIN_SQL", "true").strip().lower() in ("1", "true", "yes")
+    # Skip csv/report/email for a scheduled run whose result set is identical to the previous one
+    SCHEDULER_SKIP_UNCHANGED: bool = os.getenv("SCHEDULER_SKIP_UNCHANGED", "false").strip().lower() in ("1", "true", "yes")
     # External data source (relational)
     DATA_DB_TYPE: str = os.getenv("DATA_DB_TYPE", "")  # mysql | postgres | sqlite
     DATA_HOST: str = os.getenv("DATA_HOST", "")
@@ -25,6 +97,16 @@ class Settings:
     # Optional for Postgres/Supabase data source
     DATA_DSN: str = os.getenv("DATA_DSN", "")
     DATA_SSLMODE: str = os.getenv("DATA_SSLMODE", "")
+    # Read replicas of the data source, comma-separated DSNs or host[:port] (same user/password/database).
+    # Queries go to the fastest healthy replica within the lag limit; the primary is the last resort
+    DATA_REPLICAS: str = os.getenv("DATA_REPLICAS", "")
+    DATA_REPLICA_MAX_LAG_SECONDS: float = float(os.getenv("DATA_REPLICA_MAX_LAG_SECONDS", "30"))
+    DATA_REPLICA_PROBE_SECONDS: float = float(os.getenv("DATA_REPLICA_PROBE_SECONDS", "15"))
+    # Worker threads the db MCP server runs queries on, so one server keeps many in flight (0: inline)
+    DB_SERVER_WORKERS: int = int(os.getenv("DB_SERVER_WORKERS", "8"))
+    # MongoDB data source: connections per pooled client and documents per cursor batch
+    MONGO_MAX_POOL_SIZE: int = int(os.getenv("MONGO_MAX_POOL_SIZE", "20"))
+    MONGO_BATCH_SIZE: int = int(os.getenv("MONGO_BATCH_SIZE", "100"))
 
     # Supabase/Postgres (internal app store)
     SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
@@ -40,4 +122,7 @@ class Settings:
     PGUSER: str = os.getenv("PGUSER", "")
     PGPASSWORD: str = os.getenv("PGPASSWORD", "")
 
+    # Observability: expose Prometheus metrics on /metrics (requires prometheus_client)
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "false").strip().lower() in ("1", "true", "yes")
+
 settings = Settings()
@@ -1,13 +1,16 @@
 import os
 import json
+import math
 import threading
-from datetime import datetime
-from typing import Optional, Dict, Any, List
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple
 
 import psycopg2
+import psycopg2.extensions as pg_ext
 import psycopg2.extras as pg_extras
 
 from app.config import settings
+from app import metrics
 
 
 def _pg_dsn_from_settings() -> str:
@@ -24,15 +27,49 @@ def _pg_dsn_from_settings() -> str:
     return f"host={host} port={port} dbname={db} user={user} password={pwd} sslmode=require"
 
 
+class _TrackedConnection(pg_ext.connection):
+    """psycopg2 connection that reports open app-store connections to metrics."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        metrics.app_store_connection_opened()
+
+    def close(self):
+        if not self.closed:
+            metrics.app_store_connection_closed()
+        super().close()
+
+
+def _jsonb_safe(value: Any) -> Any:
+    """Copy of a log payload that jsonb accepts: no NaN/Infinity and no NUL characters."""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, str):
+        return value.replace("\x00", "")
+    if isinstance(value, dict):
+        return {str(k).replace("\x00", ""): _jsonb_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [_jsonb_safe(v) for v in value]
+    return value
+
+
+# DSNs whose schema has already been created in this process; avoids re-running DDL on every request
+_schema_ready: set = set()
+_schema_lock = threading.Lock()
+
+
 class Database:
     def __init__(self, db_path: Optional[str] = None):
         # db_path kept for backward compatibility; not used for Postgres
         self._lock = threading.Lock()
         self._dsn = _pg_dsn_from_settings()
-        self.init_db()
+        with _schema_lock:
+            if self._dsn not in _schema_ready:
+                self.init_db()
+                _schema_ready.add(self._dsn)
 
     def _connect(self):
-        conn = psycopg2.connect(self._dsn)
+        conn = psycopg2.connect(self._dsn, connection_factory=_TrackedConnection if metrics.ENABLED else None)
         conn.autocommit = True
         return conn
 
@@ -46,7 +83,7 @@ class Database:
                 level TEXT,
                 node TEXT,
                 event TEXT,
-                data TEXT
+                data JSONB
             )
             """,
             """
@@ -69,8 +106,112 @@ class Database:
                 content TEXT
             )
             """,
-            "CREATE INDEX IF NOT EXISTS idx_logs_run_id ON logs(run_id)",
+            # Older deployments created logs.data as TEXT; convert in place (once) so payload filters can use
+            # the GIN index. Rows that are not valid JSON are kept as {"raw": <text>} instead of failing startup
+            """
+            DO $$
+            BEGIN
+              IF EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = 'logs'
+                  AND column_name = 'data' AND data_type = 'text'
+              ) THEN
+                EXECUTE $f$
+                  CREATE OR REPLACE FUNCTION pg_temp.logs_data_to_jsonb(t TEXT) RETURNS JSONB AS $b$
+                  BEGIN
+                    RETURN COALESCE(NULLIF(t, ''), '{}')::jsonb;
+                  EXCEPTION WHEN others THEN
+                    RETURN jsonb_build_object('raw', t);
+                  END $b$ LANGUAGE plpgsql
+                $f$;
+                ALTER TABLE logs ALTER COLUMN data TYPE JSONB USING pg_temp.logs_data_to_jsonb(data);
+              END IF;
+            END $$
+            """,
+            "DROP INDEX IF EXISTS idx_logs_run_id",
+            # Composite (filter, id) indexes back the keyset cursors used by get_logs
+            "CREATE INDEX IF NOT EXISTS idx_logs_run_id_id ON logs(run_id, id)",
+            "CREATE INDEX IF NOT EXISTS idx_logs_level_id ON logs(level, id)",
+            "CREATE INDEX IF NOT EXISTS idx_logs_node_event_id ON logs(node, event, id)",
+            "CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp)",
+            "CREATE INDEX IF NOT EXISTS idx_logs_data ON logs USING GIN (data jsonb_path_ops)",
             "CREATE INDEX IF NOT EXISTS idx_mem_user_id ON memory_messages(user_id)",
+            """
+            CREATE TABLE IF NOT EXISTS scheduled_jobs (
+                job_id TEXT PRIMARY KEY,
+                question TEXT,
+                frequency TEXT,
+                time TEXT,
+                user_id TEXT,
+                overrides JSONB,
+                created_at TEXT
+            )
+            """,
+            # Jobs with the same question/data source/schedule share one trigger and one pipeline run
+            "ALTER TABLE scheduled_jobs ADD COLUMN IF NOT EXISTS group_id TEXT",
+            "CREATE INDEX IF NOT EXISTS idx_sched_group_id ON scheduled_jobs(group_id)",
+            "ALTER TABLE scheduled_jobs ADD COLUMN IF NOT EXISTS incremental_column TEXT",
+            "ALTER TABLE scheduled_jobs ADD COLUMN IF NOT EXISTS pinned_query TEXT",
+            "ALTER TABLE scheduled_jobs ADD COLUMN IF NOT EXISTS schema_hash TEXT",
+            # Per-group state carried between scheduled runs (high-water mark and merged result)
+            """
+            CREATE TABLE IF NOT EXISTS scheduled_job_state (
+                group_id TEXT PRIMARY KEY,
+                incremental JSONB,
+                updated_at TEXT
+            )
+            """,
+            "ALTER TABLE scheduled_job_state ADD COLUMN IF NOT EXISTS result_hash TEXT",
+            "ALTER TABLE scheduled_job_state ADD COLUMN IF NOT EXISTS artifacts JSONB",
+            # Durable email queue drained by agents.email_outbox; timestamps are UTC ISO strings
+            """
+            CREATE TABLE IF NOT EXISTS email_outbox (
+                id BIGSERIAL PRIMARY KEY,
+                run_id TEXT,
+                payload JSONB,
+                status TEXT,
+                attempts INTEGER DEFAULT 0,
+                max_attempts INTEGER,
+                next_attempt_at TEXT,
+                locked_until TEXT,
+                last_error TEXT,
+                created_at TEXT,
+                updated_at TEXT,
+                sent_at TEXT
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_outbox_status_next ON email_outbox(status, next_attempt_at)",
+            "CREATE INDEX IF NOT EXISTS idx_outbox_run_id ON email_outbox(run_id)",
+            # Index of files under artifacts/ (see app.artifacts)
+            """
+            CREATE TABLE IF NOT EXISTS artifacts (
+                id BIGSERIAL PRIMARY KEY,
+                run_id TEXT,
+                kind TEXT,
+                path TEXT UNIQUE,
+                size_bytes BIGINT,
+                sha256 TEXT,
+                created_at TEXT
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_artifacts_run_id ON artifacts(run_id)",
+            "CREATE INDEX IF NOT EXISTS idx_artifacts_created_at ON artifacts(created_at, id)",
+            # Past question -> SQL pairs per table schema, reused for paraphrases (see utils.question_cache)
+            """
+            CREATE TABLE IF NOT EXISTS question_cache (
+                id BIGSERIAL PRIMARY KEY,
+                scope TEXT,
+                question_key TEXT,
+                question TEXT,
+                query TEXT,
+                key_terms TEXT,
+                hits INTEGER DEFAULT 0,
+                created_at TEXT,
+                last_used_at TEXT,
+                UNIQUE (scope, question_key)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_question_cache_scope_used ON question_cache(scope, last_used_at)",
         ]
         with self._lock:
             conn = self._connect()
@@ -82,14 +223,15 @@ class Database:
                 conn.close()
 
     def insert_log(self, run_id: str, level: str, node: str, event: str, data: Optional[Dict[str, Any]] = None) -> None:
-        payload = json.dumps(data or {}, ensure_ascii=False)
+        payload = json.dumps(_jsonb_safe(data or {}), ensure_ascii=False, allow_nan=False,
+                             default=lambda o: _jsonb_safe(str(o)))
         ts = datetime.utcnow().isoformat()
         with self._lock:
             conn = self._connect()
             try:
                 with conn.cursor() as cur:
                     cur.execute(
-                        "INSERT INTO logs (run_id, timestamp, level, node, event, data) VALUES (%s, %s, %s, %s, %s, %s)",
+                        "INSERT INTO logs (run_id, timestamp, level, node, event, data) VALUES (%s, %s, %s, %s, %s, %s::jsonb)",
                         (run_id, ts, level, node, event, payload),
                     )
             finally:
@@ -158,16 +300,438 @@ class Database:
             finally:
                 conn.close()
 
-    def get_logs(self, limit: int = 200) -> List[Dict[str, Any]]:
+    def get_logs(
+        self,
+        limit: int = 200,
+        run_id: Optional[str] = None,
+        levels: Optional[List[str]] = None,
+        node: Optional[str] = None,
+        event: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        data_contains: Optional[Dict[str, Any]] = None,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return log rows matching the filters using keyset pagination on id.
+
+        Without cursors (or with ``before_id``) rows come newest first; with ``after_id``
+        rows come oldest first so callers can tail the table by passing the last id seen.
+        ``since``/``until`` compare against the ISO-8601 timestamp column.
+        """
+        clauses: List[str] = []
+        params: List[Any] = []
+        if run_id:
+            clauses.append("run_id = %s")
+            params.append(run_id)
+        if levels:
+            clauses.append("level = ANY(%s)")
+            params.append(list(levels))
+        if node:
+            clauses.append("node = %s")
+            params.append(node)
+        if event:
+            clauses.append("event = %s")
+            params.append(event)
+        if since:
+            clauses.append("timestamp >= %s")
+            params.append(since)
+        if until:
+            clauses.append("timestamp < %s")
+            params.append(until)
+        if data_contains:
+            clauses.append("data @> %s::jsonb")
+            params.append(json.dumps(data_contains, ensure_ascii=False))
+        order = "DESC"
+        if after_id is not None:
+            clauses.append("id > %s")
+            params.append(after_id)
+            order = "ASC"
+        elif before_id is not None:
+            clauses.append("id < %s")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(limit)
         with self._lock:
             conn = self._connect()
             try:
                 with conn.cursor(cursor_factory=pg_extras.RealDictCursor) as cur:
                     cur.execute(
-                        "SELECT run_id, timestamp, level, node, event, data FROM logs ORDER BY id DESC LIMIT %s",
-                        (limit,),
+                        f"SELECT id, run_id, timestamp, level, node, event, data FROM logs {where} ORDER BY id {order} LIMIT %s",
+                        tuple(params),
                     )
                     rows = cur.fetchall()
                     return [dict(r) for r in rows]
             finally:
                 conn.close()
+
+    # Scheduled job metadata (the trigger itself lives in the APScheduler job store)
+    def upsert_scheduled_job(self, job: Dict[str, Any]) -> None:
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        INSERT INTO scheduled_jobs (job_id, question, frequency, time, user_id, overrides, created_at, group_id, incremental_column, pinned_query, schema_hash)
+                        VALUES (%s, %s, %s, %s, %s, %s::jsonb, %s, %s, %s, %s, %s)
+                        ON CONFLICT (job_id) DO UPDATE SET
+                          question = EXCLUDED.question,
+                          frequency = EXCLUDED.frequency,
+                          time = EXCLUDED.time,
+                          user_id = EXCLUDED.user_id,
+                          overrides = EXCLUDED.overrides,
+                          group_id = EXCLUDED.group_id,
+                          incremental_column = EXCLUDED.incremental_column,
+                          pinned_query = EXCLUDED.pinned_query,
+                          schema_hash = EXCLUDED.schema_hash
+                        """,
+                        (
+                            job["id"],
+                            job.get("question"),
+                            job.get("frequency"),
+                            job.get("time"),
+                            job.get("user_id"),
+                            json.dumps(job.get("overrides") or {}, ensure_ascii=False),
+                            job.get("created_at") or datetime.utcnow().isoformat(),
+                            job.get("group_id"),
+                            job.get("incremental_column"),
+                            job.get("pinned_query"),
+                            job.get("schema_hash"),
+                        ),
+                    )
+            finally:
+                conn.close()
+
+    def delete_scheduled_job(self, job_id: str) -> bool:
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("DELETE FROM scheduled_jobs WHERE job_id = %s", (job_id,))
+                    return cur.rowcount > 0
+            finally:
+                conn.close()
+
+    def list_scheduled_jobs(self, job_id: Optional[str] = None, group_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor(cursor_factory=pg_extras.RealDictCursor) as cur:
+                    if job_id:
+                        cur.execute("SELECT * FROM scheduled_jobs WHERE job_id = %s", (job_id,))
+                    elif group_id:
+                        cur.execute("SELECT * FROM scheduled_jobs WHERE group_id = %s ORDER BY created_at", (group_id,))
+                    else:
+                        cur.execute("SELECT * FROM scheduled_jobs ORDER BY created_at")
+                    rows = cur.fetchall()
+                    out = []
+                    for r in rows:
+                        d = dict(r)
+                        d["id"] = d.pop("job_id")
+                        out.append(d)
+                    return out
+            finally:
+                conn.close()
+
+    def set_pinned_query(self, group_id: str, query: Optional[str], schema_hash: Optional[str]) -> None:
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "UPDATE scheduled_jobs SET pinned_query = %s, schema_hash = %s WHERE group_id = %s",
+                        (query, schema_hash, group_id),
+                    )
+            finally:
+                conn.close()
+
+    def get_job_state(self, group_id: str) -> Dict[str, Any]:
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor(cursor_factory=pg_extras.RealDictCursor) as cur:
+                    cur.execute("SELECT * FROM scheduled_job_state WHERE group_id = %s", (group_id,))
+                    row = cur.fetchone()
+                    return dict(row) if row else {}
+            finally:
+                conn.close()
+
+    def save_job_state(self, group_id: str, incremental: Optional[Dict[str, Any]]) -> None:
+        ts = datetime.utcnow().isoformat()
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        INSERT INTO scheduled_job_state (group_id, incremental, updated_at)
+                        VALUES (%s, %s::jsonb, %s)
+                        ON CONFLICT (group_id) DO UPDATE SET
+                          incremental = EXCLUDED.incremental,
+                          updated_at = EXCLUDED.updated_at
+                        """,
+                        (group_id, json.dumps(incremental, ensure_ascii=False, default=str) if incremental is not None else None, ts),
+                    )
+            finally:
+                conn.close()
+
+    def save_result_state(self, group_id: str, result_hash: str, artifacts: Dict[str, Any]) -> None:
+        ts = datetime.utcnow().isoformat()
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        INSERT INTO scheduled_job_state (group_id, result_hash, artifacts, updated_at)
+                        VALUES (%s, %s, %s::jsonb, %s)
+                        ON CONFLICT (group_id) DO UPDATE SET
+                          result_hash = EXCLUDED.result_hash,
+                          artifacts = EXCLUDED.artifacts,
+                          updated_at = EXCLUDED.updated_at
+                        """,
+                        (group_id, result_hash, json.dumps(artifacts or {}, ensure_ascii=False), ts),
+                    )
+            finally:
+                conn.close()
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor(cursor_factory=pg_extras.RealDictCursor) as cur:
+                    cur.execute("SELECT * FROM runs WHERE run_id = %s", (run_id,))
+                    row = cur.fetchone()
+                    return dict(row) if row else None
+            finally:
+                conn.close()
+
+    # Email outbox
+    def enqueue_email(self, run_id: str, payload: Dict[str, Any], max_attempts: int) -> int:
+        ts = datetime.utcnow().isoformat()
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        INSERT INTO email_outbox (run_id, payload, status, attempts, max_attempts, next_attempt_at, created_at, updated_at)
+                        VALUES (%s, %s::jsonb, 'pending', 0, %s, %s, %s, %s)
+                        RETURNING id
+                        """,
+                        (run_id, json.dumps(payload, ensure_ascii=False), max_attempts, ts, ts, ts),
+                    )
+                    return int(cur.fetchone()[0])
+            finally:
+                conn.close()
+
+    def claim_emails(self, limit: int, lease_seconds: int) -> List[Dict[str, Any]]:
+        """Lease due messages (and ones whose previous lease expired); safe across workers."""
+        now = datetime.utcnow()
+        ts = now.isoformat()
+        lease = (now + timedelta(seconds=lease_seconds)).isoformat()
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor(cursor_factory=pg_extras.RealDictCursor) as cur:
+                    cur.execute(
+                        """
+                        UPDATE email_outbox SET status = 'sending', attempts = attempts + 1, locked_until = %s, updated_at = %s
+                        WHERE id IN (
+                            SELECT id FROM email_outbox
+                            WHERE (status = 'pending' AND next_attempt_at <= %s) OR (status = 'sending' AND locked_until < %s)
+                            ORDER BY next_attempt_at
+                            LIMIT %s
+                            FOR UPDATE SKIP LOCKED
+                        )
+                        RETURNING *
+                        """,
+                        (lease, ts, ts, ts, limit),
+                    )
+                    return [dict(r) for r in cur.fetchall()]
+            finally:
+                conn.close()
+
+    def finish_email(self, outbox_id: int, status: str, error: Optional[str] = None,
+                     next_attempt_at: Optional[str] = None) -> None:
+        """Record an attempt: status is sent, pending (retry at next_attempt_at) or failed."""
+        ts = datetime.utcnow().isoformat()
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        UPDATE email_outbox SET status = %s, last_error = %s, next_attempt_at = COALESCE(%s, next_attempt_at),
+                          locked_until = NULL, updated_at = %s, sent_at = CASE WHEN %s = 'sent' THEN %s ELSE sent_at END
+                        WHERE id = %s
+                        """,
+                        (status, error, next_attempt_at, ts, status, ts, outbox_id),
+                    )
+            finally:
+                conn.close()
+
+    def list_emails(self, run_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor(cursor_factory=pg_extras.RealDictCursor) as cur:
+                    cur.execute(
+                        "SELECT id, run_id, status, attempts, max_attempts, next_attempt_at, last_error, created_at, sent_at, "
+                        "payload->'to_emails' AS to_emails FROM email_outbox WHERE run_id = %s ORDER BY id",
+                        (run_id,),
+                    )
+                    return [dict(r) for r in cur.fetchall()]
+            finally:
+                conn.close()
+
+    # Artifact index
+    def insert_artifact(self, run_id: str, kind: str, path: str, size_bytes: int, sha256: str) -> None:
+        ts = datetime.utcnow().isoformat()
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        INSERT INTO artifacts (run_id, kind, path, size_bytes, sha256, created_at)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                        ON CONFLICT (path) DO UPDATE SET
+                          run_id = EXCLUDED.run_id, kind = EXCLUDED.kind, size_bytes = EXCLUDED.size_bytes,
+                          sha256 = EXCLUDED.sha256, created_at = EXCLUDED.created_at
+                        """,
+                        (run_id, kind, path, size_bytes, sha256, ts),
+                    )
+            finally:
+                conn.close()
+
+    def list_artifacts(self, limit: int = 100, before_id: Optional[int] = None, run_id: Optional[str] = None,
+                       kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Newest first; pass the last id as before_id for the next page."""
+        conds: List[str] = []
+        params: List[Any] = []
+        if before_id is not None:
+            conds.append("id < %s")
+            params.append(before_id)
+        if run_id:
+            conds.append("run_id = %s")
+            params.append(run_id)
+        if kind:
+            conds.append("kind = %s")
+            params.append(kind)
+        where = f"WHERE {' AND '.join(conds)}" if conds else ""
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor(cursor_factory=pg_extras.RealDictCursor) as cur:
+                    cur.execute(f"SELECT * FROM artifacts {where} ORDER BY id DESC LIMIT %s", tuple(params + [limit]))
+                    return [dict(r) for r in cur.fetchall()]
+            finally:
+                conn.close()
+
+    def oldest_artifacts(self, limit: int, created_before: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor(cursor_factory=pg_extras.RealDictCursor) as cur:
+                    if created_before:
+                        cur.execute(
+                            "SELECT * FROM artifacts WHERE created_at < %s ORDER BY created_at, id LIMIT %s",
+                            (created_before, limit),
+                        )
+                    else:
+                        cur.execute("SELECT * FROM artifacts ORDER BY created_at, id LIMIT %s", (limit,))
+                    return [dict(r) for r in cur.fetchall()]
+            finally:
+                conn.close()
+
+    def artifacts_total_bytes(self) -> int:
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM artifacts")
+                    return int(cur.fetchone()[0])
+            finally:
+                conn.close()
+
+    def delete_artifacts(self, ids: List[int]) -> None:
+        if not ids:
+            return
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("DELETE FROM artifacts WHERE id = ANY(%s)", (list(ids),))
+            finally:
+                conn.close()
+
+    # Question similarity cache
+    def list_cached_questions(self, scope: str, limit: int) -> List[Dict[str, Any]]:
+        """Most recently used first."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor(cursor_factory=pg_extras.RealDictCursor) as cur:
+                    cur.execute(
+                        "SELECT question_key, question, query, key_terms, hits, last_used_at FROM question_cache "
+                        "WHERE scope = %s ORDER BY last_used_at DESC, id DESC LIMIT %s",
+                        (scope, limit),
+                    )
+                    return [dict(r) for r in cur.fetchall()]
+            finally:
+                conn.close()
+
+    def upsert_cached_question(self, scope: str, question_key: str, question: str, query: str,
+                               key_terms: str, max_entries: int) -> None:
+        """Store a question's SQL and trim the scope to its max_entries most recently used."""
+        ts = datetime.utcnow().isoformat()
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        """
+                        INSERT INTO question_cache (scope, question_key, question, query, key_terms, hits, created_at, last_used_at)
+                        VALUES (%s, %s, %s, %s, %s, 0, %s, %s)
+                        ON CONFLICT (scope, question_key) DO UPDATE SET
+                          question = EXCLUDED.question, query = EXCLUDED.query,
+                          key_terms = EXCLUDED.key_terms, last_used_at = EXCLUDED.last_used_at
+                        """,
+                        (scope, question_key, question, query, key_terms, ts, ts),
+                    )
+                    cur.execute(
+                        """
+                        DELETE FROM question_cache WHERE scope = %s AND id NOT IN (
+                          SELECT id FROM question_cache WHERE scope = %s ORDER BY last_used_at DESC, id DESC LIMIT %s
+                        )
+                        """,
+                        (scope, scope, max_entries),
+                    )
+            finally:
+                conn.close()
+
+    def question_cache_version(self, scope: str) -> Tuple[int, int]:
+        """(row count, max id) of a scope; changes whenever any process adds or trims entries."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM question_cache WHERE scope = %s", (scope,))
+                    count, max_id = cur.fetchone()
+                    return int(count), int(max_id)
+            finally:
+                conn.close()
+
+    def touch_cached_question(self, scope: str, question_key: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "UPDATE question_cache SET hits = hits + 1, last_used_at = %s WHERE scope = %s AND question_key = %s",
+                        (datetime.utcnow().isoformat(), scope, question_key),
+                    )
+            finally:
+                conn.close()
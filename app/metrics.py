@@ -0,0 +1,182 @@
+"""Prometheus metrics for the pipeline hot paths.
+
+Metrics are only registered when METRICS_ENABLED is set and prometheus_client is
+installed; otherwise every helper below is a cheap no-op and node functions are
+returned unwrapped.
+"""
+import functools
+import time
+from typing import Any, Callable, Optional, Tuple
+
+from app.config import settings
+
+try:
+    import prometheus_client  # type: ignore
+    from prometheus_client import Counter, Gauge, Histogram  # type: ignore
+except Exception:  # pragma: no cover
+    prometheus_client = None
+
+ENABLED = bool(settings.METRICS_ENABLED and prometheus_client is not None)
+
+# Buckets skewed towards sub-second work but wide enough for LLM and report generation
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+_ROW_BUCKETS = (0, 1, 10, 50, 100, 250, 500, 1000, 5000, 10000)
+
+if ENABLED:
+    NODE_DURATION = Histogram(
+        "pipeline_node_duration_seconds", "Duration of each graph node", ["node", "status"], buckets=_LATENCY_BUCKETS
+    )
+    RUN_DURATION = Histogram(
+        "pipeline_run_duration_seconds", "End-to-end duration of run_once", ["status"], buckets=_LATENCY_BUCKETS
+    )
+    RUNS_IN_PROGRESS = Gauge("pipeline_runs_in_progress", "Pipeline runs currently executing")
+    MCP_CALL_DURATION = Histogram(
+        "mcp_tool_call_duration_seconds", "MCP tool call latency", ["server", "tool", "status"], buckets=_LATENCY_BUCKETS
+    )
+    QUERY_DURATION = Histogram(
+        "datasource_query_duration_seconds", "Data-source query time measured by the db server", ["db_type"], buckets=_LATENCY_BUCKETS
+    )
+    QUERY_ROWS = Histogram("datasource_rows_returned", "Rows returned per data-source query", ["db_type"], buckets=_ROW_BUCKETS)
+    ENDPOINT_QUERY_DURATION = Histogram(
+        "datasource_endpoint_query_duration_seconds", "Data-source query time per endpoint (primary or read replica)",
+        ["endpoint", "role"], buckets=_LATENCY_BUCKETS,
+    )
+    QUERY_REJECTED = Counter(
+        "datasource_queries_rejected_total", "Queries refused by the cost guard or cancelled by the statement timeout", ["db_type", "code"]
+    )
+    OPENAI_DURATION = Histogram(
+        "openai_request_duration_seconds", "OpenAI chat completion latency", ["model", "status"], buckets=_LATENCY_BUCKETS
+    )
+    OPENAI_TOKENS = Counter("openai_tokens_total", "Tokens reported by OpenAI responses", ["model", "kind"])
+    OPENAI_RETRIES = Counter("openai_retries_total", "OpenAI request retries after transient errors", ["model"])
+    NLP_COMPILED = Counter("nlp_questions_compiled_total", "Questions compiled to SQL, by method", ["used"])
+    APP_STORE_CONNECTIONS = Gauge("app_store_connections_open", "Open connections to the app-store database")
+    HTTP_WORKERS_BUSY = Gauge("http_worker_threads_busy", "Threadpool workers busy serving sync endpoints")
+    HTTP_WORKERS_TOTAL = Gauge("http_worker_threads_total", "Threadpool capacity for sync endpoints")
+    HTTP_QUEUE_DEPTH = Gauge("http_run_queue_depth", "Requests waiting for a threadpool worker")
+    SCHEDULER_JOB_LAG = Histogram(
+        "scheduler_job_lag_seconds", "Delay between a job's scheduled and actual start", buckets=_LATENCY_BUCKETS
+    )
+    SCHEDULER_JOBS_MISSED = Counter("scheduler_jobs_missed_total", "Scheduled runs skipped by APScheduler")
+    SCHEDULER_EXECUTIONS = Counter("scheduler_pipeline_executions_total", "Pipeline runs executed for scheduled job groups")
+    SCHEDULER_SUBSCRIPTIONS = Counter("scheduler_subscriptions_served_total", "Scheduled jobs served by those runs")
+    SCHEDULER_QUEUE_WAIT = Histogram(
+        "scheduler_source_queue_wait_seconds", "Time a scheduled run waited for a data-source slot", ["source"], buckets=_LATENCY_BUCKETS
+    )
+
+
+def instrument_node(name: str, fn: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """Wrap a graph node so its duration is recorded; returns fn unchanged when disabled."""
+    if not ENABLED:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(state):
+        start = time.perf_counter()
+        status = "exception"
+        try:
+            out = fn(state)
+            status = str((out or {}).get("status") or "ok")
+            return out
+        finally:
+            NODE_DURATION.labels(name, status).observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+def run_started() -> Optional[float]:
+    if not ENABLED:
+        return None
+    RUNS_IN_PROGRESS.inc()
+    return time.perf_counter()
+
+
+def run_finished(start: Optional[float], status: str) -> None:
+    if not ENABLED or start is None:
+        return
+    RUNS_IN_PROGRESS.dec()
+    RUN_DURATION.labels(status or "unknown").observe(time.perf_counter() - start)
+
+
+def observe_mcp_call(server: str, tool: str, status: str, seconds: float) -> None:
+    if ENABLED:
+        MCP_CALL_DURATION.labels(server, tool, status or "unknown").observe(seconds)
+
+
+def observe_query(db_type: str, seconds: float, rows: int) -> None:
+    if ENABLED:
+        label = (db_type or "unknown").lower()
+        QUERY_DURATION.labels(label).observe(seconds)
+        QUERY_ROWS.labels(label).observe(rows)
+
+
+def observe_endpoint_query(endpoint: str, role: str, seconds: float) -> None:
+    if ENABLED:
+        ENDPOINT_QUERY_DURATION.labels(endpoint, role or "unknown").observe(seconds)
+
+
+def observe_query_rejected(db_type: str, code: str) -> None:
+    if ENABLED:
+        QUERY_REJECTED.labels((db_type or "unknown").lower(), code or "unknown").inc()
+
+
+def observe_openai(model: str, status: str, seconds: float, prompt_tokens: Optional[int] = None,
+                   completion_tokens: Optional[int] = None, retries: int = 0) -> None:
+    if ENABLED:
+        OPENAI_DURATION.labels(model, status).observe(seconds)
+        if prompt_tokens:
+            OPENAI_TOKENS.labels(model, "prompt").inc(prompt_tokens)
+        if completion_tokens:
+            OPENAI_TOKENS.labels(model, "completion").inc(completion_tokens)
+        if retries:
+            OPENAI_RETRIES.labels(model).inc(retries)
+
+
+def observe_nlp(used: str) -> None:
+    if ENABLED:
+        NLP_COMPILED.labels(used or "unknown").inc()
+
+
+def app_store_connection_opened() -> None:
+    if ENABLED:
+        APP_STORE_CONNECTIONS.inc()
+
+
+def app_store_connection_closed() -> None:
+    if ENABLED:
+        APP_STORE_CONNECTIONS.dec()
+
+
+def observe_scheduler_lag(seconds: float) -> None:
+    if ENABLED:
+        SCHEDULER_JOB_LAG.observe(max(0.0, seconds))
+
+
+def scheduler_job_missed() -> None:
+    if ENABLED:
+        SCHEDULER_JOBS_MISSED.inc()
+
+
+def observe_scheduler_group(executions: int, subscribers: int) -> None:
+    if ENABLED:
+        SCHEDULER_EXECUTIONS.inc(executions)
+        SCHEDULER_SUBSCRIPTIONS.inc(subscribers)
+
+
+def observe_scheduler_queue_wait(source: str, seconds: float) -> None:
+    if ENABLED:
+        SCHEDULER_QUEUE_WAIT.labels(source).observe(seconds)
+
+
+def set_http_pool(busy: float, total: float, waiting: float) -> None:
+    if ENABLED:
+        HTTP_WORKERS_BUSY.set(busy)
+        HTTP_WORKERS_TOTAL.set(total)
+        HTTP_QUEUE_DEPTH.set(waiting)
+
+
+def render() -> Tuple[bytes, str]:
+    """Return the exposition payload and its content type."""
+    if not ENABLED:
+        return b"# metrics disabled (set METRICS_ENABLED=true and install prometheus_client)\n", "text/plain; charset=utf-8"
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
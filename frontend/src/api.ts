@@ -47,6 +47,8 @@ export type ScheduleJobRequest = {
   password?: string;
   table?: string;
   sslmode?: string;
+  email_to?: string; // comma-separated recipients for this job
+  incremental_column?: string; // monotonic column for incremental refresh (append-only tables)
 };
 
 export type RunResponse = {
@@ -56,11 +58,33 @@ export type RunResponse = {
   run_id?: string;
 };
 
-export type LogsResponse = { status: string; logs: any[] };
+export type LogsResponse = { status: string; logs: any[]; next_before_id?: number | null; next_after_id?: number | null };
 export type DbTestResponse = { status: string; rows?: any[]; error?: string };
-export type SchedAddResponse = { status: string; job_id: string };
+export type SchedAddResponse = { status: string; job_id: string; query?: string | null };
 export type SchedListResponse = { status: string; jobs: any[] };
 export type SchedDeleteResponse = { status: string; deleted: boolean };
+export type EmailDelivery = {
+  id: number;
+  status: 'pending' | 'sending' | 'sent' | 'failed';
+  attempts: number;
+  max_attempts: number;
+  next_attempt_at?: string | null;
+  last_error?: string | null;
+  sent_at?: string | null;
+  to_emails?: string[];
+};
+export type ArtifactItem = {
+  id: number;
+  run_id: string;
+  kind: string;
+  path: string;
+  size_bytes: number;
+  sha256: string;
+  created_at: string;
+  url: string;
+};
+export type ArtifactsResponse = { status: string; artifacts: ArtifactItem[]; next_before_id?: number | null };
+export type RunStatusResponse = { status: string; run?: any; emails?: EmailDelivery[]; error?: string };
 
 const API_BASE = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000';
 
@@ -79,6 +103,9 @@ export const api = {
   health: () => http<{ status: string }>(`/health`),
   run: (payload: RunRequest) => http<RunResponse>(`/run`, { method: 'POST', json: payload }),
   dbTest: (payload: DbTestRequest) => http<DbTestResponse>(`/db/test`, { method: 'POST', json: payload }),
+  artifacts: (limit = 100, beforeId?: number) =>
+    http<ArtifactsResponse>(`/artifacts?limit=${limit}${beforeId != null ? `&before_id=${beforeId}` : ''}`),
+  runStatus: (runId: string) => http<RunStatusResponse>(`/runs/${encodeURIComponent(runId)}`),
   logs: (limit = 200) => http<LogsResponse>(`/logs?limit=${limit}`),
   schedAdd: (payload: ScheduleJobRequest) => http<SchedAddResponse>(`/scheduler/add`, { method: 'POST', json: payload }),
   schedList: () => http<SchedListResponse>(`/scheduler/list`),
@@ -7,7 +7,9 @@ from dataclasses import replace
 from app.config import settings
 from app.database import Database
 from app.logging_utils import JsonSqlLogger
+from app import metrics
 from agents import nlp_agent, email_agent, orchestrator, supervisor, csv_agent, db_agent, report_agent, memory_agent
+from utils import db_utils, question_cache
 
 
 class AppState(TypedDict, total=False):
@@ -23,6 +25,12 @@ class AppState(TypedDict, total=False):
     supervisor_ok: bool
     route: str
     status: str
+    scheduled_job: Dict[str, Any]
+    incremental_state: Dict[str, Any]
+    result_hash: str
+    unchanged: bool
+    nlp: Dict[str, Any]
+    aggregates: Dict[str, Any]
 
 
 def build_app(cfg=settings) -> _Any:
@@ -44,6 +52,7 @@ def build_app(cfg=settings) -> _Any:
         updates: AppState = {
             "query": (res.get("data") or {}).get("query"),
             "data": (res.get("data") or {}).get("rows"),
+            "nlp": {k: v for k, v in (res.get("data") or {}).items() if k in ("used", "schema_hash", "key_terms")},
             "last_node": "nlp",
             "last_result": res,
             "status": res.get("status"),
@@ -63,10 +72,33 @@ def build_app(cfg=settings) -> _Any:
         updates: AppState = {
             "data": (res.get("data") or {}).get("rows"),
             "query": (res.get("data") or {}).get("query_used") or state.get("query"),
+            "aggregates": (res.get("data") or {}).get("aggregates") or {},
             "last_node": "db",
             "last_result": res,
             "status": res.get("status"),
         }
+        nlp = state.get("nlp") or {}
+        if (res.get("status") == "success" and nlp.get("used") == "openai" and cfg.NLP_SIMILARITY_ENABLED
+                and updates["query"] == state.get("query")):
+            # The LLM's SQL ran as generated: let paraphrases of this question reuse it
+            try:
+                question_cache.remember(db, nlp.get("schema_hash") or "", state.get("user_input", ""), updates["query"],
+                                        nlp.get("key_terms") or "", cfg.NLP_SIMILARITY_MAX_ENTRIES,
+                                        cfg.NLP_SIMILARITY_RELOAD_SECONDS)
+            except Exception as e:
+                logger.error(state["run_id"], "nlp", "similarity_update_failed", {"error": str(e)})
+        if (res.get("data") or {}).get("incremental_state"):
+            updates["incremental_state"] = res["data"]["incremental_state"]
+        previous = (state.get("scheduled_job") or {}).get("previous_result") or {}
+        if res.get("status") == "success" and state.get("scheduled_job"):
+            updates["result_hash"] = db_utils.result_hash(updates["data"] or [])
+            if previous.get("result_hash") == updates["result_hash"] and previous.get("artifacts"):
+                # Same rows as the last scheduled run: reuse its files, skip csv/report/email
+                updates["unchanged"] = True
+                updates["artifacts"] = {**(state.get("artifacts") or {}), **previous["artifacts"]}
+                logger.info(state["run_id"], "db", "skipped_unchanged", {
+                    "result_hash": updates["result_hash"], "artifacts": previous["artifacts"],
+                })
         return updates
 
     def email_node(state: AppState) -> AppState:
@@ -98,13 +130,13 @@ def build_app(cfg=settings) -> _Any:
         return state.get("route") or "end"
 
     graph = StateGraph(AppState)
-    graph.add_node("memory_load", memory_load_node)
-    graph.add_node("nlp", nlp_node)
-    graph.add_node("db", db_node)
-    graph.add_node("csv", csv_node)
-    graph.add_node("report", report_node)
-    graph.add_node("email", email_node)
-    graph.add_node("memory_save", memory_save_node)
+    graph.add_node("memory_load", metrics.instrument_node("memory_load", memory_load_node))
+    graph.add_node("nlp", metrics.instrument_node("nlp", nlp_node))
+    graph.add_node("db", metrics.instrument_node("db", db_node))
+    graph.add_node("csv", metrics.instrument_node("csv", csv_node))
+    graph.add_node("report", metrics.instrument_node("report", report_node))
+    graph.add_node("email", metrics.instrument_node("email", email_node))
+    graph.add_node("memory_save", metrics.instrument_node("memory_save", memory_save_node))
     graph.add_node("supervisor", supervisor_node)
     graph.add_edge(START, "memory_load")
     graph.add_edge("memory_load", "supervisor")
@@ -119,7 +151,8 @@ def build_app(cfg=settings) -> _Any:
     return app, db, logger
 
 
-def run_once(question: str, overrides: Optional[Dict[str, Any]] = None, user_id: str = "default") -> Dict[str, Any]:
+def run_once(question: str, overrides: Optional[Dict[str, Any]] = None, user_id: str = "default",
+             job_context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     cfg = settings
     if overrides:
         try:
@@ -130,8 +163,21 @@ def run_once(question: str, overrides: Optional[Dict[str, Any]] = None, user_id:
     run_id = str(uuid4())
     db.start_run(run_id, question)
     initial: AppState = {"run_id": run_id, "user_input": question, "artifacts": {}, "user_id": user_id}
-    out = app.invoke(initial)
-    status = out.get("status") or "success"
+    if job_context:
+        # Scheduled runs: per-job state such as the incremental high-water mark and pinned SQL
+        initial["scheduled_job"] = job_context
+        if job_context.get("pinned_query"):
+            initial["query"] = job_context["pinned_query"]
+            logger.info(run_id, "nlp", "nlp_skipped_pinned", {"query": job_context["pinned_query"]})
+    started = metrics.run_started()
+    status = "error"
+    try:
+        out = app.invoke(initial)
+        status = out.get("status") or "success"
+        if out.get("unchanged") and status == "success":
+            status = out["status"] = "skipped_unchanged"
+    finally:
+        metrics.run_finished(started, status)
     db.finish_run(run_id, status)
     # include run_id for clients
     try:
@@ -6,12 +6,15 @@ import asyncio
 import json
 import os
 import sys
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Dict, List, Optional, Tuple
 from contextlib import asynccontextmanager
 
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 
+from app import metrics
+
 
 class MCPClientManager:
     """Manages multiple MCP client connections."""
@@ -125,18 +128,21 @@ class MCPClientManager:
         if not session:
             raise ValueError(f"MCP server '{server}' not found or not initialized")
 
+        start = time.perf_counter()
         try:
             result = await session.call_tool(tool_name, arguments)
             
             # Parse the result
+            parsed = {"status": "error", "error": "Empty response from MCP server"}
             if result and len(result.content) > 0:
                 content = result.content[0]
                 if hasattr(content, 'text'):
-                    return json.loads(content.text)
-            
-            return {"status": "error", "error": "Empty response from MCP server"}
+                    parsed = json.loads(content.text)
+            metrics.observe_mcp_call(server, tool_name, parsed.get("status"), time.perf_counter() - start)
+            return parsed
 
         except Exception as e:
+            metrics.observe_mcp_call(server, tool_name, "exception", time.perf_counter() - start)
             return {"status": "error", "error": str(e)}
 
     async def list_tools(self, server: str) -> List[Dict[str, Any]]:
@@ -228,6 +234,24 @@ def call_mcp_tool_sync(server: str, tool_name: str, arguments: Dict[str, Any]) -
         return loop.run_until_complete(_async_call_tool(server, tool_name, arguments))
 
 
+def call_mcp_tools_sync(calls: List[Tuple[str, str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Issue several tool calls concurrently on the shared sessions; results keep the input order."""
+    async def _gather():
+        return await asyncio.gather(*[_async_call_tool(s, t, a) for s, t, a in calls])
+
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+
+    if loop.is_running():
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            return list(executor.submit(asyncio.run, _gather()).result())
+    return list(loop.run_until_complete(_gather()))
+
+
 async def _async_call_tool(server: str, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
     """Helper for async tool calls."""
     manager = get_mcp_manager()
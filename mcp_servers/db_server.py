@@ -7,7 +7,9 @@ import asyncio
 import json
 import os
 import sys
-from typing import Any, Sequence
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Sequence
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -16,11 +18,29 @@ from mcp.server import Server
 from mcp.types import Tool, TextContent
 from mcp.server.stdio import stdio_server
 
-from utils import db_utils
+from utils import db_utils, replica_utils, sql_tokens
 from app.config import settings
 
 
 app = Server("db-server")
+# Queries block on the database driver, so they run here while the event loop keeps reading
+# requests from the pipe. With DB_SERVER_WORKERS=0 they run inline, one at a time.
+_pool = ThreadPoolExecutor(max_workers=settings.DB_SERVER_WORKERS, thread_name_prefix="db-query") \
+    if settings.DB_SERVER_WORKERS > 0 else None
+
+
+async def _run_blocking(fn: Callable[[], Any], handle: db_utils.QueryHandle) -> Any:
+    """Run fn on the query pool; when the client cancels the request, cancel its statement too."""
+    if _pool is None:
+        return fn()
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_pool, fn)
+    except asyncio.CancelledError:
+        # Cancelling may block (MySQL opens a connection for KILL QUERY): run it off the event loop, and
+        # on the default executor so it does not queue behind the queries filling _pool
+        loop.run_in_executor(None, handle.cancel)
+        raise
 
 
 @app.list_tools()
@@ -79,16 +99,28 @@ async def list_tools() -> list[Tool]:
                         "type": "string",
                         "description": "SSL mode (require, prefer, disable)",
                     },
+                    "explain": {
+                        "type": "boolean",
+                        "description": "Also return the planner's cost estimate for the query",
+                        "default": False,
+                    },
                 },
                 "required": ["query"],
             },
         ),
+        Tool(
+            name="db.endpoints",
+            description="Health, latency, replication lag and query counts of the data-source endpoints in use.",
+            inputSchema={"type": "object", "properties": {}},
+        ),
     ]
 
 
 @app.call_tool()
 async def call_tool(name: str, arguments: Any) -> Sequence[TextContent]:
     """Handle tool execution."""
+    if name == "db.endpoints":
+        return [TextContent(type="text", text=json.dumps({"status": "success", "sources": replica_utils.all_stats()}))]
     if name != "db.query_supabase":
         raise ValueError(f"Unknown tool: {name}")
 
@@ -108,13 +140,16 @@ async def call_tool(name: str, arguments: Any) -> Sequence[TextContent]:
 
     try:
         # Check if query is safe (read-only SELECT)
-        if not db_utils.is_safe_select(query):
+        reason = sql_tokens.validate(query)
+        if reason:
             return [
                 TextContent(
                     type="text",
                     text=json.dumps({
                         "status": "error",
-                        "error": "Only SELECT queries are allowed. INSERT, UPDATE, DELETE, DROP, etc. are forbidden."
+                        "error": f"Only SELECT queries are allowed. INSERT, UPDATE, DELETE, DROP, etc. are forbidden ({reason}).",
+                        "code": "not_read_only",
+                        "detail": {"reason": reason},
                     }),
                 )
             ]
@@ -136,22 +171,63 @@ async def call_tool(name: str, arguments: Any) -> Sequence[TextContent]:
             connection_settings = custom_settings
         else:
             connection_settings = settings
+        # Replicas come from DATA_REPLICAS only, and only for the configured data source
+        replicas = replica_utils.configured_replicas(settings, connection_settings)
 
-        # Execute the query
-        rows = db_utils.execute_select(connection_settings, query, limit=limit)
+        stats = {} if arguments.get("explain") else None
+        handle = db_utils.QueryHandle()
+
+        def run(endpoint_settings):
+            return db_utils.execute_select(
+                endpoint_settings, query, limit=limit,
+                timeout_seconds=settings.QUERY_TIMEOUT_SECONDS, max_cost=settings.QUERY_MAX_COST, stats=stats,
+                handle=handle,
+            )
 
+        def execute():
+            # Execute the query, on a read replica when the data source has any. Timed here so
+            # elapsed_ms excludes the wait for a free worker
+            start = time.perf_counter()
+            router = replica_utils.router_for(
+                connection_settings, replicas, settings.DATA_REPLICA_MAX_LAG_SECONDS, settings.DATA_REPLICA_PROBE_SECONDS
+            )
+            if router is not None:
+                rows, endpoint = router.execute(run)
+                endpoint_name, role = endpoint.name, endpoint.role
+            else:
+                rows = run(connection_settings)
+                endpoint_name, role = replica_utils.endpoint_name(connection_settings), "primary"
+            return rows, endpoint_name, role, (time.perf_counter() - start) * 1000.0
+
+        rows, endpoint_name, role, elapsed_ms = await _run_blocking(execute, handle)
+        result = {
+            "status": "success",
+            "rows": rows,
+            "count": len(rows),
+            "query": query,
+            "elapsed_ms": round(elapsed_ms, 3),
+            "endpoint": endpoint_name,
+            "role": role,
+        }
+        if stats:
+            result["cost"] = stats.get("cost")
+
+        return [TextContent(type="text", text=json.dumps(result, default=str))]
+
+    except db_utils.QueryRejected as e:
+        # Structured so the db agent can switch to a cheaper query
         return [
             TextContent(
                 type="text",
                 text=json.dumps({
-                    "status": "success",
-                    "rows": rows,
-                    "count": len(rows),
+                    "status": "error",
+                    "error": str(e),
+                    "code": e.code,
+                    "detail": e.detail,
                     "query": query,
                 }),
             )
         ]
-
     except Exception as e:
         return [
             TextContent(
@@ -155,14 +155,16 @@ async def call_tool(name: str, arguments: Any) -> Sequence[TextContent]:
         validated_attachments.append(att)
 
     try:
-        # Send email using the existing sendgrid_utils
-        result = sendgrid_utils.send_email(
+        # Encoding and the HTTP call block; keep them off the server's event loop
+        result = await asyncio.to_thread(
+            sendgrid_utils.send_email,
             subject=subject,
             body_text=body_text,
             to_emails=to_emails,
             from_email=from_email,
             attachments=validated_attachments,
             api_key=api_key,
+            host=getattr(settings, "SENDGRID_API_HOST", "") or None,
         )
 
         return [
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for the db MCP server (mcp_servers/db_server.py).
+
+Starts the server over stdio against a generated SQLite data source, once with
+DB_SERVER_WORKERS=0 (queries run inline on the event loop, one at a time) and once
+per --workers value, and sends the query mix from one client session at each
+--concurrency level. Reports throughput and p50/p95 latency, and checks that every
+mode returns exactly the rows db_utils.execute_select returns in-process.
+
+A remote database mostly keeps the server waiting on the network; --db-latency-ms
+adds that wait to every connection the server opens, so the scaling is visible on
+a local SQLite file too. With --db-latency-ms 0 the queries are CPU-bound and only
+scale with cores.
+
+Usage:
+  python scripts/bench_db_server.py --rows 50000 --workers 8 --concurrency 1,4,16 \
+      --queries 64 --db-latency-ms 20 [--out bench/db_server.json]
+
+Requires the mcp package.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import types
+from typing import Any, Dict, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import offline_env  # noqa: E402
+from bench_stats import percentile  # noqa: E402
+
+
+def serve(latency_ms: float) -> None:
+    """Server side: the real db server, with `latency_ms` added to every connection."""
+    sys.path.insert(0, ROOT)
+    from utils import db_utils
+    connect = db_utils.connect
+
+    def slow_connect(settings):
+        time.sleep(latency_ms / 1000.0)
+        return connect(settings)
+
+    db_utils.connect = slow_connect
+    from mcp_servers import db_server
+    asyncio.run(db_server.main())
+
+
+async def _run_mode(workers: int, db_path: str, queries: List[str], levels: List[int],
+                    latency_ms: float) -> Dict[str, Any]:
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+
+    env = dict(os.environ, DB_SERVER_WORKERS=str(workers), DATA_DB_TYPE="sqlite", DATA_NAME=db_path,
+               DATA_REPLICAS="", QUERY_MAX_COST="0")
+    params = StdioServerParameters(
+        command=sys.executable, args=[os.path.abspath(__file__), "--serve", "--db-latency-ms", str(latency_ms)], env=env,
+    )
+    out: Dict[str, Any] = {"workers": workers, "levels": {}, "rows": {}}
+    async with stdio_client(params) as (read, write):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+
+            async def call(q: str) -> Dict[str, Any]:
+                res = await session.call_tool("db.query_supabase", {"query": q, "limit": 500})
+                return json.loads(res.content[0].text)
+
+            for q in dict.fromkeys(queries):
+                res = await call(q)
+                out["rows"][q] = res.get("rows") if res.get("status") == "success" else res.get("error")
+            for level in levels:
+                sem = asyncio.Semaphore(level)
+                latencies: List[float] = []
+                errors = 0
+
+                async def one(q: str) -> None:
+                    nonlocal errors
+                    async with sem:
+                        started = time.perf_counter()
+                        res = await call(q)
+                        latencies.append((time.perf_counter() - started) * 1000.0)
+                        errors += res.get("status") != "success"
+
+                started = time.perf_counter()
+                await asyncio.gather(*[one(q) for q in queries])
+                wall = time.perf_counter() - started
+                out["levels"][level] = {
+                    "qps": round(len(queries) / wall, 1),
+                    "p50_ms": round(percentile(latencies, 50), 1),
+                    "p95_ms": round(percentile(latencies, 95), 1),
+                    "errors": errors,
+                }
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--rows", type=int, default=50000)
+    ap.add_argument("--workers", default="8", help="comma-separated DB_SERVER_WORKERS values to compare with 0")
+    ap.add_argument("--concurrency", default="1,4,16", help="comma-separated requests in flight")
+    ap.add_argument("--queries", type=int, default=64, help="queries per concurrency level")
+    ap.add_argument("--db-latency-ms", type=float, default=20.0, help="network latency added per connection")
+    ap.add_argument("--workdir", default="", help="directory for the dataset (default: temp dir)")
+    ap.add_argument("--out", default="", help="write JSON results here")
+    args = ap.parse_args()
+    if args.serve:
+        serve(args.db_latency_ms)
+        return 0
+
+    sys.path.insert(0, ROOT)
+    from utils import db_utils
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_db_server_")
+    db_path = offline_env.generate_dataset(os.path.join(workdir, f"data_{args.rows}.db"), args.rows)
+    mix = [sql.format(table=offline_env.BENCH_TABLE) for _, sql in offline_env.QUESTION_MIX]
+    queries = [mix[i % len(mix)] for i in range(args.queries)]
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    modes = [0] + [int(w) for w in args.workers.split(",") if w.strip() and int(w) > 0]
+
+    # Reference rows from the sync path, through JSON like the stdio transport
+    conn = types.SimpleNamespace(DATA_DB_TYPE="sqlite", DATA_NAME=db_path)
+    expected = {q: json.loads(json.dumps(db_utils.execute_select(conn, q, limit=500), default=str)) for q in mix}
+
+    results = []
+    for workers in modes:
+        res = asyncio.run(_run_mode(workers, db_path, queries, levels, args.db_latency_ms))
+        res["identical"] = all(res["rows"].get(q) == rows for q, rows in expected.items())
+        results.append(res)
+
+    print(f"{args.rows} rows, {len(queries)} queries per level, {args.db_latency_ms:g} ms added latency, "
+          f"{os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'in flight':>10} {'qps':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7} {'identical':>10}")
+    for res in results:
+        for level, m in res["levels"].items():
+            print(f"{res['workers']:>8} {level:>10} {m['qps']:>8} {m['p50_ms']:>8} {m['p95_ms']:>8} {m['errors']:>7} "
+                  f"{str(res['identical']):>10}")
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump([{k: v for k, v in r.items() if k != "rows"} for r in results], f, indent=2)
+    return 0 if all(r["identical"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
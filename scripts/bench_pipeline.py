@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end benchmark for main.run_once.
+
+Runs the full graph against a generated SQLite data source and a SQLite-backed app
+store (or a local Postgres via --pg-dsn), with OpenAI and SendGrid stubbed and
+latency injected. Reports per-node and end-to-end p50/p95/p99 for each data size.
+
+Usage:
+  python scripts/bench_pipeline.py --rows 1000,100000 --concurrency 4 --runs 40 \
+      --out bench/results.json [--compare bench/baseline.json]
+
+Compare mode prints the p50/p95 delta against a previous results file (e.g. from
+another commit) and exits non-zero when any metric regresses by more than
+--fail-threshold percent.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import offline_env  # noqa: E402
+from bench_stats import summarize  # noqa: E402
+
+# graph node -> (agent module, function) wrapped for timing
+NODE_FUNCS = [
+    ("memory_load", "memory_agent", "load"),
+    ("nlp", "nlp_agent", "run"),
+    ("db", "db_agent", "run"),
+    ("csv", "csv_agent", "run"),
+    ("report", "report_agent", "run"),
+    ("email", "email_agent", "run"),
+    ("memory_save", "memory_agent", "save"),
+]
+
+_timings_lock = threading.Lock()
+_node_timings: Dict[str, List[float]] = {}
+
+
+def _timed(node: str, fn: Callable) -> Callable:
+    def wrapper(state, settings, logger):
+        start = time.perf_counter()
+        try:
+            return fn(state, settings, logger)
+        finally:
+            elapsed = time.perf_counter() - start
+            with _timings_lock:
+                _node_timings.setdefault(node, []).append(elapsed)
+    return wrapper
+
+
+def install_node_timers() -> None:
+    from importlib import import_module
+    for node, mod_name, func_name in NODE_FUNCS:
+        mod = import_module(f"agents.{mod_name}")
+        setattr(mod, func_name, _timed(node, getattr(mod, func_name)))
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=offline_env.ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def bench_size(rows: int, args, workdir: str) -> Dict[str, Any]:
+    from main import run_once
+
+    dataset = offline_env.generate_dataset(os.path.join(workdir, f"data-{rows}.db"), rows)
+    overrides = offline_env.data_overrides(dataset, with_openai=not args.no_openai, with_email=not args.no_email)
+    questions = [q for q, _ in offline_env.QUESTION_MIX]
+
+    for i in range(args.warmup):
+        run_once(questions[i % len(questions)], overrides=overrides, user_id="bench-warmup")
+    with _timings_lock:
+        _node_timings.clear()
+
+    e2e: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors: List[str] = []
+
+    def one(i: int) -> None:
+        start = time.perf_counter()
+        try:
+            out = run_once(questions[i % len(questions)], overrides=overrides, user_id=f"bench-{i % args.concurrency}")
+            status = out.get("status") or "unknown"
+        except Exception as e:
+            status = "exception"
+            errors.append(str(e))
+        elapsed = time.perf_counter() - start
+        with _timings_lock:
+            e2e.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one, range(args.runs)))
+    wall = time.perf_counter() - wall_start
+
+    with _timings_lock:
+        nodes = {name: summarize(vals) for name, vals in _node_timings.items()}
+    return {
+        "rows": rows,
+        "concurrency": args.concurrency,
+        "runs": args.runs,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(args.runs / wall, 3) if wall else 0.0,
+        "statuses": statuses,
+        "errors": errors[:10],
+        "e2e": summarize(e2e),
+        "nodes": nodes,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold_pct: float) -> bool:
+    """Print p50/p95 deltas per (rows, metric); return True when nothing regressed past the threshold."""
+    base_by_rows = {(r["rows"], r["concurrency"]): r for r in baseline.get("results", [])}
+    ok = True
+    print(f"\nComparison against {baseline.get('meta', {}).get('git', '?')}:")
+    for res in current.get("results", []):
+        base = base_by_rows.get((res["rows"], res["concurrency"]))
+        if not base:
+            print(f"  rows={res['rows']} c={res['concurrency']}: no baseline")
+            continue
+        pairs = [("e2e", res["e2e"], base["e2e"])] + [
+            (n, s, base["nodes"].get(n, {})) for n, s in sorted(res["nodes"].items())
+        ]
+        for name, cur, old in pairs:
+            for key in ("p50_ms", "p95_ms"):
+                if not old.get(key) or cur.get(key) is None:
+                    continue
+                delta = (cur[key] - old[key]) / old[key] * 100.0
+                flag = ""
+                if delta > threshold_pct:
+                    flag = "  REGRESSION"
+                    ok = False
+                print(f"  rows={res['rows']:>8} {name:12} {key}: {old[key]:>10.2f} -> {cur[key]:>10.2f} ({delta:+.1f}%){flag}")
+    return ok
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", default="1000,50000", help="comma-separated data sizes")
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--runs", type=int, default=20, help="measured runs per data size")
+    ap.add_argument("--warmup", type=int, default=2)
+    ap.add_argument("--openai-latency-ms", type=float, default=400.0)
+    ap.add_argument("--openai-jitter-ms", type=float, default=100.0)
+    ap.add_argument("--sendgrid-latency-ms", type=float, default=250.0)
+    ap.add_argument("--sendgrid-jitter-ms", type=float, default=50.0)
+    ap.add_argument("--no-openai", action="store_true", help="skip the LLM path (heuristic SQL)")
+    ap.add_argument("--no-email", action="store_true", help="leave email unconfigured so the node skips")
+    ap.add_argument("--pg-dsn", default="", help="use a local Postgres app store instead of the SQLite stand-in")
+    ap.add_argument("--workdir", default="", help="directory for datasets, artifacts and logs (default: temp dir)")
+    ap.add_argument("--out", default="", help="write JSON results here")
+    ap.add_argument("--compare", default="", help="baseline JSON results to compare against")
+    ap.add_argument("--fail-threshold", type=float, default=15.0, help="regression threshold in percent")
+    args = ap.parse_args()
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="bench-pipeline-"))
+    os.makedirs(workdir, exist_ok=True)
+    out_path = os.path.abspath(args.out) if args.out else ""
+    compare_path = os.path.abspath(args.compare) if args.compare else ""
+    # artifacts/ and logs/ are relative paths in the app; keep them out of the repo
+    os.chdir(workdir)
+
+    offline_env.install(args.openai_latency_ms, args.openai_jitter_ms, args.sendgrid_latency_ms, args.sendgrid_jitter_ms,
+                        workdir=workdir)
+    if args.pg_dsn:
+        import main
+        from app.config import settings
+        from app.database import Database
+        settings.SUPABASE_POOLER_DSN = ""
+        settings.SUPABASE_DIRECT_DSN = args.pg_dsn
+        main.Database = Database
+    install_node_timers()
+
+    sizes = [int(x) for x in args.rows.split(",") if x.strip()]
+    results = []
+    for rows in sizes:
+        print(f"[bench] rows={rows} concurrency={args.concurrency} runs={args.runs} ...", flush=True)
+        res = bench_size(rows, args, workdir)
+        results.append(res)
+        e = res["e2e"]
+        print(f"  e2e p50={e.get('p50_ms')}ms p95={e.get('p95_ms')}ms p99={e.get('p99_ms')}ms  {res['throughput_rps']} runs/s  statuses={res['statuses']}")
+        for name, _, _ in NODE_FUNCS:
+            s = res["nodes"].get(name)
+            if s:
+                print(f"    {name:12} p50={s['p50_ms']:>9}ms p95={s['p95_ms']:>9}ms p99={s['p99_ms']:>9}ms")
+
+    report = {
+        "meta": {
+            "git": git_revision(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "app_store": "postgres" if args.pg_dsn else "sqlite",
+            "args": {k: v for k, v in vars(args).items() if k != "pg_dsn"},
+        },
+        "results": results,
+    }
+    if out_path:
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[bench] results written to {out_path}")
+    if compare_path:
+        with open(compare_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, args.fail_threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Correctness and speed of the SQL guard: the tokenizer (utils/sql_tokens.py) against
+the regex checks it replaced.
+
+Generates queries from templates mixing comments, string literals that contain
+keywords or "limit", identifiers such as limit_value / updated_at, nested LIMITs,
+trailing comments and injected statements. Each template is hand-labelled with the
+expected verdict and the guarded SQL it should become at a 500-row cap. Reports
+misclassifications for both implementations and per-query timings. The tokenizer
+is slower than the regexes on a new query text; its memoized timing only applies
+when the same texts come back, as generated and cached questions do.
+
+Usage:
+  python scripts/bench_sql_guard.py --queries 5000 --seed 7
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from typing import List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import sql_tokens  # noqa: E402
+
+# The regex guard as it was before the tokenizer
+_LEGACY_FORBIDDEN = re.compile(r"\b(insert|update|delete|drop|alter|create|truncate|grant|revoke)\b", re.IGNORECASE)
+_LEGACY_SELECT = re.compile(r"^\s*select\b", re.IGNORECASE)
+_LEGACY_LIMIT = re.compile(r"\blimit\b", re.IGNORECASE)
+
+
+def legacy_is_safe(q: str) -> bool:
+    return bool(_LEGACY_SELECT.search(q)) and not _LEGACY_FORBIDDEN.search(q)
+
+
+def legacy_ensure_limit(q: str, n: int) -> str:
+    return q if _LEGACY_LIMIT.search(q) else f"{q.rstrip().rstrip(';')} LIMIT {n}"
+
+
+COLUMNS = ["id", "amount", "region", "limit_value", "updated_at", "created_by", "dropped_calls", "insert_ts", "\"update\""]
+# (template, guarded outputs accepted at cap 500). {cap} is min(n, 500), the query's own LIMIT lowered to the cap;
+# outputs are compared after collapsing whitespace, lower-casing and dropping a trailing ";"
+SAFE_SHAPES: List[Tuple[str, List[str]]] = [
+    ("SELECT {c} FROM t", ["SELECT {c} FROM t LIMIT 500"]),
+    ("SELECT {c} FROM t LIMIT {n}", ["SELECT {c} FROM t LIMIT {cap}"]),
+    ("SELECT {c} FROM t -- limit {n}", ["SELECT {c} FROM t LIMIT 500", "SELECT {c} FROM t -- limit {n}\nLIMIT 500"]),
+    ("SELECT {c} FROM t /* drop table t */", ["SELECT {c} FROM t LIMIT 500", "SELECT {c} FROM t /* drop table t */ LIMIT 500"]),
+    ("SELECT '{kw} table t' AS note, {c} FROM t", ["SELECT '{kw} table t' AS note, {c} FROM t LIMIT 500"]),
+    ("SELECT {c} FROM t WHERE region = 'limit {n}'", ["SELECT {c} FROM t WHERE region = 'limit {n}' LIMIT 500"]),
+    ("SELECT {c} FROM (SELECT * FROM t LIMIT {n}) s", ["SELECT {c} FROM (SELECT * FROM t LIMIT {n}) s LIMIT 500"]),
+    ("SELECT {c} FROM (SELECT * FROM t LIMIT 5) s LIMIT {n}", ["SELECT {c} FROM (SELECT * FROM t LIMIT 5) s LIMIT {cap}"]),
+    ("WITH s AS (SELECT * FROM t) SELECT {c} FROM s", ["WITH s AS (SELECT * FROM t) SELECT {c} FROM s LIMIT 500"]),
+    ("select {c} from t order by {c} desc limit {n};", ["select {c} from t order by {c} desc limit {cap}"]),
+    ("SELECT {c} FROM t LIMIT {n} -- trailing", ["SELECT {c} FROM t LIMIT {cap}", "SELECT {c} FROM t LIMIT {cap} -- trailing"]),
+    ("SELECT {c} FROM t WHERE note = 'it''s; {kw}'", ["SELECT {c} FROM t WHERE note = 'it''s; {kw}' LIMIT 500"]),
+]
+UNSAFE_SHAPES = [
+    "SELECT {c} FROM t; {kw} TABLE t",
+    "{kw} TABLE t",
+    "SELECT {c} INTO backup FROM t",
+    "WITH d AS ({kw} FROM t RETURNING *) SELECT * FROM d",
+    "SELECT pg_sleep(30), {c} FROM t",
+    "SELECT {c} FROM t /*! ; {kw} TABLE t */",
+    "SELECT 'x\\'; {kw} TABLE t; --' FROM t",
+    "SELECT {c} FROM t WHERE note = 'unterminated",
+    # MySQL comments out the rest of the line, LIMIT included
+    "SELECT {c} FROM t # LIMIT {n}",
+    # Side effects and row locks without a write keyword
+    "SELECT setval('t_id_seq', {n})",
+    "SELECT pg_advisory_lock({n}), {c} FROM t",
+    "SELECT {c} FROM t FOR SHARE",
+    "SELECT {c} FROM t LOCK IN SHARE MODE",
+]
+CAP = 500
+KEYWORDS = ["drop", "delete", "update", "insert", "truncate", "alter"]
+
+
+def generate(count: int, rng: random.Random) -> List[Tuple[str, bool, List[str]]]:
+    out = []
+    for _ in range(count):
+        c, kw, n = rng.choice(COLUMNS), rng.choice(KEYWORDS), rng.choice([10, 100, 500, 5000])
+        if rng.random() < 0.7:
+            shape, accepted = rng.choice(SAFE_SHAPES)
+            fmt = dict(c=c, kw=kw, n=n, cap=min(n, 500))
+            out.append((shape.format(**fmt), True, [a.format(**fmt) for a in accepted]))
+        else:
+            out.append((rng.choice(UNSAFE_SHAPES).format(c=c, kw=kw.upper(), n=n), False, []))
+    return out
+
+
+def canonical(q: str) -> str:
+    return " ".join(q.split()).rstrip(";").strip().lower()
+
+
+def timed(fn, queries: List[str]) -> float:
+    start = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - start) / max(1, len(queries)) * 1e6
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--queries", type=int, default=5000)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+    cases = generate(args.queries, random.Random(args.seed))
+
+    results = {}
+    for name, is_safe, ensure in (("legacy regex", legacy_is_safe, legacy_ensure_limit),
+                                  ("tokenizer", sql_tokens.is_safe_select, sql_tokens.ensure_limit)):
+        false_reject = false_accept = wrong_limit = 0
+        for q, safe, accepted in cases:
+            verdict = is_safe(q)
+            false_reject += safe and not verdict
+            false_accept += verdict and not safe
+            if safe and verdict and canonical(ensure(q, CAP)) not in {canonical(a) for a in accepted}:
+                wrong_limit += 1
+        results[name] = (false_reject, false_accept, wrong_limit)
+
+    queries = [q for q, _, _ in cases]
+
+    def guard(q: str):
+        return sql_tokens.ensure_limit(q, CAP) if sql_tokens.is_safe_select(q) else None
+
+    def guard_cold(q: str):
+        sql_tokens.analyze.cache_clear()
+        return guard(q)
+
+    cold = timed(guard_cold, queries)
+    for q in queries:
+        guard(q)  # fill the memo
+    warm = timed(guard, queries)
+    legacy = timed(lambda q: legacy_ensure_limit(q, CAP) if legacy_is_safe(q) else None, queries)
+    distinct = len(set(queries))
+
+    print(f"{len(cases)} queries ({distinct} distinct, {sum(1 for c in cases if not c[1])} unsafe), cap {CAP}")
+    print(f"{'':14} {'false reject':>13} {'false accept':>13} {'wrong LIMIT':>12}")
+    for name, (fr, fa, wl) in results.items():
+        print(f"{name:14} {fr:>13} {fa:>13} {wl:>12}")
+    print(f"per query: legacy {legacy:.1f} us, tokenizer cold {cold:.1f} us ({cold / legacy:.1f}x legacy), "
+          f"memoized {warm:.1f} us")
+    # The tokenizer is slower per new query text; it only wins when query texts repeat
+    print(f"memoized timing applies to repeated texts only ({distinct} distinct of {len(queries)} here)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+Latency statistics shared by the benchmark and load-test scripts.
+
+Samples are in seconds; summaries report milliseconds. Percentiles use the
+nearest-rank method so every reported value is an observed latency.
+"""
+import math
+from typing import Dict, List, Sequence
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))]
+
+
+def summarize(values: List[float], pcts: Sequence[float] = (50, 95, 99), digits: int = 3) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    out: Dict[str, float] = {"count": len(values), "mean_ms": round(sum(values) / len(values) * 1000, digits)}
+    for pct in pcts:
+        out[f"p{pct:g}_ms"] = round(percentile(values, pct) * 1000, digits)
+    out["max_ms"] = round(max(values) * 1000, digits)
+    return out
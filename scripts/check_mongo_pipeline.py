@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Hand-labelled SQL -> aggregation pipeline cases for utils/mongo_utils.pipeline_from_sql.
+
+Each case is the SQL a template or the LLM could produce and the exact pipeline the
+MongoDB source must run for it (or None when the SQL is outside the supported subset
+and the db step has to sample instead). Prints every mismatch and exits non-zero if
+there is one. Needs no MongoDB server or pymongo.
+
+Usage:
+  python scripts/check_mongo_pipeline.py
+"""
+import json
+import os
+import sys
+from typing import Any, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import mongo_utils  # noqa: E402
+
+COLUMNS = [{"name": "region", "type": "str"}, {"name": "amount", "type": "float"}, {"name": "created_at", "type": "date"}]
+
+CASES: List[Tuple[str, Optional[List[Any]]]] = [
+    ("SELECT * FROM sales LIMIT 50", [{"$limit": 50}]),
+    ("SELECT region, amount FROM sales WHERE amount > 10 ORDER BY amount DESC LIMIT 5", [
+        {"$match": {"amount": {"$gt": 10}}},
+        {"$sort": {"amount": -1}},
+        {"$project": {"_id": 0, "region": 1, "amount": 1}},
+        {"$limit": 5},
+    ]),
+    # Disjoint operators on one field share a condition
+    ("SELECT * FROM sales WHERE amount >= 10 AND amount < 20", [{"$match": {"amount": {"$gte": 10, "$lt": 20}}}]),
+    # Colliding conditions on one field must all hold
+    ("SELECT * FROM sales WHERE amount > 20 AND amount > 10", [
+        {"$match": {"$and": [{"amount": {"$gt": 20}}, {"amount": {"$gt": 10}}]}},
+    ]),
+    ("SELECT * FROM sales WHERE amount >= 100 AND amount = 5", [
+        {"$match": {"$and": [{"amount": {"$gte": 100}}, {"amount": 5}]}},
+    ]),
+    ("SELECT * FROM sales WHERE region IS NULL AND region = 'x'", [
+        {"$match": {"$and": [{"region": None}, {"region": "x"}]}},
+    ]),
+    ("SELECT * FROM sales WHERE region = 'x' AND amount BETWEEN 1 AND 5 AND region <> 'y'", [
+        {"$match": {"$and": [{"region": "x"}, {"amount": {"$gte": 1, "$lte": 5}}, {"region": {"$ne": "y"}}]}},
+    ]),
+    ("SELECT * FROM sales WHERE region IN ('a', 'b') AND region NOT IN ('c')", [
+        {"$match": {"region": {"$in": ["a", "b"], "$nin": ["c"]}}},
+    ]),
+    ("SELECT * FROM sales WHERE region LIKE 'n%'", [{"$match": {"region": {"$regex": "^n.*$"}}}]),
+    ("SELECT region, COUNT(*) AS count FROM sales GROUP BY region ORDER BY count DESC LIMIT 20", [
+        {"$group": {"_id": {"region": "$region"}, "count": {"$sum": 1}}},
+        {"$project": {"_id": 0, "region": "$_id.region", "count": 1}},
+        {"$sort": {"count": -1}},
+        {"$limit": 20},
+    ]),
+    ("SELECT region, SUM(amount) AS total FROM sales s WHERE s.amount > 0 GROUP BY s.region", [
+        {"$match": {"amount": {"$gt": 0}}},
+        {"$group": {"_id": {"region": "$region"}, "total": {"$sum": "$amount"}}},
+        {"$project": {"_id": 0, "region": "$_id.region", "total": 1}},
+    ]),
+    ("SELECT * FROM sales LIMIT 10 OFFSET 20", [{"$skip": 20}, {"$limit": 10}]),
+    ("SELECT * FROM sales WHERE amount > 1 OR amount < 0", None),
+    ("SELECT a.region FROM sales a JOIN regions b ON a.region = b.name", None),
+    ("SELECT region, COUNT(*) AS n FROM sales GROUP BY region HAVING COUNT(*) > 5", None),
+    ("SELECT * FROM sales WHERE amount > (SELECT AVG(amount) FROM sales)", None),
+]
+
+
+def main() -> int:
+    failures = 0
+    for sql, expected in CASES:
+        try:
+            got: Optional[List[Any]] = mongo_utils.pipeline_from_sql(sql, COLUMNS)
+        except ValueError:
+            got = None
+        if got != expected:
+            failures += 1
+            print(f"MISMATCH {sql}\n  expected {json.dumps(expected)}\n  got      {json.dumps(got, default=str)}")
+    print(f"{len(CASES) - failures}/{len(CASES)} cases match")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
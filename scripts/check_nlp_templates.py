@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Hand-labelled question -> SQL cases for agents/nlp_agent.match_template.
+
+Each case is a question about a `sales` table and the exact SQL the template path must
+run for it without the LLM, or None when the question has to go to the LLM (no
+template, or confidence below the default NLP_TEMPLATE_MIN_CONFIDENCE). A question
+whose filter, entity or comparison the templates cannot express must never come back
+as confident SQL that silently drops it. Prints every mismatch and exits non-zero if
+there is one. Needs no database or OpenAI key.
+
+Usage:
+  python scripts/check_nlp_templates.py
+"""
+import os
+import sys
+from typing import List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agents.nlp_agent import match_template  # noqa: E402
+
+MIN_CONFIDENCE = 0.8
+COLUMNS = [
+    {"name": "region", "type": "text"},
+    {"name": "status", "type": "text"},
+    {"name": "amount", "type": "numeric"},
+    {"name": "created_at", "type": "timestamp"},
+]
+
+CASES: List[Tuple[str, Optional[str]]] = [
+    # Shapes the templates answer
+    ("top 5 regions by amount",
+     "SELECT region, SUM(amount) AS total_amount FROM sales GROUP BY region ORDER BY total_amount DESC LIMIT 5"),
+    ("top 10 sales by amount", "SELECT * FROM sales ORDER BY amount DESC LIMIT 10"),
+    ("count by status", "SELECT status, COUNT(*) AS count FROM sales GROUP BY status ORDER BY count DESC LIMIT 20"),
+    ("how many sales per region",
+     "SELECT region, COUNT(*) AS count FROM sales GROUP BY region ORDER BY count DESC LIMIT 20"),
+    ("total amount by region",
+     "SELECT region, SUM(amount) AS total_amount FROM sales GROUP BY region ORDER BY total_amount DESC LIMIT 100"),
+    ("average amount by status over the last week",
+     "SELECT status, AVG(amount) AS avg_amount FROM sales WHERE created_at >= NOW() - INTERVAL '7 days' "
+     "GROUP BY status ORDER BY avg_amount DESC LIMIT 100"),
+    ("sum of amount by region for the last 3 months",
+     "SELECT region, SUM(amount) AS total_amount FROM sales WHERE created_at >= NOW() - INTERVAL '90 days' "
+     "GROUP BY region ORDER BY total_amount DESC LIMIT 100"),
+    ("show sample rows", "SELECT * FROM sales LIMIT 50"),
+    ("show 20 rows from sales", "SELECT * FROM sales LIMIT 20"),
+    # Filters and values the templates would drop
+    ("top 5 regions by amount in europe", None),
+    ("top 5 customers by amount in 2023", None),
+    ("total amount by region for 2024", None),
+    ("count by status for customer_42", None),
+    ("average amount by region in january", None),
+    ("sum of amount by status in q1", None),
+    ("total amount by region where status is paid", None),
+    # Entities that are not columns: raw rows are not a per-customer aggregate
+    ("top customers by amount", None),
+    ("count orders by region", None),
+    # Comparisons and derived values
+    ("top 5 regions by amount above 100", None),
+    ("growth of amount by region", None),
+]
+
+
+def main() -> int:
+    failures = 0
+    for question, expected in CASES:
+        res = match_template("sales", COLUMNS, question, "postgres")
+        got = res["query"] if res and res["confidence"] >= MIN_CONFIDENCE else None
+        if got != expected:
+            failures += 1
+            print(f"MISMATCH {question!r}\n  expected {expected}\n  got      {got} ({res and res['confidence']})")
+    print(f"{len(CASES) - failures}/{len(CASES)} cases match")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
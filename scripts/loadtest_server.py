@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+HTTP load generator and soak test for server.py.
+
+Drives /run, /logs, /db/test and the scheduler endpoints with a weighted mix, either
+open-loop at a target rate (--rps) or closed-loop with N concurrent clients
+(--concurrency). Records per-endpoint latency distributions, error rates and the
+server's RSS over time, and can sweep concurrency levels to find the knee.
+
+Usage:
+  # against an offline server (stubbed externals) started by this script
+  python scripts/loadtest_server.py --spawn-offline --concurrency 8 --duration 60
+
+  # concurrency sweep against an already running server
+  python scripts/loadtest_server.py --base-url http://localhost:8010 --server-pid 1234 \
+      --sweep 1,2,4,8,16,32 --duration 30 --out loadtest.json
+
+  # soak: fixed rate for an hour, sampling RSS every 10s
+  python scripts/loadtest_server.py --spawn-offline --rps 5 --duration 3600 --rss-interval 10
+
+Against a real deployment, --run-extra / --dbtest-payload supply connection fields,
+e.g. --run-extra '{"use_env": true}' --dbtest-payload '{"db_type": "postgres", "use_env": true}'.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import bench_stats  # noqa: E402
+from bench_stats import percentile  # noqa: E402
+
+DEFAULT_QUESTIONS = [
+    "Count orders by region",
+    "Top 10 customers by total amount",
+    "How many orders per category",
+    "Show sample rows",
+    "Average quantity by status",
+]
+
+# endpoint name -> default weight in the request mix
+DEFAULT_MIX = {"run": 4, "logs": 3, "db_test": 2, "sched_list": 2, "sched_add_delete": 1}
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return bench_stats.summarize(values, pcts=(50, 90, 95, 99), digits=2)
+
+
+def read_rss_mb(pid: Optional[int]) -> Optional[float]:
+    if not pid:
+        return None
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024.0, 2)
+    except OSError:
+        pass
+    try:
+        import psutil  # type: ignore
+        return round(psutil.Process(pid).memory_info().rss / (1024.0 * 1024.0), 2)
+    except Exception:
+        return None
+
+
+class Recorder:
+    """Collects (endpoint, latency, ok) samples plus per-interval time series.
+
+    Requests the open loop never sent (client max_in_flight reached) are counted as
+    drops, not samples, so they cannot pull the latency percentiles down exactly when
+    the server is saturated.
+    """
+
+    def __init__(self, pid: Optional[int]):
+        self.pid = pid
+        self.samples: List[Tuple[float, str, float, bool, str]] = []
+        self.series: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self.started = time.perf_counter()
+        self._last_index = 0
+        self._last_dropped = 0
+
+    def add(self, endpoint: str, latency: float, ok: bool, detail: str = "") -> None:
+        self.samples.append((time.perf_counter() - self.started, endpoint, latency, ok, detail))
+
+    def drop(self) -> None:
+        self.dropped += 1
+
+    def snapshot(self, in_flight: int) -> Dict[str, Any]:
+        window = self.samples[self._last_index:]
+        self._last_index = len(self.samples)
+        dropped, self._last_dropped = self.dropped - self._last_dropped, self.dropped
+        elapsed = time.perf_counter() - self.started
+        prev_t = self.series[-1]["t_s"] if self.series else 0.0
+        span = max(1e-9, elapsed - prev_t)
+        point = {
+            "t_s": round(elapsed, 2),
+            "rps": round(len(window) / span, 2),
+            "errors": sum(1 for s in window if not s[3]),
+            "dropped": dropped,
+            "p95_ms": round(percentile([s[2] for s in window], 95) * 1000, 2),
+            "in_flight": in_flight,
+            "rss_mb": read_rss_mb(self.pid),
+        }
+        self.series.append(point)
+        return point
+
+    def report(self) -> Dict[str, Any]:
+        by_ep: Dict[str, Dict[str, Any]] = {}
+        for _, ep, lat, ok, detail in self.samples:
+            d = by_ep.setdefault(ep, {"lat": [], "errors": 0, "error_samples": []})
+            d["lat"].append(lat)
+            if not ok:
+                d["errors"] += 1
+                if len(d["error_samples"]) < 5:
+                    d["error_samples"].append(detail)
+        total = len(self.samples)
+        errors = sum(1 for s in self.samples if not s[3])
+        duration = max(1e-9, time.perf_counter() - self.started)
+        rss = [p["rss_mb"] for p in self.series if p.get("rss_mb") is not None]
+        return {
+            "requests": total,
+            "errors": errors,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "dropped": self.dropped,
+            "drop_rate": round(self.dropped / (total + self.dropped), 4) if total + self.dropped else 0.0,
+            "throughput_rps": round(total / duration, 2),
+            "latency": summarize([s[2] for s in self.samples]),
+            "endpoints": {
+                ep: {**summarize(d["lat"]), "errors": d["errors"], "error_rate": round(d["errors"] / len(d["lat"]), 4), "error_samples": d["error_samples"]}
+                for ep, d in sorted(by_ep.items())
+            },
+            "rss_mb": {"start": rss[0], "end": rss[-1], "max": max(rss), "growth": round(rss[-1] - rss[0], 2)} if rss else None,
+            "series": self.series,
+        }
+
+
+class Workload:
+    def __init__(self, client: httpx.AsyncClient, args, recorder: Recorder):
+        self.client = client
+        self.args = args
+        self.rec = recorder
+        self.questions = args.questions
+        self.run_extra = json.loads(args.run_extra) if args.run_extra else {}
+        self.dbtest_payload = json.loads(args.dbtest_payload) if args.dbtest_payload else {"db_type": "sqlite", "use_env": True}
+        mix = dict(DEFAULT_MIX)
+        for part in (args.mix or "").split(","):
+            if "=" in part:
+                k, v = part.split("=", 1)
+                mix[k.strip()] = float(v)
+        self.endpoints = [k for k, v in mix.items() if v > 0]
+        self.weights = [mix[k] for k in self.endpoints]
+        self.last_log_id: Optional[int] = None
+
+    async def _request(self, endpoint: str, method: str, path: str, **kwargs) -> Optional[Dict[str, Any]]:
+        start = time.perf_counter()
+        try:
+            resp = await self.client.request(method, path, **kwargs)
+            latency = time.perf_counter() - start
+            body = resp.json() if resp.headers.get("content-type", "").startswith("application/json") else {}
+            ok = resp.status_code < 400 and body.get("status") not in ("error",)
+            detail = "" if ok else f"HTTP {resp.status_code}: {str(body.get('error') or body)[:200]}"
+            self.rec.add(endpoint, latency, ok, detail)
+            return body
+        except Exception as e:
+            self.rec.add(endpoint, time.perf_counter() - start, False, f"{type(e).__name__}: {e}")
+            return None
+
+    async def one(self) -> None:
+        endpoint = random.choices(self.endpoints, weights=self.weights, k=1)[0]
+        if endpoint == "run":
+            payload = {"question": random.choice(self.questions), "user_id": f"load-{random.randint(1, 20)}", **self.run_extra}
+            await self._request("run", "POST", "/run", json=payload)
+        elif endpoint == "logs":
+            params: Dict[str, Any] = {"limit": 50}
+            if self.last_log_id is not None and random.random() < 0.5:
+                params["after_id"] = self.last_log_id
+            body = await self._request("logs", "GET", "/logs", params=params)
+            if body and body.get("next_after_id") is not None:
+                self.last_log_id = body["next_after_id"]
+        elif endpoint == "db_test":
+            await self._request("db_test", "POST", "/db/test", json=self.dbtest_payload)
+        elif endpoint == "sched_list":
+            await self._request("sched_list", "GET", "/scheduler/list")
+        elif endpoint == "sched_add_delete":
+            payload = {"question": random.choice(self.questions), "frequency": "daily", "time": "03:17", "user_id": "loadtest"}
+            body = await self._request("sched_add", "POST", "/scheduler/add", json=payload)
+            if body and body.get("job_id"):
+                await self._request("sched_delete", "DELETE", f"/scheduler/{body['job_id']}")
+
+
+async def run_stage(args, base_url: str, pid: Optional[int], concurrency: int, rps: float) -> Dict[str, Any]:
+    rec = Recorder(pid)
+    limits = httpx.Limits(max_connections=max(concurrency, args.max_in_flight), max_keepalive_connections=max(concurrency, 10))
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        wl = Workload(client, args, rec)
+        deadline = time.perf_counter() + args.duration
+        in_flight = 0
+        stop = asyncio.Event()
+
+        async def sampler() -> None:
+            while not stop.is_set():
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=args.rss_interval)
+                except asyncio.TimeoutError:
+                    pass
+                point = rec.snapshot(in_flight)
+                if args.verbose:
+                    print(f"    t={point['t_s']:>7}s rps={point['rps']:>7} err={point['errors']:>4} drop={point['dropped']:>4} p95={point['p95_ms']:>9}ms rss={point['rss_mb']}MB", flush=True)
+
+        async def tracked() -> None:
+            nonlocal in_flight
+            in_flight += 1
+            try:
+                await wl.one()
+            finally:
+                in_flight -= 1
+
+        sampler_task = asyncio.create_task(sampler())
+        rec.snapshot(0)
+        if rps > 0:
+            # Open loop: fire at a fixed rate regardless of latency, capped by max_in_flight
+            interval = 1.0 / rps
+            tasks = set()
+            next_at = time.perf_counter()
+            while time.perf_counter() < deadline:
+                if in_flight < args.max_in_flight:
+                    t = asyncio.create_task(tracked())
+                    tasks.add(t)
+                    t.add_done_callback(tasks.discard)
+                else:
+                    rec.drop()
+                next_at += interval
+                await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        else:
+            async def worker() -> None:
+                while time.perf_counter() < deadline:
+                    await tracked()
+            await asyncio.gather(*[worker() for _ in range(concurrency)])
+        stop.set()
+        await sampler_task
+    out = rec.report()
+    out.update({"concurrency": concurrency if rps <= 0 else None, "target_rps": rps or None, "duration_s": args.duration})
+    return out
+
+
+def wait_for_health(base_url: str, timeout: float = 60.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=2.0).status_code == 200:
+                return
+        except Exception:
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"Server at {base_url} did not become healthy within {timeout:.0f}s")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--base-url", default="http://127.0.0.1:8010")
+    ap.add_argument("--server-pid", type=int, default=0, help="PID to sample RSS from")
+    ap.add_argument("--spawn-offline", action="store_true", help="start scripts/offline_server.py and test it")
+    ap.add_argument("--offline-args", default="", help="extra args for offline_server.py, e.g. '--rows 100000'")
+    ap.add_argument("--concurrency", type=int, default=4, help="closed-loop clients")
+    ap.add_argument("--rps", type=float, default=0.0, help="open-loop target rate (overrides --concurrency)")
+    ap.add_argument("--sweep", default="", help="comma-separated concurrency levels to run in sequence")
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds per stage")
+    ap.add_argument("--mix", default="", help="endpoint weights, e.g. run=5,logs=2,db_test=1,sched_list=1,sched_add_delete=0")
+    ap.add_argument("--questions-file", default="", help="one question per line (default: built-in mix)")
+    ap.add_argument("--run-extra", default="", help="JSON merged into every /run payload")
+    ap.add_argument("--dbtest-payload", default="", help="JSON body for /db/test")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--max-in-flight", type=int, default=256)
+    ap.add_argument("--rss-interval", type=float, default=5.0)
+    ap.add_argument("--out", default="", help="write JSON results here")
+    ap.add_argument("-v", "--verbose", action="store_true", help="print the time series as it is sampled")
+    args = ap.parse_args()
+
+    args.questions = DEFAULT_QUESTIONS
+    if args.questions_file:
+        with open(args.questions_file, "r", encoding="utf-8") as f:
+            args.questions = [line.strip() for line in f if line.strip()] or DEFAULT_QUESTIONS
+
+    base_url = args.base_url.rstrip("/")
+    proc: Optional[subprocess.Popen] = None
+    pid = args.server_pid or None
+    if args.spawn_offline:
+        port = base_url.rsplit(":", 1)[-1].split("/")[0]
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "offline_server.py")
+        cmd = [sys.executable, script, "--port", port] + args.offline_args.split()
+        proc = subprocess.Popen(cmd)
+        pid = proc.pid
+    try:
+        wait_for_health(base_url)
+        levels = [int(x) for x in args.sweep.split(",") if x.strip()] if args.sweep else [args.concurrency]
+        stages = []
+        for level in levels:
+            label = f"rps={args.rps}" if args.rps > 0 else f"concurrency={level}"
+            print(f"[load] {label} for {args.duration:.0f}s ...", flush=True)
+            res = asyncio.run(run_stage(args, base_url, pid, level, args.rps))
+            stages.append(res)
+            lat = res["latency"]
+            print(f"  {res['throughput_rps']} req/s  errors={res['error_rate'] * 100:.2f}%  dropped={res['dropped']} ({res['drop_rate'] * 100:.2f}%)  p50={lat.get('p50_ms')}ms p95={lat.get('p95_ms')}ms p99={lat.get('p99_ms')}ms  rss={res['rss_mb']}")
+            for ep, s in res["endpoints"].items():
+                print(f"    {ep:16} n={s['count']:>6} p50={s.get('p50_ms'):>9}ms p95={s.get('p95_ms'):>9}ms err={s['error_rate'] * 100:.2f}%")
+            if args.rps > 0:
+                break
+        if len(stages) > 1:
+            print("\n[load] sweep summary (concurrency -> req/s, p95):")
+            best = 0.0
+            for s in stages:
+                marker = ""
+                if best and s["throughput_rps"] < best * 1.05:
+                    marker = "  <- throughput flat: knee reached"
+                best = max(best, s["throughput_rps"])
+                print(f"  {s['concurrency']:>4} -> {s['throughput_rps']:>8} req/s  p95={s['latency'].get('p95_ms')}ms{marker}")
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump({"meta": {"timestamp": datetime.utcnow().isoformat(), "base_url": base_url, "args": {k: v for k, v in vars(args).items() if k != "questions"}}, "stages": stages}, f, indent=2)
+            print(f"[load] results written to {args.out}")
+    finally:
+        if proc:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
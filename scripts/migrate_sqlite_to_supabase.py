@@ -14,10 +14,11 @@ Connection picks from environment:
 Safe to run multiple times. 'runs' rows are upserted on run_id; logs and memory_messages are appended.
 """
 import os
+import sys
 import sqlite3
 import argparse
 import json
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -29,6 +30,9 @@ _ENV_PATH = Path(__file__).resolve().parent.parent / ".env"
 load_dotenv(dotenv_path=_ENV_PATH, override=True)
 print(f"dotenv: loaded={_ENV_PATH.exists()} path={_ENV_PATH}")
 
+sys.path.insert(0, str(_ENV_PATH.parent))
+from app.database import _jsonb_safe  # noqa: E402
+
 
 DDL_STATEMENTS = [
     """
@@ -39,7 +43,7 @@ DDL_STATEMENTS = [
         level TEXT,
         node TEXT,
         event TEXT,
-        data TEXT
+        data JSONB
     )
     """,
     """
@@ -62,7 +66,11 @@ DDL_STATEMENTS = [
         content TEXT
     )
     """,
-    "CREATE INDEX IF NOT EXISTS idx_logs_run_id ON logs(run_id)",
+    "CREATE INDEX IF NOT EXISTS idx_logs_run_id_id ON logs(run_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_logs_level_id ON logs(level, id)",
+    "CREATE INDEX IF NOT EXISTS idx_logs_node_event_id ON logs(node, event, id)",
+    "CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs(timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_logs_data ON logs USING GIN (data jsonb_path_ops)",
     "CREATE INDEX IF NOT EXISTS idx_mem_user_id ON memory_messages(user_id)",
 ]
 
@@ -88,6 +96,21 @@ def ensure_schema(conn) -> None:
             cur.execute(stmt)
 
 
+def log_data_json(text: Optional[str]) -> str:
+    """Legacy TEXT log payload as JSON that jsonb accepts, like the in-place migration in app.database.
+
+    Empty values become {}, unparsable text is kept as {"raw": <text>}, and NaN/Infinity
+    or NUL characters are dropped so one bad row cannot abort the batch.
+    """
+    if not text:
+        return "{}"
+    try:
+        value = json.loads(text)
+    except (TypeError, ValueError):
+        value = {"raw": str(text)}
+    return json.dumps(_jsonb_safe(value), ensure_ascii=False, allow_nan=False)
+
+
 def fetch_sqlite_rows(sqlite_path: str, query: str, params: tuple = ()) -> List[sqlite3.Row]:
     conn = sqlite3.connect(sqlite_path)
     conn.row_factory = sqlite3.Row
@@ -146,7 +169,7 @@ def main():
                 execute_values(
                     cur,
                     "INSERT INTO logs (run_id, timestamp, level, node, event, data) VALUES %s",
-                    [(r["run_id"], r["timestamp"], r["level"], r["node"], r["event"], r["data"]) for r in logs],
+                    [(r["run_id"], r["timestamp"], r["level"], r["node"], r["event"], log_data_json(r["data"])) for r in logs],
                 )
             # Insert memory
             if mem:
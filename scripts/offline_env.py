@@ -0,0 +1,560 @@
+"""
+Offline stand-ins for running the pipeline without Supabase, OpenAI or SendGrid.
+
+Used by the benchmark and load-test scripts:
+  - generate_dataset(): builds a SQLite data source with a synthetic sales table
+  - SqliteAppStore: drop-in replacement for app.database.Database backed by SQLite;
+    install() refuses to run if its public methods drift from Database's
+  - install(): patches the app store, OpenAI client and MCP tool calls in-process,
+    injecting configurable latency for the external services
+
+The db tool is executed in-process through the same db_utils path the MCP db server
+uses, so query cost is real while the stdio transport is skipped.
+"""
+import inspect
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from utils import db_utils, replica_utils, sql_tokens  # noqa: E402
+
+BENCH_TABLE = "bench_sales"
+
+# (question, SQL the stubbed LLM answers with); {table} is substituted
+QUESTION_MIX = [
+    ("Count orders by region", "SELECT region, COUNT(*) AS count FROM {table} GROUP BY region ORDER BY count DESC LIMIT 20"),
+    ("Top 10 customers by total amount", "SELECT customer, SUM(amount) AS total FROM {table} GROUP BY customer ORDER BY total DESC LIMIT 10"),
+    ("How many orders per category", "SELECT category, COUNT(*) AS count FROM {table} GROUP BY category ORDER BY count DESC LIMIT 20"),
+    ("Show sample rows", "SELECT * FROM {table} LIMIT 50"),
+    ("Average quantity by status", "SELECT status, AVG(quantity) AS avg_quantity FROM {table} GROUP BY status LIMIT 20"),
+]
+
+_REGIONS = ["north", "south", "east", "west", "central"]
+_CATEGORIES = ["hardware", "software", "services", "support", "training", "licensing", "cloud", "consulting"]
+_STATUSES = ["open", "paid", "shipped", "cancelled", "refunded"]
+
+
+def generate_dataset(path: str, rows: int, seed: int = 42) -> str:
+    """Create (or reuse) a SQLite file with `rows` synthetic sales rows."""
+    if os.path.exists(path):
+        conn = sqlite3.connect(path)
+        try:
+            n = conn.execute(f"SELECT COUNT(*) FROM {BENCH_TABLE}").fetchone()[0]
+            if n == rows:
+                return path
+        except sqlite3.Error:
+            pass
+        finally:
+            conn.close()
+        os.remove(path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    rnd = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(
+            f"""
+            CREATE TABLE {BENCH_TABLE} (
+                id INTEGER PRIMARY KEY,
+                created_at TEXT,
+                region TEXT,
+                category TEXT,
+                status TEXT,
+                customer TEXT,
+                amount REAL,
+                quantity INTEGER
+            )
+            """
+        )
+        batch: List[tuple] = []
+        for i in range(1, rows + 1):
+            batch.append((
+                i,
+                (start + timedelta(minutes=i)).isoformat(),
+                rnd.choice(_REGIONS),
+                rnd.choice(_CATEGORIES),
+                rnd.choice(_STATUSES),
+                f"customer_{rnd.randint(1, max(10, rows // 50))}",
+                round(rnd.uniform(5, 5000), 2),
+                rnd.randint(1, 20),
+            ))
+            if len(batch) >= 10000:
+                conn.executemany(f"INSERT INTO {BENCH_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+                batch.clear()
+        if batch:
+            conn.executemany(f"INSERT INTO {BENCH_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?)", batch)
+        conn.commit()
+    finally:
+        conn.close()
+    return path
+
+
+def data_overrides(dataset_path: str, with_openai: bool = True, with_email: bool = True) -> Dict[str, Any]:
+    """Settings overrides that point run_once at the generated dataset and stubbed services."""
+    o: Dict[str, Any] = {
+        "DATA_DB_TYPE": "sqlite",
+        "DATA_NAME": dataset_path,
+        "DATA_TABLE": BENCH_TABLE,
+        "OPENAI_API_KEY": "offline-stub" if with_openai else "",
+    }
+    if with_email:
+        o.update({"SENDGRID_API_KEY": "offline-stub", "EMAIL_FROM": "bench@example.com", "EMAIL_TO": "bench@example.com"})
+    else:
+        o.update({"SENDGRID_API_KEY": "", "EMAIL_TO": ""})
+    return o
+
+
+class SqliteAppStore:
+    """SQLite-backed stand-in for app.database.Database (same public methods)."""
+
+    # Set by install(workdir=...); otherwise a per-process temp dir, never the repo
+    _path = ""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self.init_db()
+
+    @classmethod
+    def db_path(cls) -> str:
+        if not cls._path:
+            cls._path = os.path.join(tempfile.mkdtemp(prefix="offline-app-"), "offline_app.db")
+        return cls._path
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path(), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init_db(self) -> None:
+        os.makedirs(os.path.dirname(self.db_path()), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS logs (id INTEGER PRIMARY KEY AUTOINCREMENT, run_id TEXT, timestamp TEXT, level TEXT, node TEXT, event TEXT, data TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY AUTOINCREMENT, run_id TEXT UNIQUE, user_input TEXT, status TEXT, started_at TEXT, finished_at TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS memory_messages (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, run_id TEXT, timestamp TEXT, role TEXT, content TEXT)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_run_id_id ON logs(run_id, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_mem_user_id ON memory_messages(user_id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS scheduled_jobs (job_id TEXT PRIMARY KEY, question TEXT, frequency TEXT, time TEXT, user_id TEXT, overrides TEXT, created_at TEXT, group_id TEXT, incremental_column TEXT, pinned_query TEXT, schema_hash TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS scheduled_job_state (group_id TEXT PRIMARY KEY, incremental TEXT, updated_at TEXT, result_hash TEXT, artifacts TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS artifacts (id INTEGER PRIMARY KEY AUTOINCREMENT, run_id TEXT, kind TEXT, path TEXT UNIQUE, size_bytes INTEGER, sha256 TEXT, created_at TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS question_cache (id INTEGER PRIMARY KEY AUTOINCREMENT, scope TEXT, question_key TEXT, question TEXT, query TEXT, key_terms TEXT, hits INTEGER DEFAULT 0, created_at TEXT, last_used_at TEXT, UNIQUE (scope, question_key))")
+            conn.execute("CREATE TABLE IF NOT EXISTS email_outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, run_id TEXT, payload TEXT, status TEXT, attempts INTEGER DEFAULT 0, max_attempts INTEGER, next_attempt_at TEXT, locked_until TEXT, last_error TEXT, created_at TEXT, updated_at TEXT, sent_at TEXT)")
+        finally:
+            conn.close()
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        with self._lock:
+            conn = self._connect()
+            try:
+                cur = conn.execute(sql, params)
+                return [dict(r) for r in cur.fetchall()]
+            finally:
+                conn.close()
+
+    def insert_log(self, run_id: str, level: str, node: str, event: str, data: Optional[Dict[str, Any]] = None) -> None:
+        self._execute(
+            "INSERT INTO logs (run_id, timestamp, level, node, event, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (run_id, datetime.utcnow().isoformat(), level, node, event, json.dumps(data or {}, ensure_ascii=False, default=str)),
+        )
+
+    def start_run(self, run_id: str, user_input: str) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO runs (run_id, user_input, status, started_at, finished_at) VALUES (?, ?, ?, ?, ?)",
+            (run_id, user_input, "running", datetime.utcnow().isoformat(), None),
+        )
+
+    def finish_run(self, run_id: str, status: str) -> None:
+        self._execute("UPDATE runs SET status = ?, finished_at = ? WHERE run_id = ?", (status, datetime.utcnow().isoformat(), run_id))
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._execute("SELECT * FROM runs WHERE run_id = ?", (run_id,))
+        return rows[0] if rows else None
+
+    def enqueue_email(self, run_id: str, payload: Dict[str, Any], max_attempts: int) -> int:
+        ts = datetime.utcnow().isoformat()
+        rows = self._execute(
+            "INSERT INTO email_outbox (run_id, payload, status, attempts, max_attempts, next_attempt_at, created_at, updated_at) "
+            "VALUES (?, ?, 'pending', 0, ?, ?, ?, ?) RETURNING id",
+            (run_id, json.dumps(payload), max_attempts, ts, ts, ts),
+        )
+        return int(rows[0]["id"])
+
+    def claim_emails(self, limit: int, lease_seconds: int) -> List[Dict[str, Any]]:
+        # Single process: the store lock serialises claims, no SKIP LOCKED needed
+        now = datetime.utcnow()
+        ts, lease = now.isoformat(), (now + timedelta(seconds=lease_seconds)).isoformat()
+        rows = self._execute(
+            "UPDATE email_outbox SET status = 'sending', attempts = attempts + 1, locked_until = ?, updated_at = ? "
+            "WHERE id IN (SELECT id FROM email_outbox WHERE (status = 'pending' AND next_attempt_at <= ?) "
+            "OR (status = 'sending' AND locked_until < ?) ORDER BY next_attempt_at LIMIT ?) RETURNING *",
+            (lease, ts, ts, ts, limit),
+        )
+        for r in rows:
+            r["payload"] = json.loads(r.get("payload") or "{}")
+        return rows
+
+    def finish_email(self, outbox_id: int, status: str, error: Optional[str] = None,
+                     next_attempt_at: Optional[str] = None) -> None:
+        ts = datetime.utcnow().isoformat()
+        self._execute(
+            "UPDATE email_outbox SET status = ?, last_error = ?, next_attempt_at = COALESCE(?, next_attempt_at), locked_until = NULL, "
+            "updated_at = ?, sent_at = CASE WHEN ? = 'sent' THEN ? ELSE sent_at END WHERE id = ?",
+            (status, error, next_attempt_at, ts, status, ts, outbox_id),
+        )
+
+    def list_emails(self, run_id: str) -> List[Dict[str, Any]]:
+        rows = self._execute(
+            "SELECT id, run_id, status, attempts, max_attempts, next_attempt_at, last_error, created_at, sent_at, payload "
+            "FROM email_outbox WHERE run_id = ? ORDER BY id",
+            (run_id,),
+        )
+        for r in rows:
+            r["to_emails"] = json.loads(r.pop("payload") or "{}").get("to_emails")
+        return rows
+
+    def insert_artifact(self, run_id: str, kind: str, path: str, size_bytes: int, sha256: str) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO artifacts (run_id, kind, path, size_bytes, sha256, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (run_id, kind, path, size_bytes, sha256, datetime.utcnow().isoformat()),
+        )
+
+    def list_artifacts(self, limit: int = 100, before_id: Optional[int] = None, run_id: Optional[str] = None,
+                       kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        conds, params = [], []
+        for sql, value in (("id < ?", before_id), ("run_id = ?", run_id), ("kind = ?", kind)):
+            if value is not None and value != "":
+                conds.append(sql)
+                params.append(value)
+        where = f"WHERE {' AND '.join(conds)}" if conds else ""
+        return self._execute(f"SELECT * FROM artifacts {where} ORDER BY id DESC LIMIT ?", tuple(params + [limit]))
+
+    def oldest_artifacts(self, limit: int, created_before: Optional[str] = None) -> List[Dict[str, Any]]:
+        if created_before:
+            return self._execute("SELECT * FROM artifacts WHERE created_at < ? ORDER BY created_at, id LIMIT ?", (created_before, limit))
+        return self._execute("SELECT * FROM artifacts ORDER BY created_at, id LIMIT ?", (limit,))
+
+    def artifacts_total_bytes(self) -> int:
+        return int(self._execute("SELECT COALESCE(SUM(size_bytes), 0) AS total FROM artifacts")[0]["total"])
+
+    def delete_artifacts(self, ids: List[int]) -> None:
+        if ids:
+            self._execute(f"DELETE FROM artifacts WHERE id IN ({', '.join('?' for _ in ids)})", tuple(ids))
+
+    def list_cached_questions(self, scope: str, limit: int) -> List[Dict[str, Any]]:
+        return self._execute(
+            "SELECT question_key, question, query, key_terms, hits, last_used_at FROM question_cache "
+            "WHERE scope = ? ORDER BY last_used_at DESC, id DESC LIMIT ?",
+            (scope, limit),
+        )
+
+    def upsert_cached_question(self, scope: str, question_key: str, question: str, query: str,
+                               key_terms: str, max_entries: int) -> None:
+        ts = datetime.utcnow().isoformat()
+        self._execute(
+            "INSERT INTO question_cache (scope, question_key, question, query, key_terms, hits, created_at, last_used_at) "
+            "VALUES (?, ?, ?, ?, ?, 0, ?, ?) ON CONFLICT (scope, question_key) DO UPDATE SET "
+            "question = excluded.question, query = excluded.query, key_terms = excluded.key_terms, last_used_at = excluded.last_used_at",
+            (scope, question_key, question, query, key_terms, ts, ts),
+        )
+        self._execute(
+            "DELETE FROM question_cache WHERE scope = ? AND id NOT IN "
+            "(SELECT id FROM question_cache WHERE scope = ? ORDER BY last_used_at DESC, id DESC LIMIT ?)",
+            (scope, scope, max_entries),
+        )
+
+    def question_cache_version(self, scope: str) -> Tuple[int, int]:
+        row = self._execute("SELECT COUNT(*) AS n, COALESCE(MAX(id), 0) AS max_id FROM question_cache WHERE scope = ?", (scope,))[0]
+        return int(row["n"]), int(row["max_id"])
+
+    def touch_cached_question(self, scope: str, question_key: str) -> None:
+        self._execute(
+            "UPDATE question_cache SET hits = hits + 1, last_used_at = ? WHERE scope = ? AND question_key = ?",
+            (datetime.utcnow().isoformat(), scope, question_key),
+        )
+
+    def add_memory_message(self, user_id: str, run_id: str, role: str, content: str) -> None:
+        self._execute(
+            "INSERT INTO memory_messages (user_id, run_id, timestamp, role, content) VALUES (?, ?, ?, ?, ?)",
+            (user_id, run_id, datetime.utcnow().isoformat(), role, content),
+        )
+
+    def get_recent_memory(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        rows = self._execute(
+            "SELECT user_id, run_id, timestamp, role, content FROM memory_messages WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, limit),
+        )
+        return list(reversed(rows))
+
+    def get_logs(self, limit: int = 200, run_id: Optional[str] = None, levels: Optional[List[str]] = None,
+                 node: Optional[str] = None, event: Optional[str] = None, since: Optional[str] = None,
+                 until: Optional[str] = None, data_contains: Optional[Dict[str, Any]] = None,
+                 before_id: Optional[int] = None, after_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        for col, val in (("run_id", run_id), ("node", node), ("event", event)):
+            if val:
+                clauses.append(f"{col} = ?")
+                params.append(val)
+        if levels:
+            clauses.append(f"level IN ({', '.join('?' for _ in levels)})")
+            params.extend(levels)
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        for k, v in (data_contains or {}).items():
+            clauses.append("json_extract(data, ?) = ?")
+            params.extend([f"$.{k}", v])
+        order = "DESC"
+        if after_id is not None:
+            clauses.append("id > ?")
+            params.append(after_id)
+            order = "ASC"
+        elif before_id is not None:
+            clauses.append("id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(limit)
+        rows = self._execute(f"SELECT id, run_id, timestamp, level, node, event, data FROM logs {where} ORDER BY id {order} LIMIT ?", tuple(params))
+        for r in rows:
+            try:
+                r["data"] = json.loads(r["data"] or "{}")
+            except ValueError:
+                pass
+        return rows
+
+    def upsert_scheduled_job(self, job: Dict[str, Any]) -> None:
+        self._execute(
+            "INSERT OR REPLACE INTO scheduled_jobs (job_id, question, frequency, time, user_id, overrides, created_at, group_id, incremental_column, pinned_query, schema_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job["id"], job.get("question"), job.get("frequency"), job.get("time"), job.get("user_id"),
+             json.dumps(job.get("overrides") or {}), job.get("created_at") or datetime.utcnow().isoformat(), job.get("group_id"),
+             job.get("incremental_column"), job.get("pinned_query"), job.get("schema_hash")),
+        )
+
+    def delete_scheduled_job(self, job_id: str) -> bool:
+        existed = bool(self._execute("SELECT 1 FROM scheduled_jobs WHERE job_id = ?", (job_id,)))
+        self._execute("DELETE FROM scheduled_jobs WHERE job_id = ?", (job_id,))
+        return existed
+
+    def list_scheduled_jobs(self, job_id: Optional[str] = None, group_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        if job_id:
+            rows = self._execute("SELECT * FROM scheduled_jobs WHERE job_id = ?", (job_id,))
+        elif group_id:
+            rows = self._execute("SELECT * FROM scheduled_jobs WHERE group_id = ? ORDER BY created_at", (group_id,))
+        else:
+            rows = self._execute("SELECT * FROM scheduled_jobs ORDER BY created_at")
+        for r in rows:
+            r["id"] = r.pop("job_id")
+            r["overrides"] = json.loads(r.get("overrides") or "{}")
+        return rows
+
+    def set_pinned_query(self, group_id: str, query: Optional[str], schema_hash: Optional[str]) -> None:
+        self._execute("UPDATE scheduled_jobs SET pinned_query = ?, schema_hash = ? WHERE group_id = ?", (query, schema_hash, group_id))
+
+    def get_job_state(self, group_id: str) -> Dict[str, Any]:
+        rows = self._execute("SELECT * FROM scheduled_job_state WHERE group_id = ?", (group_id,))
+        if not rows:
+            return {}
+        rows[0]["incremental"] = json.loads(rows[0].get("incremental") or "null")
+        rows[0]["artifacts"] = json.loads(rows[0].get("artifacts") or "null")
+        return rows[0]
+
+    def save_job_state(self, group_id: str, incremental: Optional[Dict[str, Any]]) -> None:
+        self._execute(
+            "INSERT INTO scheduled_job_state (group_id, incremental, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(group_id) DO UPDATE SET incremental = excluded.incremental, updated_at = excluded.updated_at",
+            (group_id, json.dumps(incremental, default=str) if incremental is not None else None, datetime.utcnow().isoformat()),
+        )
+
+    def save_result_state(self, group_id: str, result_hash: str, artifacts: Dict[str, Any]) -> None:
+        self._execute(
+            "INSERT INTO scheduled_job_state (group_id, result_hash, artifacts, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(group_id) DO UPDATE SET result_hash = excluded.result_hash, artifacts = excluded.artifacts, updated_at = excluded.updated_at",
+            (group_id, result_hash, json.dumps(artifacts or {}), datetime.utcnow().isoformat()),
+        )
+
+
+def check_store_api(real: type, stand_in: type = SqliteAppStore) -> List[str]:
+    """Differences between the public methods of `real` and `stand_in`.
+
+    A method missing from the stand-in, or one whose parameters (names, kinds and
+    defaults) differ, is reported; extra stand-in helpers are allowed.
+    """
+    problems = []
+    for name, fn in inspect.getmembers(real, callable):
+        if name.startswith("_"):
+            continue
+        other = getattr(stand_in, name, None)
+        if other is None:
+            problems.append(f"{name}: missing")
+            continue
+        want = [(p.name, p.kind, p.default) for p in inspect.signature(fn).parameters.values()]
+        got = [(p.name, p.kind, p.default) for p in inspect.signature(other).parameters.values()]
+        if want != got:
+            problems.append(f"{name}: expected {inspect.signature(fn)}, found {inspect.signature(other)}")
+    return problems
+
+
+def _sleep_ms(mean_ms: float, jitter_ms: float) -> None:
+    delay = max(0.0, random.gauss(mean_ms, jitter_ms)) if jitter_ms else max(0.0, mean_ms)
+    if delay:
+        time.sleep(delay / 1000.0)
+
+
+class _StubCompletions:
+    def __init__(self, latency_ms: float, jitter_ms: float):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+
+    def create(self, model: str = "", messages: Optional[List[Dict[str, Any]]] = None, **kwargs):
+        _sleep_ms(self.latency_ms, self.jitter_ms)
+        prompt = " ".join(str(m.get("content", "")) for m in (messages or []))
+        sql = QUESTION_MIX[0][1]
+        for question, candidate in QUESTION_MIX:
+            if question.lower() in prompt.lower():
+                sql = candidate
+                break
+        content = sql.format(table=BENCH_TABLE)
+        usage = types.SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(content) // 4, total_tokens=(len(prompt) + len(content)) // 4)
+        if kwargs.get("stream"):
+            return self._stream(content + ";", usage)
+        message = types.SimpleNamespace(content=content, role="assistant")
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message, finish_reason="stop")], usage=usage, model=model)
+
+    @staticmethod
+    def _stream(content: str, usage: Any):
+        for token in content.split(" "):
+            delta = types.SimpleNamespace(content=token + " ")
+            yield types.SimpleNamespace(choices=[types.SimpleNamespace(delta=delta, finish_reason=None)], usage=None)
+        yield types.SimpleNamespace(choices=[], usage=usage)
+
+
+def _make_stub_openai(latency_ms: float, jitter_ms: float):
+    class StubOpenAI:
+        def __init__(self, *args, **kwargs):
+            self.chat = types.SimpleNamespace(completions=_StubCompletions(latency_ms, jitter_ms))
+
+    return StubOpenAI
+
+
+def _run_db_tool(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """Same contract as mcp_servers/db_server.py's db.query_supabase, executed in-process."""
+    from app.config import settings
+    query = arguments.get("query", "")
+    reason = sql_tokens.validate(query)
+    if reason:
+        return {"status": "error", "error": f"Only SELECT queries are allowed ({reason}).", "code": "not_read_only",
+                "detail": {"reason": reason}}
+    conn = types.SimpleNamespace(
+        DATA_DB_TYPE=arguments.get("db_type", ""),
+        DATA_DSN=arguments.get("dsn", ""),
+        DATA_HOST=arguments.get("host", ""),
+        DATA_PORT=str(arguments.get("port") or ""),
+        DATA_NAME=arguments.get("name", ""),
+        DATA_USER=arguments.get("user", ""),
+        DATA_PASSWORD=arguments.get("password", ""),
+        DATA_SSLMODE=arguments.get("sslmode", ""),
+    )
+    stats = {} if arguments.get("explain") else None
+
+    def run(endpoint_settings):
+        return db_utils.execute_select(endpoint_settings, query, limit=arguments.get("limit", 500),
+                                       timeout_seconds=settings.QUERY_TIMEOUT_SECONDS, max_cost=settings.QUERY_MAX_COST,
+                                       stats=stats)
+
+    try:
+        start = time.perf_counter()
+        router = replica_utils.router_for(conn, replica_utils.configured_replicas(settings, conn),
+                                          settings.DATA_REPLICA_MAX_LAG_SECONDS, settings.DATA_REPLICA_PROBE_SECONDS)
+        if router is not None:
+            rows, endpoint = router.execute(run)
+            endpoint_name, role = endpoint.name, endpoint.role
+        else:
+            rows = run(conn)
+            endpoint_name, role = replica_utils.endpoint_name(conn), "primary"
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        result = {"status": "success", "rows": rows, "count": len(rows), "query": query,
+                  "elapsed_ms": round(elapsed_ms, 3), "endpoint": endpoint_name, "role": role}
+        if stats:
+            result["cost"] = stats.get("cost")
+        # Round-trip through JSON like the stdio transport does
+        return json.loads(json.dumps(result, default=str))
+    except db_utils.QueryRejected as e:
+        return {"status": "error", "error": str(e), "code": e.code, "detail": e.detail, "query": query}
+    except Exception as e:
+        return {"status": "error", "error": str(e), "query": query}
+
+
+def install(openai_latency_ms: float = 400.0, openai_jitter_ms: float = 100.0,
+            sendgrid_latency_ms: float = 250.0, sendgrid_jitter_ms: float = 50.0, workdir: str = "") -> None:
+    """Patch app store, OpenAI and MCP tool calls for offline runs. Call before run_once.
+
+    The SQLite app store goes in `workdir` (default: a temp dir).
+    """
+    if workdir:
+        SqliteAppStore._path = os.path.join(os.path.abspath(workdir), "offline_app.db")
+    import main
+    import mcp_client
+    from app.config import settings
+    from agents import db_agent, email_agent, scheduler_agent
+    from app.database import Database
+
+    # Fail before the run rather than with an AttributeError halfway through a benchmark
+    problems = check_store_api(Database)
+    if problems:
+        raise RuntimeError("SqliteAppStore is out of sync with app.database.Database:\n  " + "\n  ".join(problems))
+
+    main.Database = SqliteAppStore
+    scheduler_agent.Database = SqliteAppStore
+    settings.SCHEDULER_JOBSTORE = "memory"
+
+    try:
+        import openai as openai_mod  # type: ignore
+    except ImportError:
+        openai_mod = types.ModuleType("openai")
+        sys.modules["openai"] = openai_mod
+    openai_mod.OpenAI = _make_stub_openai(openai_latency_ms, openai_jitter_ms)
+    from utils import openai_utils
+    openai_utils.openai = openai_mod
+    openai_utils._clients.clear()
+
+    def call_tool(server: str, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        if server == "db" and tool_name == "db.endpoints":
+            return {"status": "success", "sources": replica_utils.all_stats()}
+        if server == "db":
+            return _run_db_tool(arguments)
+        if server == "email":
+            _sleep_ms(sendgrid_latency_ms, sendgrid_jitter_ms)
+            missing = [a.get("file_path") for a in arguments.get("attachments", []) if not os.path.exists(a.get("file_path", ""))]
+            if missing:
+                return {"status": "error", "error": f"Attachment file not found: {missing[0]}"}
+            return {"status": "success", "data": {"status_code": 202}}
+        return {"status": "error", "error": f"MCP server '{server}' not found or not initialized"}
+
+    def call_tools(calls):
+        with ThreadPoolExecutor(max_workers=max(1, len(calls))) as pool:
+            return list(pool.map(lambda c: call_tool(*c), calls))
+
+    mcp_client.call_mcp_tool_sync = call_tool
+    mcp_client.call_mcp_tools_sync = call_tools
+    for mod in (db_agent, email_agent):
+        if hasattr(mod, "call_mcp_tool_sync"):
+            mod.call_mcp_tool_sync = call_tool
+        if hasattr(mod, "call_mcp_tools_sync"):
+            mod.call_mcp_tools_sync = call_tools
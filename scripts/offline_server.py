@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Start server.py with offline stand-ins for load and soak testing.
+
+The app store is SQLite, the data source is a generated SQLite table, and OpenAI /
+SendGrid are stubbed with injected latency (see offline_env.py). MCP servers are not
+started; tool calls are served in-process.
+
+Usage:
+  python scripts/offline_server.py --port 8010 --rows 50000 [--workdir /tmp/offline]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import offline_env  # noqa: E402
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8010)
+    ap.add_argument("--rows", type=int, default=50000, help="rows in the generated data table")
+    ap.add_argument("--workdir", default="", help="directory for the dataset, artifacts and logs (default: temp dir)")
+    ap.add_argument("--openai-latency-ms", type=float, default=400.0)
+    ap.add_argument("--openai-jitter-ms", type=float, default=100.0)
+    ap.add_argument("--sendgrid-latency-ms", type=float, default=250.0)
+    ap.add_argument("--sendgrid-jitter-ms", type=float, default=50.0)
+    ap.add_argument("--no-openai", action="store_true", help="leave OPENAI_API_KEY empty (heuristic SQL)")
+    args = ap.parse_args()
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="offline-server-"))
+    os.makedirs(os.path.join(workdir, "artifacts"), exist_ok=True)
+    dataset = offline_env.generate_dataset(os.path.join(workdir, f"data-{args.rows}.db"), args.rows)
+    # server.py mounts ./artifacts and the app writes ./logs, so run from the workdir
+    os.chdir(workdir)
+
+    from app.config import settings
+    for key, value in offline_env.data_overrides(dataset, with_openai=not args.no_openai).items():
+        setattr(settings, key, value)
+
+    offline_env.install(args.openai_latency_ms, args.openai_jitter_ms, args.sendgrid_latency_ms, args.sendgrid_jitter_ms,
+                        workdir=workdir)
+
+    import server
+    import uvicorn
+    server.Database = offline_env.SqliteAppStore
+    server.initialize_mcp_sync = lambda: None
+    server.cleanup_mcp_sync = lambda: None
+
+    print(f"[offline] workdir={workdir} dataset={dataset} table={offline_env.BENCH_TABLE} pid={os.getpid()}", flush=True)
+    uvicorn.run(server.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
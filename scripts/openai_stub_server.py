@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stub for POST /v1/chat/completions.
+
+Answers with SQL for the offline benchmark question mix (see offline_env.QUESTION_MIX),
+either as a single JSON response or as an SSE stream when "stream": true, with
+configurable latency, per-token delay and injected failures (429/500/timeouts) to
+exercise the client's timeout and retry handling.
+
+Usage:
+  python scripts/openai_stub_server.py --port 8030 --latency-ms 300 --fail-rate 0.2
+  OPENAI_BASE_URL=http://127.0.0.1:8030/v1 OPENAI_API_KEY=stub python main.py
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from offline_env import BENCH_TABLE, QUESTION_MIX  # noqa: E402
+
+
+def answer_for(prompt: str) -> str:
+    table = BENCH_TABLE
+    m = re.search(r"table name `([^`]+)`", prompt)
+    if m:
+        table = m.group(1)
+    sql = QUESTION_MIX[0][1]
+    for question, candidate in QUESTION_MIX:
+        if question.lower() in prompt.lower():
+            sql = candidate
+            break
+    return sql.format(table=table)
+
+
+def make_handler(args):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _json(self, status: int, body) -> None:
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            req = json.loads(self.rfile.read(length) or b"{}")
+            if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+                return self._json(404, {"error": {"message": "not found"}})
+            if random.random() < args.fail_rate:
+                if args.fail_mode == "timeout":
+                    time.sleep(args.hang_seconds)
+                    return
+                status = 429 if args.fail_mode == "429" else 500
+                return self._json(status, {"error": {"message": "injected failure", "type": "server_error"}})
+            if args.latency_ms:
+                time.sleep(max(0.0, random.gauss(args.latency_ms, args.latency_ms / 4.0)) / 1000.0)
+
+            prompt = " ".join(str(m.get("content", "")) for m in req.get("messages") or [])
+            content = answer_for(prompt)
+            model = req.get("model") or "gpt-4o-mini"
+            cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+            usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                     "total_tokens": (len(prompt) + len(content)) // 4}
+            if not req.get("stream"):
+                return self._json(200, {
+                    "id": cid, "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            def send(obj) -> None:
+                self.wfile.write(f"data: {json.dumps(obj)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            base = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+            try:
+                # Terminate the statement so clients can stop reading early
+                for token in (content + ";").split(" "):
+                    send({**base, "choices": [{"index": 0, "delta": {"content": token + " "}, "finish_reason": None}]})
+                    if args.token_ms:
+                        time.sleep(args.token_ms / 1000.0)
+                send({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+                if (req.get("stream_options") or {}).get("include_usage"):
+                    send({**base, "choices": [], "usage": usage})
+                self.wfile.write(b"data: [DONE]\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client stopped reading after it had the SQL
+
+        def log_message(self, fmt, *a):
+            if args.verbose:
+                super().log_message(fmt, *a)
+
+    return Handler
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8030)
+    ap.add_argument("--latency-ms", type=float, default=300.0, help="time to first token")
+    ap.add_argument("--token-ms", type=float, default=20.0, help="delay between streamed tokens")
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--fail-mode", choices=["500", "429", "timeout"], default="500")
+    ap.add_argument("--hang-seconds", type=float, default=120.0, help="how long 'timeout' failures hang")
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args))
+    print(f"OpenAI stub on http://{args.host}:{args.port}/v1 (fail_rate={args.fail_rate}, mode={args.fail_mode})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Local HTTP stand-in for the SendGrid v3 mail API.
+
+Accepts POST /v3/mail/send and answers 202 like SendGrid, with optional latency and
+injected failures so the email outbox retry/backoff path can be exercised. Received
+messages are kept in memory and listed at GET /messages (attachment bodies omitted).
+
+Usage:
+  python scripts/sendgrid_standin.py --port 8025 --fail-rate 0.3 --fail-status 503 --latency-ms 200
+  # then run the server with
+  SENDGRID_API_HOST=http://127.0.0.1:8025 SENDGRID_API_KEY=test EMAIL_OUTBOX_ENABLED=true uvicorn server:app
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+_messages: List[Dict[str, Any]] = []
+_lock = threading.Lock()
+
+
+def make_handler(args):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, body: Any = None) -> None:
+            payload = json.dumps(body).encode("utf-8") if body is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            if payload:
+                self.wfile.write(payload)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            if self.path.rstrip("/") != "/v3/mail/send":
+                return self._reply(404, {"errors": [{"message": "not found"}]})
+            if not (self.headers.get("Authorization") or "").startswith("Bearer "):
+                return self._reply(401, {"errors": [{"message": "missing api key"}]})
+            if args.latency_ms:
+                time.sleep(max(0.0, random.gauss(args.latency_ms, args.latency_ms / 4.0)) / 1000.0)
+            if random.random() < args.fail_rate:
+                return self._reply(args.fail_status, {"errors": [{"message": "injected failure"}]})
+            try:
+                msg = json.loads(raw or b"{}")
+            except ValueError:
+                return self._reply(400, {"errors": [{"message": "invalid json"}]})
+            with _lock:
+                _messages.append({
+                    "received_at": time.time(),
+                    "subject": msg.get("subject"),
+                    "from": (msg.get("from") or {}).get("email"),
+                    "to": [t.get("email") for p in msg.get("personalizations") or [] for t in p.get("to") or []],
+                    "attachments": [
+                        {"filename": a.get("filename"), "type": a.get("type"), "bytes": len(a.get("content") or "")}
+                        for a in msg.get("attachments") or []
+                    ],
+                })
+            self._reply(202)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/messages":
+                with _lock:
+                    return self._reply(200, {"count": len(_messages), "messages": list(_messages)})
+            self._reply(404, {"errors": [{"message": "not found"}]})
+
+        def log_message(self, fmt, *a):
+            if args.verbose:
+                super().log_message(fmt, *a)
+
+    return Handler
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8025)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="fraction of sends answered with --fail-status")
+    ap.add_argument("--fail-status", type=int, default=503)
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args))
+    print(f"SendGrid stand-in on http://{args.host}:{args.port} (fail_rate={args.fail_rate}, status={args.fail_status})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
-from fastapi import FastAPI
+import json
+import mimetypes
+import os
+import anyio.to_thread
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import Any, Dict, List, Optional
 from uuid import uuid4
@@ -9,9 +13,12 @@ from contextlib import asynccontextmanager
 from main import run_once
 from app.database import Database
 from app.config import settings
+from app import metrics
+from app import artifacts
 from utils import db_utils
 from agents.scheduler_agent import SchedulerService
-from mcp_client import initialize_mcp_sync, cleanup_mcp_sync
+from agents.email_outbox import EmailOutbox
+from mcp_client import initialize_mcp_sync, cleanup_mcp_sync, call_mcp_tool_sync
 
 
 @asynccontextmanager
@@ -24,9 +31,17 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"[Server] Warning: Failed to initialize MCP servers: {e}")
         print("[Server] The app will continue but MCP features may not work")
+    if settings.EMAIL_OUTBOX_ENABLED:
+        EmailOutbox.start()
+        print("[Server] Email outbox worker started")
+    artifacts.ArtifactGC.start(Database(settings.DB_PATH))
     
     yield
     
+    artifacts.ArtifactGC.stop()
+    if settings.EMAIL_OUTBOX_ENABLED:
+        EmailOutbox.stop()
+    
     # Cleanup on shutdown
     print("[Server] Shutting down MCP servers...")
     try:
@@ -47,11 +62,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Serve artifacts (CSV/PDF) statically for downloads from the frontend
-try:
-    app.mount("/artifacts", StaticFiles(directory="artifacts"), name="artifacts")
-except Exception:
-    pass
+# Artifacts (CSV/PDF) are served by download_artifact below
+os.makedirs(artifacts.ROOT, exist_ok=True)
 
 
 class RunRequest(BaseModel):
@@ -120,6 +132,16 @@ def health() -> Dict[str, Any]:
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+async def get_metrics() -> Response:
+    # Sync endpoints (/run, /logs, ...) share anyio's threadpool; its stats are the run queue
+    if metrics.ENABLED:
+        stats = anyio.to_thread.current_default_thread_limiter().statistics()
+        metrics.set_http_pool(stats.borrowed_tokens, stats.total_tokens, stats.tasks_waiting)
+    payload, content_type = metrics.render()
+    return Response(content=payload, media_type=content_type, status_code=200 if metrics.ENABLED else 404)
+
+
 @app.post("/run")
 def run_flow(req: RunRequest) -> Dict[str, Any]:
     overrides = _mk_overrides(req)
@@ -136,6 +158,81 @@ def run_flow(req: RunRequest) -> Dict[str, Any]:
     }
 
 
+@app.get("/artifacts")
+def list_artifacts(
+    limit: int = 100,
+    before_id: Optional[int] = None,
+    run_id: Optional[str] = None,
+    kind: Optional[str] = None,
+) -> Dict[str, Any]:
+    # Paginated from the artifacts index (newest first); pass next_before_id to get the next page
+    limit = max(1, min(limit, 1000))
+    items = Database(settings.DB_PATH).list_artifacts(limit=limit, before_id=before_id, run_id=run_id, kind=kind)
+    # Without a public URL, links are relative to this server
+    base = settings.ARTIFACTS_BASE_URL.rstrip("/") or "/artifacts"
+    for it in items:
+        rel = os.path.relpath(it["path"], artifacts.ROOT).replace(os.sep, "/")
+        it["url"] = f"{base}/{rel}"
+    return {
+        "status": "success",
+        "artifacts": items,
+        "next_before_id": items[-1]["id"] if len(items) == limit else None,
+    }
+
+
+@app.api_route("/artifacts/{path:path}", methods=["GET", "HEAD"])
+def download_artifact(path: str, request: Request) -> Response:
+    # Precompressed variant negotiation, strong ETags per representation and single byte ranges
+    source = artifacts.resolve(path)
+    if source is None:
+        return Response(status_code=404)
+    range_header = request.headers.get("range", "")
+    # Ranges address the identity representation, so they bypass the compressed variants
+    body_path, encoding = (source, None) if range_header else artifacts.select_encoding(source, request.headers.get("accept-encoding", ""))
+    etag = f'"{artifacts.content_hash(body_path)}"'
+    size = os.path.getsize(body_path)
+    media_type = mimetypes.guess_type(source)[0] or "application/octet-stream"
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "public, max-age=31536000, immutable" if artifacts.is_immutable(source) else "no-cache",
+        "Content-Disposition": f'inline; filename="{os.path.basename(source)}"',
+    }
+    if encoding:
+        headers["Content-Encoding"] = encoding
+
+    inm = request.headers.get("if-none-match", "")
+    if inm and (inm.strip() == "*" or etag in [t.strip() for t in inm.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if range_header and request.headers.get("if-range", etag) == etag:
+        try:
+            byte_range = artifacts.parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        status, body = 206, (artifacts.iter_file(body_path, start, end) if request.method == "GET" else iter(()))
+    else:
+        headers["Content-Length"] = str(size)
+        status, body = 200, (artifacts.iter_file(body_path) if request.method == "GET" else iter(()))
+    return StreamingResponse(body, status_code=status, media_type=media_type, headers=headers)
+
+
+@app.get("/runs/{run_id}")
+def get_run(run_id: str) -> Dict[str, Any]:
+    # Run status plus delivery state of any emails queued in the outbox for it
+    db = Database(settings.DB_PATH)
+    run = db.get_run(run_id)
+    if not run:
+        return {"status": "error", "error": "run not found"}
+    return {"status": "success", "run": run, "emails": db.list_emails(run_id)}
+
+
 class DbTestRequest(BaseModel):
     db_type: str
     host: Optional[str] = None
@@ -180,7 +277,7 @@ def db_test(req: DbTestRequest) -> Dict[str, Any]:
             table = getattr(x, "DATA_TABLE", "")
             if not table:
                 return {"status": "error", "error": "DATA_TABLE required"}
-            rows = db_utils.execute_select(x, f"SELECT * FROM {table}", limit=5)
+            rows = db_utils.execute_select(x, f"SELECT * FROM {table}", limit=5, timeout_seconds=settings.QUERY_TIMEOUT_SECONDS)
             return {"status": "success", "rows": rows}
         elif req.db_type == "mongodb":
             from utils import mongo_utils
@@ -192,11 +289,57 @@ def db_test(req: DbTestRequest) -> Dict[str, Any]:
         return {"status": "error", "error": str(e)}
 
 
+@app.get("/db/endpoints")
+def db_endpoints() -> Dict[str, Any]:
+    # Routing state lives in the db MCP server process, which executes the queries
+    return call_mcp_tool_sync("db", "db.endpoints", {})
+
+
 @app.get("/logs")
-def get_logs(limit: int = 200) -> Dict[str, Any]:
+def get_logs(
+    limit: int = 200,
+    run_id: Optional[str] = None,
+    level: Optional[str] = None,
+    node: Optional[str] = None,
+    event: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    data: Optional[str] = None,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+) -> Dict[str, Any]:
+    # level accepts a comma-separated list (e.g. ERROR,EXCEPTION); data is a JSON object matched with @>
+    levels = [lv.strip().upper() for lv in level.split(",") if lv.strip()] if level else None
+    data_contains = None
+    if data:
+        try:
+            data_contains = json.loads(data)
+        except ValueError:
+            return {"status": "error", "error": "data must be a JSON object"}
+        if not isinstance(data_contains, dict):
+            return {"status": "error", "error": "data must be a JSON object"}
+    limit = max(1, min(int(limit), 1000))
     db = Database(settings.DB_PATH)
-    logs = db.get_logs(limit=limit)
-    return {"status": "success", "logs": logs}
+    logs = db.get_logs(
+        limit=limit,
+        run_id=run_id,
+        levels=levels,
+        node=node,
+        event=event,
+        since=since,
+        until=until,
+        data_contains=data_contains,
+        before_id=before_id,
+        after_id=after_id,
+    )
+    ids = [r["id"] for r in logs]
+    return {
+        "status": "success",
+        "logs": logs,
+        # Cursors: pass next_before_id to page back in time, next_after_id to tail new rows
+        "next_before_id": min(ids) if ids else before_id,
+        "next_after_id": max(ids) if ids else after_id,
+    }
 
 
 # Scheduler endpoints for React frontend
@@ -214,6 +357,9 @@ class ScheduleJobRequest(BaseModel):
     password: Optional[str] = None
     table: Optional[str] = None
     sslmode: Optional[str] = None
+    email_to: Optional[str] = None  # comma-separated; defaults to EMAIL_TO from the environment
+    # Monotonic column (e.g. id, created_at) for incremental refresh of append-only tables
+    incremental_column: Optional[str] = None
 
 
 def _mk_overrides_from_schedule(req: ScheduleJobRequest) -> Dict[str, Any]:
@@ -245,6 +391,8 @@ def _mk_overrides_from_schedule(req: ScheduleJobRequest) -> Dict[str, Any]:
         o["DATA_TABLE"] = req.table
     if req.sslmode is not None:
         o["DATA_SSLMODE"] = req.sslmode
+    if req.email_to:
+        o["EMAIL_TO"] = req.email_to
     return o
 
 
@@ -252,8 +400,10 @@ def _mk_overrides_from_schedule(req: ScheduleJobRequest) -> Dict[str, Any]:
 def scheduler_add(req: ScheduleJobRequest) -> Dict[str, Any]:
     job_id = f"scheduled_{uuid4().hex[:8]}"
     overrides = _mk_overrides_from_schedule(req)
-    SchedulerService.add_job(job_id, req.question, req.frequency, req.time, overrides, run_once)
-    return {"status": "success", "job_id": job_id}
+    SchedulerService.add_job(job_id, req.question, req.frequency, req.time, overrides, run_once,
+                             incremental_column=req.incremental_column)
+    job = SchedulerService.get_job(job_id) or {}
+    return {"status": "success", "job_id": job_id, "query": job.get("pinned_query")}
 
 
 @app.get("/scheduler/list")
@@ -262,6 +412,17 @@ def scheduler_list() -> Dict[str, Any]:
     return {"status": "success", "jobs": jobs}
 
 
+@app.get("/scheduler/stats")
+def scheduler_stats() -> Dict[str, Any]:
+    # Pipeline executions vs. subscribed jobs per scheduled minute (recorded by the leader)
+    return {
+        "status": "success",
+        "leader": SchedulerService.is_leader(),
+        "ticks": SchedulerService.tick_stats(),
+        "sources": SchedulerService.source_stats(),
+    }
+
+
 @app.delete("/scheduler/{job_id}")
 def scheduler_delete(job_id: str) -> Dict[str, Any]:
     ok = SchedulerService.remove_job(job_id)
@@ -6,7 +6,7 @@ matplotlib.use("Agg")  # non-interactive backend
 import matplotlib.pyplot as plt
 
 
-def _pick_categorical_column(rows: List[Dict[str, Any]]) -> Optional[str]:
+def pick_categorical_column(rows: List[Dict[str, Any]]) -> Optional[str]:
     if not rows:
         return None
     # prefer string-like columns or those with few unique values
@@ -31,18 +31,23 @@ essential_colors = [
 ]
 
 
-def make_bar_chart_from_rows(rows: List[Dict[str, Any]], column: Optional[str] = None, top_k: int = 10, title: Optional[str] = None) -> Optional[str]:
-    if not rows:
+def make_bar_chart_from_rows(rows: List[Dict[str, Any]], column: Optional[str] = None, top_k: int = 10, title: Optional[str] = None, file_path: Optional[str] = None,
+                             counts: Optional[List[Tuple[Any, int]]] = None) -> Optional[str]:
+    """Bar chart of value counts for `column`; precomputed `counts` (e.g. from the database) replace counting rows."""
+    if not rows and not counts:
         return None
     os.makedirs("artifacts", exist_ok=True)
-    col = column or _pick_categorical_column(rows)
+    col = column or pick_categorical_column(rows)
     if not col:
         return None
-    counts = {}
-    for r in rows:
-        key = str(r.get(col, ""))
-        counts[key] = counts.get(key, 0) + 1
-    items = sorted(counts.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+    if counts is not None:
+        items = [(str(k), int(v)) for k, v in counts][:top_k]
+    else:
+        tally = {}
+        for r in rows:
+            key = str(r.get(col, ""))
+            tally[key] = tally.get(key, 0) + 1
+        items = sorted(tally.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
     labels = [k for k, _ in items]
     values = [v for _, v in items]
     if not items:
@@ -58,7 +63,7 @@ def make_bar_chart_from_rows(rows: List[Dict[str, Any]], column: Optional[str] =
         plt.text(b.get_x() + b.get_width() / 2, h, f"{int(h)}", ha="center", va="bottom", fontsize=8)
     plt.tight_layout()
     ts = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
-    out_path = os.path.join("artifacts", f"chart-{ts}.png")
+    out_path = file_path or os.path.join("artifacts", f"chart-{ts}.png")
     plt.savefig(out_path)
     plt.close()
     return out_path
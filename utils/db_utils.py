@@ -1,6 +1,9 @@
+import json
 import os
 import re
 import sqlite3
+import threading
+import time
 from typing import Any, Dict, List, Optional, Tuple
 
 try:
@@ -18,9 +21,7 @@ except Exception:  # pragma: no cover
     pg_extras = None  # type: ignore
 
 
-FORBIDDEN = re.compile(r"\b(insert|update|delete|drop|alter|create|truncate|grant|revoke)\b", re.IGNORECASE)
-SELECT_START = re.compile(r"^\s*select\b", re.IGNORECASE)
-HAS_LIMIT = re.compile(r"\blimit\b", re.IGNORECASE)
+from utils import sql_tokens
 
 
 def _sqlite_connect(path: str):
@@ -70,53 +71,276 @@ def connect(settings):
 
 
 def is_safe_select(query: str) -> bool:
-    if not SELECT_START.search(query or ""):
-        return False
-    if FORBIDDEN.search(query or ""):
-        return False
-    return True
+    return sql_tokens.is_safe_select(query)
 
 
 def ensure_limit(query: str, default_limit: int = 500) -> str:
-    if not HAS_LIMIT.search(query or ""):
-        return f"{query.rstrip().rstrip(';')} LIMIT {default_limit}"
-    return query
+    """Cap the outer query at default_limit rows (a larger LIMIT is lowered)."""
+    return sql_tokens.ensure_limit(query, default_limit)
 
 
-def execute_select(settings, query: str, limit: int = 500) -> List[Dict[str, Any]]:
-    if not is_safe_select(query):
-        raise ValueError("Only SELECT queries are allowed")
+def quote_ident(name: str, db_type: str = "") -> str:
+    if str(db_type).strip().lower() == "mysql":
+        return "`" + str(name).replace("`", "``") + "`"
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def uncapped_query(query: str, fetched: int, limit: int) -> Optional[str]:
+    """The query without the row cap that truncated its result, or None when the result is complete.
+
+    A result is complete when fewer than `limit` rows came back, or when the query's own
+    LIMIT bounded it below the fetch cap. A LIMIT equal to the cap is treated as the cap
+    (generated SQL is asked to include LIMIT 500).
+    """
+    if fetched < limit:
+        return None
+    q, own_limit = sql_tokens.without_limit(query)
+    if own_limit is not None and own_limit < limit:
+        return None
+    return q
+
+
+def sample_queries(table: str, db_type: str = "", rows: int = 100, percent: float = 1.0) -> List[str]:
+    """Cheap bounded reads of `table` for when a question's own SQL failed, cheapest first.
+
+    Postgres reads a block sample (TABLESAMPLE SYSTEM touches only `percent` of the pages),
+    then a plain LIMIT in case the sample came back empty. SQLite walks the rowid b-tree
+    backwards for the newest rows. MySQL's clustered index already returns a primary-key
+    prefix for a plain LIMIT, as do other engines' sequential scans.
+    """
+    rows = max(1, int(rows))
+    plain = f"SELECT * FROM {table} LIMIT {rows}"
+    if db_type in ("postgres", "postgresql") and percent > 0:
+        return [f"SELECT * FROM {table} TABLESAMPLE SYSTEM ({min(float(percent), 100.0):g}) LIMIT {rows}", plain]
+    if db_type == "sqlite":
+        return [f"SELECT * FROM {table} ORDER BY rowid DESC LIMIT {rows}", plain]
+    return [plain]
+
+
+def aggregate_queries(base: str, category: Optional[str], numeric: List[str], db_type: str = "",
+                      top_k: int = 10) -> Dict[str, str]:
+    """Companion queries over the full result of `base`: row count plus SUM/AVG/MIN/MAX of
+    numeric columns ("stats"), and the top_k value counts of the category column ("category")."""
+    sub = f"({base}) AS _agg"
+    parts = ["COUNT(*) AS row_count"]
+    for i, col in enumerate(numeric):
+        c = quote_ident(col, db_type)
+        parts += [f"SUM({c}) AS sum_{i}", f"AVG({c}) AS avg_{i}", f"MIN({c}) AS min_{i}", f"MAX({c}) AS max_{i}"]
+    queries = {"stats": f"SELECT {', '.join(parts)} FROM {sub}"}
+    if category:
+        c = quote_ident(category, db_type)
+        queries["category"] = (
+            f"SELECT {c} AS value, COUNT(*) AS count FROM {sub} GROUP BY {c} ORDER BY count DESC LIMIT {int(top_k)}"
+        )
+    return queries
+
+
+class QueryRejected(ValueError):
+    """A query refused by the guard or cancelled by the server.
+
+    `code` is one of not_read_only, cost_exceeded, timeout, cancelled; `detail` carries the
+    figures (estimated cost, limit, timeout) so callers can pick a cheaper query.
+    """
+
+    def __init__(self, code: str, message: str, **detail: Any):
+        super().__init__(message)
+        self.code = code
+        self.detail = detail
+
+
+class QueryHandle:
+    """Lets another thread cancel the statement execute_select is running.
+
+    Postgres gets a protocol-level cancel, MySQL a KILL QUERY from a second connection and
+    SQLite an interrupt. Cancelling before the statement starts stops it from starting.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn = None
+        self._settings = None
+        self._db_type = ""
+        self.cancelled = False
+
+    def attach(self, conn, settings, db_type: str) -> None:
+        with self._lock:
+            self._conn, self._settings, self._db_type = conn, settings, db_type
+            cancelled = self.cancelled
+        if cancelled:
+            raise QueryRejected("cancelled", "Query cancelled before it started")
+
+    def detach(self) -> None:
+        with self._lock:
+            self._conn = None
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            conn, settings, db_type = self._conn, self._settings, self._db_type
+        if conn is None:
+            return
+        try:
+            if db_type in ("postgres", "postgresql"):
+                conn.cancel()
+            elif db_type == "mysql":
+                killer = connect(settings)
+                try:
+                    killer.cursor().execute(f"KILL QUERY {int(conn.thread_id())}")
+                finally:
+                    killer.close()
+            elif db_type == "sqlite":
+                conn.interrupt()
+        except Exception:
+            pass  # the statement may have finished in the meantime
+
+
+# SQLite plans have no cost figure: a single streaming scan is bounded by the LIMIT unless it aggregates
+_SQLITE_AGGREGATE = re.compile(r"\b(?:COUNT|SUM|AVG|MIN|MAX|TOTAL|GROUP_CONCAT)\s*\(|\bGROUP BY\b|\bDISTINCT\b")
+_SQLITE_SCAN = re.compile(r"^SCAN (?:TABLE )?(\S+)")
+
+
+def _set_read_only(conn, cur, db_type: str) -> None:
+    """Make the session refuse writes, whatever the query guard missed (side-effecting functions and the like)."""
+    if db_type in ("postgres", "postgresql"):
+        # Before any statement: set_session cannot change a transaction in progress
+        conn.set_session(readonly=True)
+    elif db_type == "mysql":
+        cur.execute("START TRANSACTION READ ONLY")
+    elif db_type == "sqlite":
+        cur.execute("PRAGMA query_only = ON")
+
+
+def _set_statement_timeout(conn, cur, db_type: str, seconds: float) -> None:
+    ms = int(seconds * 1000)
+    if db_type in ("postgres", "postgresql"):
+        # Scoped to this transaction; the connection is closed (rolled back) afterwards
+        cur.execute(f"SET LOCAL statement_timeout = {ms}")
+    elif db_type == "mysql":
+        try:
+            cur.execute(f"SET SESSION MAX_EXECUTION_TIME = {ms}")
+        except Exception:
+            cur.execute(f"SET SESSION max_statement_time = {seconds:g}")  # MariaDB
+    elif db_type == "sqlite":
+        deadline = time.monotonic() + seconds
+        conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, 10000)
+
+
+def _is_timeout(db_type: str, e: Exception) -> bool:
+    if db_type in ("postgres", "postgresql"):
+        return getattr(e, "pgcode", None) == "57014"  # query_canceled
+    if db_type == "mysql":
+        return bool(e.args) and e.args[0] in (3024, 1969)  # MySQL / MariaDB execution time exceeded
+    return isinstance(e, sqlite3.OperationalError) and "interrupted" in str(e)
+
+
+def _first_value(row: Any) -> Any:
+    return next(iter(row.values())) if hasattr(row, "values") else row[0]
+
+
+def plan_cost(cur, db_type: str, query: str) -> Optional[float]:
+    """Planner estimate for `query` on an open cursor, or None when the plan carries none.
+
+    Postgres: total cost of the top plan node. MySQL: query_block.cost_info.query_cost.
+    SQLite: rough rows visited, the product of the sizes of fully scanned tables.
+    """
+    if db_type in ("postgres", "postgresql"):
+        cur.execute(f"EXPLAIN (FORMAT JSON) {query}")
+        plan = _first_value(cur.fetchone())
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return float(plan[0]["Plan"]["Total Cost"])
+    if db_type == "mysql":
+        cur.execute(f"EXPLAIN FORMAT=JSON {query}")
+        doc = json.loads(_first_value(cur.fetchone()))
+        cost = ((doc.get("query_block") or {}).get("cost_info") or {}).get("query_cost")
+        return float(cost) if cost is not None else None
+    if db_type == "sqlite":
+        cur.execute(f"EXPLAIN QUERY PLAN {query}")
+        details = [str(r["detail"]) for r in cur.fetchall()]
+        normalized = sql_tokens.normalize(query)
+        sizes = []
+        for detail in details:
+            m = _SQLITE_SCAN.match(detail)
+            if not m or m.group(1) == "CONSTANT":
+                continue
+            name = m.group(1)
+            # Plans name tables by their alias ("FROM big b" scans "b")
+            alias = re.search(rf"(?:FROM|JOIN|,)\s+([\w\"]+)\s+(?:AS\s+)?{re.escape(name)}\b", normalized, re.IGNORECASE)
+            if alias:
+                name = alias.group(1).strip('"')
+            try:
+                cur.execute(f"SELECT MAX(rowid) FROM {quote_ident(name)}")
+                sizes.append(float(_first_value(cur.fetchone()) or 0))
+            except sqlite3.Error:
+                continue  # subquery or view alias; its own tables are listed separately
+        if not sizes:
+            return 0.0
+        cost = 1.0
+        for n in sizes:
+            cost *= max(n, 1.0)
+        _, limit = sql_tokens.without_limit(query)
+        streaming = len(sizes) == 1 and not any("TEMP B-TREE" in d for d in details)
+        if streaming and limit is not None and not _SQLITE_AGGREGATE.search(normalized):
+            cost = min(cost, float(limit))
+        return cost
+    return None
+
+
+def execute_select(settings, query: str, limit: int = 500, timeout_seconds: float = 0.0,
+                   max_cost: float = 0.0, stats: Optional[Dict[str, Any]] = None,
+                   handle: Optional[QueryHandle] = None) -> List[Dict[str, Any]]:
+    """Run a read-only query capped at `limit` rows, in a read-only session.
+
+    With timeout_seconds > 0 the server cancels the statement after that long; with
+    max_cost > 0 the query is EXPLAINed first and refused when the planner estimate is
+    higher. Both surface as QueryRejected. A `stats` dict also gets the planner estimate
+    ("cost", EXPLAINing the query if the cost guard is off). A `handle` can cancel the
+    query from another thread (QueryRejected "cancelled").
+    """
+    reason = sql_tokens.validate(query)
+    if reason:
+        raise QueryRejected("not_read_only", f"Only SELECT queries are allowed: {reason}", reason=reason)
     query = ensure_limit(query, limit)
     db_type = str(getattr(settings, "DATA_DB_TYPE", "")).strip().lower()
-    if db_type == "mysql":
-        conn = connect(settings)
-        try:
-            with conn.cursor() as cur:
-                cur.execute(query)
-                rows = cur.fetchall()
-                return list(rows)
-        finally:
-            conn.close()
-    elif db_type in ("postgres", "postgresql"):
-        conn = connect(settings)
+    if db_type not in ("mysql", "postgres", "postgresql", "sqlite"):
+        raise ValueError("Unsupported DATA_DB_TYPE")
+    conn = connect(settings)
+    try:
+        if handle is not None:
+            handle.attach(conn, settings, db_type)
+        cur = conn.cursor()
         try:
-            with conn.cursor() as cur:
+            _set_read_only(conn, cur, db_type)
+            if timeout_seconds and timeout_seconds > 0:
+                _set_statement_timeout(conn, cur, db_type, timeout_seconds)
+            if (max_cost and max_cost > 0) or stats is not None:
+                cost = plan_cost(cur, db_type, query)
+                if stats is not None and cost is not None:
+                    stats["cost"] = round(cost, 2)
+                if max_cost and max_cost > 0 and cost is not None and cost > max_cost:
+                    raise QueryRejected(
+                        "cost_exceeded", f"Estimated query cost {cost:.0f} exceeds the limit of {max_cost:.0f}",
+                        cost=round(cost, 2), max_cost=max_cost,
+                    )
+            try:
                 cur.execute(query)
                 rows = cur.fetchall()
-                return [dict(r) for r in rows]
-        finally:
-            conn.close()
-    elif db_type == "sqlite":
-        conn = connect(settings)
-        try:
-            cur = conn.cursor()
-            cur.execute(query)
-            rows = cur.fetchall()
-            return [dict(r) for r in rows]
+            except Exception as e:
+                if handle is not None and handle.cancelled:
+                    raise QueryRejected("cancelled", "Query cancelled by the client") from e
+                if timeout_seconds and _is_timeout(db_type, e):
+                    raise QueryRejected(
+                        "timeout", f"Query cancelled after the {timeout_seconds:g}s statement timeout",
+                        timeout_seconds=timeout_seconds,
+                    ) from e
+                raise
         finally:
-            conn.close()
-    else:
-        raise ValueError("Unsupported DATA_DB_TYPE")
+            cur.close()
+        return [dict(r) for r in rows]
+    finally:
+        if handle is not None:
+            handle.detach()
+        conn.close()
 
 
 def _split_schema_table(table: str) -> (str, str):
@@ -171,4 +395,29 @@ def get_table_columns(settings, table_name: str) -> List[Dict[str, str]]:
             return out
         finally:
             conn.close()
+    elif db_type == "mongodb":
+        from utils import mongo_utils
+        return mongo_utils.infer_columns(settings, table_name)
     return []
+
+
+def schema_hash(settings, table_name: str, columns: Optional[List[Dict[str, str]]] = None) -> str:
+    """Fingerprint of the table a query was compiled against (source type, table, column names/types)."""
+    import hashlib
+    import json
+    if columns is None:
+        columns = get_table_columns(settings, table_name)
+    payload = {
+        "db_type": str(getattr(settings, "DATA_DB_TYPE", "")).strip().lower(),
+        "table": table_name or "",
+        "columns": [[str(c.get("name")), str(c.get("type"))] for c in columns],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def result_hash(rows: List[Dict[str, Any]]) -> str:
+    """Order-sensitive fingerprint of a result set; values are compared by their string form."""
+    import hashlib
+    import json
+    payload = json.dumps(rows or [], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
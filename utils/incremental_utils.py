@@ -0,0 +1,229 @@
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils import sql_tokens
+
+# Incremental refresh for scheduled queries over append-only tables.
+#
+# A query is rewritten to read only rows whose monotonic column lies in
+# (previous high-water, current high-water] and the new rows are merged into the
+# previous result:
+#   - "rows" mode (no aggregation): ORDER BY/LIMIT are kept, since the top N of
+#     (previous top N + new top N) equals the top N over all rows
+#   - "aggregate" mode (GROUP BY with COUNT/SUM/MIN/MAX): groups are fetched
+#     without ORDER BY/LIMIT and combined per key, then sorted/limited locally
+# Anything else (joins, subqueries, DISTINCT, HAVING, AVG, ...) returns no plan and
+# the caller runs the query in full. So do rolling windows ("created_at >= NOW() -
+# INTERVAL '7 days'"): rows leave the window, but the merged state would keep them.
+
+_IDENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_UNSUPPORTED = frozenset({"JOIN", "UNION", "INTERSECT", "EXCEPT", "DISTINCT", "HAVING", "OVER", "WITH", "OFFSET"})
+# Functions and literals whose value moves with the clock
+_TIME_RELATIVE_WORDS = frozenset({
+    "NOW", "CURRENT_DATE", "CURRENT_TIME", "CURRENT_TIMESTAMP", "LOCALTIME", "LOCALTIMESTAMP", "SYSDATE",
+    "SYSDATETIME", "GETDATE", "GETUTCDATE", "CURDATE", "CURTIME", "UTC_DATE", "UTC_TIME", "UTC_TIMESTAMP",
+    "UNIX_TIMESTAMP", "CLOCK_TIMESTAMP", "STATEMENT_TIMESTAMP", "TRANSACTION_TIMESTAMP", "TIMEOFDAY",
+})
+_TIME_RELATIVE_LITERALS = frozenset({"now", "today", "yesterday", "tomorrow"})
+_CLAUSES = re.compile(
+    r"^\s*select\s+(?P<select>.+?)\s+from\s+(?P<from>[A-Za-z_][A-Za-z0-9_.\"]*(?:\s+(?:as\s+)?[A-Za-z_][A-Za-z0-9_]*)?)"
+    r"(?:\s+where\s+(?P<where>.+?))?"
+    r"(?:\s+group\s+by\s+(?P<group>.+?))?"
+    r"(?:\s+order\s+by\s+(?P<order>.+?))?"
+    r"(?:\s+limit\s+(?P<limit>\d+))?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+_AGG_ITEM = re.compile(r"^(?P<fn>count|sum|min|max)\s*\(.*\)\s+(?:as\s+)?(?P<alias>[A-Za-z_][A-Za-z0-9_]*)$", re.IGNORECASE | re.DOTALL)
+_ORDER_ITEM = re.compile(r"^(?P<col>[A-Za-z_][A-Za-z0-9_]*)(?:\s+(?P<dir>asc|desc))?$", re.IGNORECASE)
+# Name of a select item's output column: a (qualified) column or an explicit alias
+_OUTPUT_NAME = re.compile(
+    r"^(?:[A-Za-z_][A-Za-z0-9_]*\.)?(?P<col>[A-Za-z_][A-Za-z0-9_]*)$|(?:\bas|\))\s+(?P<alias>[A-Za-z_][A-Za-z0-9_]*)$",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+@dataclass
+class IncrementalPlan:
+    mode: str  # rows | aggregate
+    column: str
+    select: str
+    source: str
+    where: str
+    group: str
+    order: List[Tuple[str, bool]]  # (output column, descending)
+    limit: int
+    keys: List[str] = field(default_factory=list)
+    aggregates: Dict[str, str] = field(default_factory=dict)  # output column -> count|sum|min|max
+
+    def high_water_query(self) -> str:
+        where = f" WHERE {self.where}" if self.where else ""
+        return f"SELECT MAX({self.column}) AS high_water FROM {self.source}{where}"
+
+    def fetch_query(self, low: Any, high: Any) -> str:
+        conds = [f"({self.where})"] if self.where else []
+        if low is not None:
+            conds.append(f"{self.column} > {sql_literal(low)}")
+        conds.append(f"{self.column} <= {sql_literal(high)}")
+        sql = f"SELECT {self.select} FROM {self.source} WHERE {' AND '.join(conds)}"
+        if self.mode == "aggregate":
+            return f"{sql} GROUP BY {self.group}"
+        if self.order:
+            sql += " ORDER BY " + ", ".join(f"{c} {'DESC' if d else 'ASC'}" for c, d in self.order)
+        return f"{sql} LIMIT {self.limit}"
+
+
+def sql_literal(value: Any) -> str:
+    if isinstance(value, bool):
+        raise ValueError("boolean high-water values are not supported")
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _split_top_level(text: str, sep: str = ",") -> List[str]:
+    parts: List[str] = []
+    depth = 0
+    quote = ""
+    cur: List[str] = []
+    for ch in text:
+        if quote:
+            if ch == quote:
+                quote = ""
+        elif ch in ("'", '"'):
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == sep and depth == 0:
+            parts.append("".join(cur).strip())
+            cur = []
+            continue
+        cur.append(ch)
+    parts.append("".join(cur).strip())
+    return [p for p in parts if p]
+
+
+def _is_time_relative(where: str) -> bool:
+    """Whether the filter depends on the current time (NOW(), CURRENT_DATE, date('now'), 'today'::date, ...)."""
+    for t in sql_tokens.tokenize(where):
+        if t.kind == "word" and t.upper in _TIME_RELATIVE_WORDS:
+            return True
+        if t.kind == "string" and t.text[t.text.find("'") + 1:-1].strip().lower() in _TIME_RELATIVE_LITERALS:
+            return True
+    return False
+
+
+def _output_columns(items: List[str]) -> Optional[set]:
+    """Lower-cased output column names of the select items, or None for SELECT *."""
+    if any(it == "*" or it.endswith(".*") for it in items):
+        return None
+    names = set()
+    for it in items:
+        m = _OUTPUT_NAME.search(it)
+        if m:
+            names.add((m.group("col") or m.group("alias")).lower())
+    return names
+
+
+def build_plan(query: str, column: str, default_limit: int = 500) -> Optional[IncrementalPlan]:
+    """Return a rewrite plan, or None when the query cannot be refreshed incrementally."""
+    if not column or not _IDENT.match(column):
+        return None
+    q = (query or "").strip().rstrip(";").strip()
+    words = [t.upper for t in sql_tokens.tokenize(q) if t.kind == "word"]
+    if any(w in _UNSUPPORTED for w in words) or words.count("SELECT") != 1:
+        return None
+    m = _CLAUSES.match(q)
+    if not m:
+        return None
+    select, source = m.group("select").strip(), m.group("from").strip()
+    where, group = (m.group("where") or "").strip(), (m.group("group") or "").strip()
+    if where and _is_time_relative(where):
+        return None
+    limit = int(m.group("limit") or default_limit)
+    order: List[Tuple[str, bool]] = []
+    for item in _split_top_level(m.group("order") or ""):
+        om = _ORDER_ITEM.match(item)
+        if not om:
+            return None
+        order.append((om.group("col"), (om.group("dir") or "").lower() == "desc"))
+
+    items = _split_top_level(select)
+    # Merged rows are sorted on their own values, so every ORDER BY column has to be selected
+    outputs = _output_columns(items)
+    if outputs is not None and any(col.lower() not in outputs for col, _ in order):
+        return None
+    agg_items = {it: _AGG_ITEM.match(it) for it in items}
+    if not group:
+        if any(re.match(r"^\s*(count|sum|min|max|avg)\s*\(", it, re.IGNORECASE) for it in items):
+            return None
+        return IncrementalPlan("rows", column, select, source, where, "", order, limit)
+
+    keys = [k for k in _split_top_level(group)]
+    if not all(_IDENT.match(k) for k in keys):
+        return None
+    aggregates: Dict[str, str] = {}
+    for it in items:
+        am = agg_items[it]
+        if am:
+            aggregates[am.group("alias")] = am.group("fn").lower()
+        elif it not in keys:
+            return None
+    if not aggregates:
+        return None
+    return IncrementalPlan("aggregate", column, select, source, where, group, order, limit, keys, aggregates)
+
+
+def _sort_key(value: Any) -> Tuple[int, Any]:
+    # None sorts first; mixed types fall back to string comparison
+    if value is None:
+        return (0, "")
+    if isinstance(value, (int, float)):
+        return (1, value)
+    try:
+        return (1, float(value))
+    except (TypeError, ValueError):
+        return (2, str(value))
+
+
+def _apply_order(plan: IncrementalPlan, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    out = list(rows)
+    for col, desc in reversed(plan.order):
+        out.sort(key=lambda r: _sort_key(r.get(col)), reverse=desc)
+    return out
+
+
+def merge(plan: IncrementalPlan, previous: List[Dict[str, Any]], new_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Combine the stored result with the rows fetched for the new range."""
+    if plan.mode == "rows":
+        combined = previous + new_rows
+        if plan.order:
+            combined = _apply_order(plan, combined)
+        return combined[: plan.limit]
+    merged: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+    for row in previous + new_rows:
+        key = tuple(row.get(k) for k in plan.keys)
+        cur = merged.get(key)
+        if cur is None:
+            merged[key] = dict(row)
+            continue
+        for col, fn in plan.aggregates.items():
+            a, b = cur.get(col), row.get(col)
+            if a is None or b is None:
+                cur[col] = a if b is None else b
+            elif fn in ("count", "sum"):
+                cur[col] = float(a) + float(b) if isinstance(a, str) or isinstance(b, str) else a + b
+            elif fn == "min":
+                cur[col] = min(a, b, key=_sort_key)
+            else:
+                cur[col] = max(a, b, key=_sort_key)
+    return list(merged.values())
+
+
+def present(plan: IncrementalPlan, state_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Rows the report should see: the original ORDER BY and LIMIT applied to the state."""
+    if plan.mode == "rows":
+        return list(state_rows)
+    return _apply_order(plan, state_rows)[: plan.limit]
@@ -1,39 +1,426 @@
-from typing import Any, Dict, List, Optional
-from pymongo import MongoClient
-from bson import ObjectId
+"""MongoDB data source: pooled clients, schema inference and SQL -> aggregation pipelines.
+
+Questions are compiled to SQL like for relational sources (templates, similarity cache,
+LLM); pipeline_from_sql() turns the supported subset (single collection, AND-ed
+comparisons, GROUP BY with COUNT/SUM/AVG/MIN/MAX, ORDER BY, LIMIT/OFFSET) into
+$match/$group/$project/$sort/$skip/$limit stages so filtering, grouping and counting
+run in the server instead of over a sample of documents.
+"""
+import re
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils import sql_tokens
+
+try:
+    from pymongo import MongoClient  # type: ignore
+    from bson import ObjectId  # type: ignore
+except Exception:  # pragma: no cover
+    MongoClient = None
+    ObjectId = None
+
+# MongoClient is thread-safe and pools connections itself: one per URI for the process
+_clients: Dict[Tuple[str, int], Any] = {}
+_lock = threading.Lock()
+# (uri, db, collection) -> (inferred at, columns); sampling on every question would add a round trip
+_columns: Dict[Tuple[str, str, str], Tuple[float, List[Dict[str, str]]]] = {}
+_COLUMNS_TTL_SECONDS = 300.0
+
+_AGG_FUNCS = {"COUNT", "SUM", "AVG", "MIN", "MAX"}
+_OPS = {"=": "$eq", "!=": "$ne", "<>": "$ne", "<": "$lt", "<=": "$lte", ">": "$gt", ">=": "$gte"}
+_UNITS = {"DAY": 1, "DAYS": 1, "WEEK": 7, "WEEKS": 7, "MONTH": 30, "MONTHS": 30, "YEAR": 365, "YEARS": 365}
 
 
 def _obj_to_str(doc: Dict[str, Any]) -> Dict[str, Any]:
     out: Dict[str, Any] = {}
     for k, v in doc.items():
-        if isinstance(v, ObjectId):
+        if ObjectId is not None and isinstance(v, ObjectId):
             out[k] = str(v)
         else:
             out[k] = v
     return out
 
 
-def connect(settings) -> MongoClient:
+def _uri(settings) -> str:
+    dsn = str(getattr(settings, "DATA_DSN", "") or "")
+    if dsn.startswith(("mongodb://", "mongodb+srv://")):
+        return dsn
     host = getattr(settings, "DATA_HOST", "localhost") or "localhost"
     port = int(getattr(settings, "DATA_PORT", 27017) or 27017)
     user = getattr(settings, "DATA_USER", "")
     password = getattr(settings, "DATA_PASSWORD", "")
     if user:
-        uri = f"mongodb://{user}:{password}@{host}:{port}"
-    else:
-        uri = f"mongodb://{host}:{port}"
-    return MongoClient(uri)
+        return f"mongodb://{user}:{password}@{host}:{port}"
+    return f"mongodb://{host}:{port}"
+
+
+def connect(settings):
+    """Process-wide MongoClient for the data source's URI; do not close it."""
+    if MongoClient is None:
+        raise ImportError("pymongo is not installed. Add it to requirements and install.")
+    pool_size = int(getattr(settings, "MONGO_MAX_POOL_SIZE", 20) or 20)
+    key = (_uri(settings), pool_size)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = MongoClient(key[0], maxPoolSize=pool_size, serverSelectionTimeoutMS=5000)
+        return client
+
+
+def _collection(settings, name: Optional[str] = None):
+    dbname = getattr(settings, "DATA_NAME", "")
+    collname = name or getattr(settings, "DATA_TABLE", "")
+    if not (dbname and collname):
+        raise ValueError("DATA_NAME (database) and DATA_TABLE (collection) are required for MongoDB")
+    return connect(settings)[dbname][collname]
 
 
 def sample_rows(settings, limit: int = 5) -> List[Dict[str, Any]]:
-    client = connect(settings)
+    docs = _collection(settings).find({}, limit=limit, batch_size=min(limit, 1000) or 1)
+    return [_obj_to_str(d) for d in docs]
+
+
+def _type_name(value: Any) -> str:
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "double"
+    if isinstance(value, datetime):
+        return "timestamp"
+    if isinstance(value, date):
+        return "date"
+    if ObjectId is not None and isinstance(value, ObjectId):
+        return "objectid"
+    if isinstance(value, dict):
+        return "object"
+    if isinstance(value, list):
+        return "array"
+    return "text"
+
+
+def infer_columns(settings, collection: Optional[str] = None, sample: int = 200) -> List[Dict[str, str]]:
+    """Top-level fields of the first `sample` documents with their most common type, most frequent first."""
+    collection = collection or str(getattr(settings, "DATA_TABLE", ""))
+    key = (_uri(settings), str(getattr(settings, "DATA_NAME", "")), collection)
+    cached = _columns.get(key)
+    if cached and time.monotonic() - cached[0] < _COLUMNS_TTL_SECONDS:
+        return cached[1]
+    seen: Counter = Counter()
+    types: Dict[str, Counter] = {}
+    for doc in _collection(settings, collection).find({}, limit=sample, batch_size=sample):
+        for k, v in doc.items():
+            seen[k] += 1
+            if v is not None:
+                types.setdefault(k, Counter())[_type_name(v)] += 1
+    columns = [
+        {"name": k, "type": (types[k].most_common(1)[0][0] if k in types else "text")}
+        for k, _ in sorted(seen.items(), key=lambda kv: (-kv[1], kv[0]))
+    ]
+    _columns[key] = (time.monotonic(), columns)
+    return columns
+
+
+# SQL subset -> aggregation pipeline
+
+class _Unsupported(Exception):
+    pass
+
+
+def _split(tokens: List[sql_tokens.Token], sep: str = ",") -> List[List[sql_tokens.Token]]:
+    parts: List[List[sql_tokens.Token]] = [[]]
+    base = tokens[0].depth if tokens else 0
+    for t in tokens:
+        if t.text.upper() == sep and t.depth == base:
+            parts.append([])
+        else:
+            parts[-1].append(t)
+    return [p for p in parts if p]
+
+
+def _ident(tok: sql_tokens.Token) -> str:
+    if tok.kind == "quoted":
+        return tok.text[1:-1]
+    if tok.kind != "word":
+        raise _Unsupported(f"expected a field name, got {tok.text!r}")
+    return tok.text
+
+
+def _literal(toks: List[sql_tokens.Token], temporal: bool) -> Any:
+    words = [t.upper for t in toks]
+    # NOW() - INTERVAL '7 days' / NOW() - INTERVAL 7 DAY (the template time windows)
+    if words[:4] == ["NOW", "(", ")", "-"] and len(words) > 5 and words[4] == "INTERVAL":
+        spec = " ".join(t.text.strip("'") for t in toks[5:]).split()
+        if len(spec) == 2 and spec[0].isdigit() and spec[1].upper() in _UNITS:
+            return datetime.utcnow() - timedelta(days=int(spec[0]) * _UNITS[spec[1].upper()])
+        raise _Unsupported("interval")
+    if len(toks) == 2 and toks[0].text == "-" and toks[1].kind == "number":
+        return -_literal(toks[1:], temporal)
+    if len(toks) != 1:
+        raise _Unsupported("expression")
+    t = toks[0]
+    if t.kind == "number":
+        return float(t.text) if any(c in t.text for c in ".eE") else int(t.text)
+    if t.kind == "string" and t.text.startswith("'"):
+        value = t.text[1:-1].replace("''", "'")
+        if temporal:
+            try:
+                return datetime.fromisoformat(value)
+            except ValueError:
+                pass
+        return value
+    if t.upper in ("TRUE", "FALSE"):
+        return t.upper == "TRUE"
+    if t.upper == "NULL":
+        return None
+    raise _Unsupported(f"literal {t.text!r}")
+
+
+def _condition(toks: List[sql_tokens.Token], temporal: set) -> Dict[str, Any]:
+    if len(toks) < 3:
+        raise _Unsupported("condition")
+    field = _ident(toks[0])
+    op = toks[1].upper
+    is_time = field in temporal
+    if op == "IS":
+        negate = toks[2].upper == "NOT"
+        if toks[-1].upper != "NULL" or len(toks) != (4 if negate else 3):
+            raise _Unsupported("IS")
+        return {field: {"$ne": None} if negate else None}
+    if op in ("IN", "NOT") and toks[-1].text == ")":
+        start = 3 if op == "IN" else 4
+        if op == "NOT" and toks[2].upper != "IN":
+            raise _Unsupported("NOT")
+        values = [_literal(p, is_time) for p in _split(toks[start:-1])]
+        return {field: {"$in" if op == "IN" else "$nin": values}}
+    if op == "BETWEEN":
+        parts = _split(toks[2:], "AND")
+        if len(parts) != 2:
+            raise _Unsupported("BETWEEN")
+        return {field: {"$gte": _literal(parts[0], is_time), "$lte": _literal(parts[1], is_time)}}
+    if op == "LIKE":
+        pattern = _literal(toks[2:], False)
+        if not isinstance(pattern, str):
+            raise _Unsupported("LIKE")
+        regex = "".join(".*" if c == "%" else "." if c == "_" else re.escape(c) for c in pattern)
+        return {field: {"$regex": f"^{regex}$"}}
+    if op in _OPS:
+        value = _literal(toks[2:], is_time)
+        return {field: value} if op == "=" else {field: {_OPS[op]: value}}
+    raise _Unsupported(f"operator {toks[1].text!r}")
+
+
+def pipeline_from_sql(sql: str, columns: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """Aggregation pipeline equivalent to `sql` over the configured collection.
+
+    Raises ValueError for SQL outside the supported subset (joins, subqueries, OR, HAVING, ...).
+    """
+    info = sql_tokens.analyze(sql or "")
+    if info.error:
+        raise ValueError(info.error)
+    toks = [info.tokens[i] for i in info.significant if info.tokens[i].text != ";"]
+    clauses: Dict[str, List[sql_tokens.Token]] = {}
+    current = None
+    i = 0
+    while i < len(toks):
+        t = toks[i]
+        word = t.upper if t.kind == "word" and t.depth == 0 else ""
+        nxt = toks[i + 1].upper if i + 1 < len(toks) else ""
+        if word in ("SELECT", "FROM", "WHERE", "LIMIT", "OFFSET") or (word in ("GROUP", "ORDER") and nxt == "BY"):
+            current = word
+            if current in clauses:
+                raise ValueError(f"unsupported SQL for MongoDB: repeated {word}")
+            clauses[current] = []
+            i += 2 if word in ("GROUP", "ORDER") else 1
+            continue
+        if word in ("JOIN", "UNION", "HAVING", "WITH", "DISTINCT", "FETCH", "WINDOW", "INTERSECT", "EXCEPT") or t.text == ",":
+            if word or current == "FROM":
+                raise ValueError(f"unsupported SQL for MongoDB: {t.text}")
+        if current is None:
+            raise ValueError("unsupported SQL for MongoDB")
+        clauses[current].append(t)
+        i += 1
+    if any(t.upper == "SELECT" and t.depth > 0 for t in toks):
+        raise ValueError("unsupported SQL for MongoDB: subquery")
+    # Drop "collection." / "alias." qualifiers from field names
+    names = {t.text.strip('"`').lower() for t in clauses.get("FROM", []) if t.kind in ("word", "quoted")}
+    for clause, part in clauses.items():
+        if clause != "FROM":
+            clauses[clause] = [t for j, t in enumerate(part) if not (
+                (t.kind in ("word", "quoted") and t.text.strip('"`').lower() in names and j + 1 < len(part) and part[j + 1].text == ".")
+                or (t.text == "." and j > 0 and part[j - 1].text.strip('"`').lower() in names)
+            )]
+    temporal = {str(c.get("name")) for c in columns or [] if any(k in str(c.get("type", "")).lower() for k in ("date", "time"))}
     try:
-        dbname = getattr(settings, "DATA_NAME", "")
-        collname = getattr(settings, "DATA_TABLE", "")
-        if not (dbname and collname):
-            raise ValueError("DATA_NAME (database) and DATA_TABLE (collection) are required for MongoDB")
-        coll = client[dbname][collname]
-        docs = list(coll.find({}, limit=limit))
-        return [_obj_to_str(d) for d in docs]
-    finally:
-        client.close()
+        return _build_pipeline(clauses, temporal)
+    except _Unsupported as e:
+        raise ValueError(f"unsupported SQL for MongoDB: {e}")
+
+
+def _build_pipeline(clauses: Dict[str, List[sql_tokens.Token]], temporal: set) -> List[Dict[str, Any]]:
+    if not clauses.get("SELECT") or len(clauses.get("FROM") or []) not in (1, 2):
+        raise _Unsupported("SELECT ... FROM <collection>")
+    pipeline: List[Dict[str, Any]] = []
+
+    if clauses.get("WHERE"):
+        conds = []
+        current: List[sql_tokens.Token] = []
+        for t in clauses["WHERE"]:
+            if t.depth == 0 and t.upper == "OR":
+                raise _Unsupported("OR")
+            # The AND of "x BETWEEN a AND b" belongs to the condition
+            between = len(current) > 1 and current[1].upper == "BETWEEN" and not any(c.upper == "AND" for c in current)
+            if t.depth == 0 and t.upper == "AND" and not between:
+                conds.append(current)
+                current = []
+            else:
+                current.append(t)
+        conds.append(current)
+        match: Dict[str, Any] = {}
+        clashes: List[Dict[str, Any]] = []
+        for c in conds:
+            for field, cond in _condition(c, temporal).items():
+                prev = match.get(field)
+                if field not in match:
+                    match[field] = cond
+                elif isinstance(prev, dict) and isinstance(cond, dict) and not set(prev) & set(cond):
+                    prev.update(cond)  # a >= x AND a < y
+                else:
+                    # a > 20 AND a > 10, a >= 100 AND a = 5: both must hold
+                    clashes.append({field: cond})
+        if clashes:
+            match = {"$and": [{field: cond} for field, cond in match.items()] + clashes}
+        pipeline.append({"$match": match})
+
+    # Select items: (output name, field or None for *, aggregate function or None)
+    items: List[Tuple[str, Optional[str], Optional[str]]] = []
+    star = False
+    for part in _split(clauses["SELECT"]):
+        alias = None
+        # "expr AS name" or "expr name"
+        if len(part) >= 2 and part[-1].kind in ("word", "quoted") and (
+            part[-2].upper == "AS" or part[-2].kind in ("word", "quoted") or part[-2].text == ")"
+        ):
+            alias = _ident(part[-1])
+            part = part[:-2] if part[-2].upper == "AS" else part[:-1]
+        if len(part) == 1 and part[0].text == "*":
+            star = True
+        elif len(part) == 1:
+            field = _ident(part[0])
+            items.append((alias or field, field, None))
+        elif len(part) == 4 and part[0].upper in _AGG_FUNCS and part[1].text == "(" and part[3].text == ")":
+            fn = part[0].upper
+            field = None if part[2].text == "*" else _ident(part[2])
+            if field is None and fn != "COUNT":
+                raise _Unsupported(f"{fn}(*)")
+            items.append((alias or (fn.lower() if field is None else f"{fn.lower()}_{field}"), field, fn))
+        else:
+            raise _Unsupported("select expression")
+
+    group_by = [_ident(p[0]) for p in _split(clauses.get("GROUP", [])) if len(p) == 1]
+    if len(group_by) != len(_split(clauses.get("GROUP", []))):
+        raise _Unsupported("GROUP BY expression")
+    aggregated = bool(group_by) or any(fn for _, _, fn in items)
+    source = {name: field for name, field, fn in items if not fn}
+
+    order: Dict[str, int] = {}
+    for part in _split(clauses.get("ORDER", [])):
+        direction = -1 if part[-1].upper == "DESC" else 1
+        if part[-1].upper in ("ASC", "DESC"):
+            part = part[:-1]
+        if len(part) != 1:
+            raise _Unsupported("ORDER BY expression")
+        name = _ident(part[0])
+        # Before a $group the sort runs on stored fields, so aliases map back to them
+        order[name if aggregated else source.get(name, name)] = direction
+
+    if aggregated:
+        if star:
+            raise _Unsupported("* with GROUP BY")
+        for name, field, fn in items:
+            if not fn and field not in group_by:
+                raise _Unsupported(f"{field} is neither grouped nor aggregated")
+        key: Any = {g: f"${g}" for g in group_by} if group_by else None
+        group: Dict[str, Any] = {"_id": key}
+        for name, field, fn in items:
+            if fn == "COUNT":
+                group[name] = {"$sum": 1} if field is None else {"$sum": {"$cond": [{"$ne": [f"${field}", None]}, 1, 0]}}
+            elif fn:
+                group[name] = {f"${fn.lower()}": f"${field}"}
+        pipeline.append({"$group": group})
+        project: Dict[str, Any] = {"_id": 0}
+        for name, field, fn in items:
+            project[name] = f"$_id.{field}" if not fn else 1
+        pipeline.append({"$project": project})
+        if order:
+            pipeline.append({"$sort": order})
+    else:
+        if order:
+            pipeline.append({"$sort": order})
+        if not star:
+            project = {"_id": 0}
+            for name, field, _ in items:
+                project[name] = 1 if name == field else f"${field}"
+                if field == "_id":
+                    project["_id"] = 1 if name == field else 0
+            pipeline.append({"$project": project})
+
+    for clause, stage in (("OFFSET", "$skip"), ("LIMIT", "$limit")):
+        if clauses.get(clause):
+            parts = _split(clauses[clause])
+            # MySQL LIMIT offset, count
+            if clause == "LIMIT" and len(parts) == 2:
+                pipeline.append({"$skip": int(parts[0][0].text)})
+                parts = parts[1:]
+            if len(parts) != 1 or len(parts[0]) != 1 or parts[0][0].kind != "number":
+                raise _Unsupported(f"{clause} value")
+            pipeline.append({stage: int(parts[0][0].text)})
+    return pipeline
+
+
+def run_pipeline(settings, pipeline: List[Dict[str, Any]], limit: int = 500,
+                 batch_size: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Run `pipeline` capped at `limit` documents, reading the cursor in batches of batch_size."""
+    stages = list(pipeline)
+    if stages and "$limit" in stages[-1]:
+        stages[-1] = {"$limit": min(int(stages[-1]["$limit"]), limit)}
+    else:
+        stages.append({"$limit": limit})
+    batch = int(batch_size or getattr(settings, "MONGO_BATCH_SIZE", 100) or 100)
+    kwargs: Dict[str, Any] = {"batchSize": min(batch, limit), "allowDiskUse": True}
+    timeout = float(getattr(settings, "QUERY_TIMEOUT_SECONDS", 0) or 0)
+    if timeout > 0:
+        kwargs["maxTimeMS"] = int(timeout * 1000)
+    rows: List[Dict[str, Any]] = []
+    with _collection(settings).aggregate(stages, **kwargs) as cursor:
+        for doc in cursor:
+            rows.append(_obj_to_str(doc))
+            if len(rows) >= limit:
+                break
+    return rows
+
+
+def aggregate_pipelines(pipeline: List[Dict[str, Any]], category: Optional[str], numeric: List[str],
+                        top_k: int = 10) -> Dict[str, List[Dict[str, Any]]]:
+    """Companion pipelines over the full result of `pipeline` (its trailing $limit removed), in the
+    shape of db_utils.aggregate_queries: row count and SUM/AVG/MIN/MAX ("stats"), value counts ("category")."""
+    base = list(pipeline)
+    while base and ("$limit" in base[-1] or "$sort" in base[-1]):
+        base.pop()
+    stats: Dict[str, Any] = {"_id": None, "row_count": {"$sum": 1}}
+    for i, col in enumerate(numeric):
+        stats.update({f"sum_{i}": {"$sum": f"${col}"}, f"avg_{i}": {"$avg": f"${col}"},
+                      f"min_{i}": {"$min": f"${col}"}, f"max_{i}": {"$max": f"${col}"}})
+    out = {"stats": base + [{"$group": stats}, {"$project": {"_id": 0}}]}
+    if category:
+        out["category"] = base + [
+            {"$group": {"_id": f"${category}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}},
+            {"$limit": int(top_k)},
+            {"$project": {"_id": 0, "value": "$_id", "count": 1}},
+        ]
+    return out
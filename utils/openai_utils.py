@@ -0,0 +1,140 @@
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app import metrics
+from utils import sql_tokens
+
+try:
+    import openai  # type: ignore
+except Exception:  # pragma: no cover
+    openai = None
+
+# Shared clients keep their httpx connection pool (keep-alive) across requests
+_clients: Dict[Tuple[str, str], Any] = {}
+_lock = threading.Lock()
+
+
+def _retryable_errors() -> Tuple[type, ...]:
+    names = ("APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError")
+    return tuple(getattr(openai, n) for n in names if openai is not None and hasattr(openai, n))
+
+
+def get_client(api_key: str):
+    """Process-wide OpenAI client per (api key, base url); SDK retries are disabled, see complete()."""
+    key = (api_key, settings.OPENAI_BASE_URL or "")
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            kwargs: Dict[str, Any] = {"api_key": api_key, "timeout": settings.OPENAI_TIMEOUT_SECONDS, "max_retries": 0}
+            if settings.OPENAI_BASE_URL:
+                kwargs["base_url"] = settings.OPENAI_BASE_URL
+            client = _clients[key] = openai.OpenAI(**kwargs)
+        return client
+
+
+def sql_is_complete(text: str) -> bool:
+    """Whether a streamed answer already holds the whole statement, so the rest can be skipped.
+
+    A fenced answer is complete once its fence closes. A bare answer must start with
+    SELECT/WITH and reach a ';' outside string literals and comments, after a top-level
+    FROM. Prose ahead of the SQL never stops the stream: the statement may still follow.
+    """
+    text = text or ""
+    fence = text.find("```")
+    if fence >= 0:
+        return text.find("```", fence + 3) >= 0
+    tokens = [t for t in sql_tokens.tokenize(text) if t.kind not in ("ws", "comment")]
+    if not tokens or tokens[0].upper not in ("SELECT", "WITH"):
+        return False
+    for i, t in enumerate(tokens):
+        if t.kind == "unterminated":
+            return False  # inside a literal that has not closed yet
+        if t.kind == "op" and t.text == ";":
+            return any(x.kind == "word" and x.upper == "FROM" and x.depth == 0 for x in tokens[:i])
+    return False
+
+
+def _backoff(attempt: int) -> float:
+    return min(8.0, 0.5 * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+
+def _usage(resp: Any) -> Tuple[Optional[int], Optional[int]]:
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return None, None
+    return getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
+
+
+def _consume_stream(stream: Any, stop_when: Optional[Callable[[str], bool]]) -> Tuple[str, Optional[int], Optional[int], bool]:
+    parts: List[str] = []
+    prompt_tokens = completion_tokens = None
+    early = False
+    try:
+        for chunk in stream:
+            p, c = _usage(chunk)
+            if p is not None:
+                prompt_tokens, completion_tokens = p, c
+            for choice in getattr(chunk, "choices", None) or []:
+                delta = getattr(getattr(choice, "delta", None), "content", None)
+                if delta:
+                    parts.append(delta)
+            if stop_when and stop_when("".join(parts)):
+                early = True
+                break
+    finally:
+        close = getattr(stream, "close", None)
+        if early and close:
+            close()
+    return "".join(parts), prompt_tokens, completion_tokens, early
+
+
+def complete(prompt: str, api_key: str, model: Optional[str] = None, stream: Optional[bool] = None,
+             stop_when: Optional[Callable[[str], bool]] = None, temperature: float = 0.0) -> Dict[str, Any]:
+    """Chat completion with a timeout and at most OPENAI_MAX_RETRIES retries on transient errors.
+
+    With stream=True the response is read incrementally and abandoned as soon as
+    stop_when(text_so_far) is true. Returns content plus latency/token/retry figures.
+    """
+    model = model or settings.OPENAI_MODEL
+    stream = settings.OPENAI_STREAM if stream is None else stream
+    client = get_client(api_key)
+    retryable = _retryable_errors()
+    started = time.perf_counter()
+    retries = 0
+    while True:
+        try:
+            kwargs: Dict[str, Any] = {"model": model, "messages": [{"role": "user", "content": prompt}], "temperature": temperature}
+            if stream:
+                kwargs.update(stream=True, stream_options={"include_usage": True})
+                content, prompt_tokens, completion_tokens, early = _consume_stream(client.chat.completions.create(**kwargs), stop_when)
+            else:
+                resp = client.chat.completions.create(**kwargs)
+                content = resp.choices[0].message.content if resp and resp.choices else ""
+                prompt_tokens, completion_tokens = _usage(resp)
+                early = False
+            break
+        except retryable:
+            if retries >= settings.OPENAI_MAX_RETRIES:
+                metrics.observe_openai(model, "error", time.perf_counter() - started, retries=retries)
+                raise
+            time.sleep(_backoff(retries))
+            retries += 1
+        except Exception:
+            metrics.observe_openai(model, "error", time.perf_counter() - started, retries=retries)
+            raise
+    elapsed = time.perf_counter() - started
+    metrics.observe_openai(model, "success", elapsed, prompt_tokens, completion_tokens, retries)
+    return {
+        "content": content or "",
+        "model": model,
+        "latency_ms": round(elapsed * 1000.0, 1),
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "retries": retries,
+        "streamed": bool(stream),
+        "early_stop": early,
+    }
+
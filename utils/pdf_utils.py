@@ -5,6 +5,13 @@ from typing import List, Dict, Any, Optional
 from fpdf import FPDF
 
 
+def _fmt(value: Any) -> str:
+    try:
+        return f"{float(value):.2f}"
+    except (TypeError, ValueError):
+        return "n/a"
+
+
 class ReportPDF(FPDF):
     def header(self):
         self.set_font("Helvetica", "B", 14)
@@ -22,7 +29,31 @@ class ReportPDF(FPDF):
         self.cell(0, 10, f"Page {self.page_no()}/{{nb}}", align="C")
 
 
-def create_pdf_summary(question: str, rows: List[Dict[str, Any]], file_path: Optional[str] = None, chart_path: Optional[str] = None) -> str:
+def numeric_columns(rows: List[Dict[str, Any]], sample_size: int = 50) -> List[str]:
+    """Columns whose non-empty values in the first sample_size rows all parse as numbers."""
+    if not rows:
+        return []
+    sample = rows[:sample_size]
+    out: List[str] = []
+    for c in rows[0].keys():
+        ok = True
+        for r in sample:
+            v = r.get(c, None)
+            if v is None or v == "":
+                continue
+            try:
+                float(v)
+            except Exception:
+                ok = False
+                break
+        if ok:
+            out.append(c)
+    return out
+
+
+def create_pdf_summary(question: str, rows: List[Dict[str, Any]], file_path: Optional[str] = None, chart_path: Optional[str] = None,
+                       aggregates: Optional[Dict[str, Any]] = None) -> str:
+    """Render the report; `aggregates` (see db_agent) supplies full-result totals when rows were truncated."""
     os.makedirs("artifacts", exist_ok=True)
     ts = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
     out_path = file_path or os.path.join("artifacts", f"report-{ts}.pdf")
@@ -39,7 +70,11 @@ def create_pdf_summary(question: str, rows: List[Dict[str, Any]], file_path: Opt
     pdf.multi_cell(epw, 7, f"Question: {question}")
     pdf.ln(2)
     pdf.set_font("Helvetica", size=11)
-    pdf.cell(0, 8, f"Rows: {len(rows)}", ln=1)
+    total_rows = (aggregates or {}).get("row_count")
+    if total_rows is not None and int(total_rows) > len(rows):
+        pdf.cell(0, 8, f"Rows: {int(total_rows)} (first {len(rows)} fetched)", ln=1)
+    else:
+        pdf.cell(0, 8, f"Rows: {len(rows)}", ln=1)
 
     # Optional chart image
     if chart_path and os.path.exists(chart_path):
@@ -105,24 +140,21 @@ def create_pdf_summary(question: str, rows: List[Dict[str, Any]], file_path: Opt
         pdf.set_font("Helvetica", "B", 11)
         pdf.cell(0, 8, "Summary", ln=1)
         pdf.set_font("Helvetica", size=10)
-        # Detect numeric columns
-        numeric_cols: List[str] = []
-        for c in cols:
-            ok = True
-            for r in sample:
-                v = r.get(c, None)
-                if v is None or v == "":
-                    continue
-                try:
-                    float(v)
-                except Exception:
-                    ok = False
-                    break
-            if ok:
-                numeric_cols.append(c)
+        numeric = (aggregates or {}).get("numeric") or {}
+        numeric_cols = list(numeric) or numeric_columns(rows)
         if numeric_cols:
             for c in numeric_cols:
-                vals = [float(r.get(c, 0) or 0) for r in sample]
+                if c in numeric:
+                    st = numeric[c]
+                    pdf.cell(0, 6, f"{c}: total={_fmt(st.get('sum'))}, avg={_fmt(st.get('avg'))}, "
+                                   f"min={_fmt(st.get('min'))}, max={_fmt(st.get('max'))}", ln=1)
+                    continue
+                vals = []
+                for r in rows:
+                    try:
+                        vals.append(float(r.get(c, 0) or 0))
+                    except (TypeError, ValueError):
+                        pass
                 total_val = sum(vals)
                 avg_val = (total_val / len(vals)) if vals else 0
                 pdf.cell(0, 6, f"{c}: total={total_val:.2f}, avg={avg_val:.2f}", ln=1)
@@ -0,0 +1,203 @@
+"""Similarity cache of question -> SQL pairs, so paraphrased questions reuse earlier SQL.
+
+Entries are scoped by the table's schema hash (a schema change starts a fresh scope)
+and persisted in the app store's question_cache table. Each process keeps a TF-IDF
+index per scope in NumPy, rebuilt from the table when another process has added or
+trimmed entries (checked at most every reload_seconds). Questions are hashed into a fixed number of word and
+character-trigram features and compared by cosine similarity. A match is only
+accepted when both questions mention the same columns, numbers and aggregates
+("top 5 by amount" never reuses "top 10 by amount").
+"""
+import math
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover
+    np = None
+
+_DIM = 1024
+_MAX_SCOPES = 16
+_WORD = re.compile(r"[a-z0-9]+")
+# Words that carry no meaning for the SQL; counting is the default aggregate
+_STOP = {
+    "a", "an", "the", "of", "by", "per", "for", "in", "on", "to", "from", "me", "us", "show", "list", "give", "get",
+    "display", "what", "which", "is", "are", "was", "were", "do", "does", "how", "many", "much", "number", "count",
+    "there", "each", "every", "all", "please", "breakdown", "broken", "down", "grouped", "group", "split", "table",
+}
+# Words that change the SQL and must agree between two questions
+_KEY_WORDS = {
+    "sum": "sum", "total": "sum", "average": "avg", "avg": "avg", "mean": "avg", "min": "min", "minimum": "min",
+    "lowest": "min", "max": "max", "maximum": "max", "highest": "max", "top": "top", "bottom": "bottom",
+    "least": "bottom", "distinct": "distinct", "unique": "distinct", "day": "day", "week": "week",
+    "month": "month", "quarter": "quarter", "year": "year", "not": "not", "without": "not", "except": "not",
+}
+
+
+def _singular(word: str) -> str:
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("sses", "xes", "ches", "shes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def _words(text: str) -> List[str]:
+    return [_singular(w) for w in _WORD.findall((text or "").lower().replace("_", " "))]
+
+
+def tokens(question: str) -> List[str]:
+    """Content words with aggregate synonyms folded together ("mean" -> "avg")."""
+    return [_KEY_WORDS.get(w, w) for w in _words(question) if w not in _STOP]
+
+
+def question_key(question: str) -> str:
+    return " ".join(tokens(question))
+
+
+def key_terms(question: str, columns: List[Dict[str, Any]]) -> str:
+    """Columns, numbers, aggregates and periods mentioned; two questions must agree on these."""
+    words = _words(question)
+    present = set(words)
+    terms = {w for w in words if w.isdigit()} | {_KEY_WORDS[w] for w in words if w in _KEY_WORDS}
+    cols = set()
+    for c in columns:
+        col_words = _words(str(c.get("name", "")))
+        # "jobs by type" mentions job_type: every word of the column name, in any order
+        if col_words and all(w in present for w in col_words):
+            cols.add(" ".join(col_words))
+    # A column only matched as part of a longer one ("amount" within "total amount") is dropped
+    cols = {c for c in cols if not any(c != o and set(c.split()) < set(o.split()) for o in cols)}
+    return "|".join(sorted(terms | cols))
+
+
+def _features(question: str) -> Dict[int, float]:
+    vec: Dict[int, float] = {}
+    for tok in tokens(question):
+        feats = [f"w:{tok}"] + [f"c:{g}" for g in (f"#{tok}#"[i:i + 3] for i in range(len(tok)))]
+        for f in feats:
+            h = zlib.crc32(f.encode("utf-8")) % _DIM
+            # Whole words weigh more than their trigrams
+            vec[h] = vec.get(h, 0.0) + (1.0 if f[0] == "w" else 0.3)
+    return vec
+
+
+class _Index:
+    """Fixed-capacity TF-IDF index; the least recently used entry is replaced when full."""
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.tf = np.zeros((self.capacity, _DIM), dtype=np.float32)
+        self.df = np.zeros(_DIM, dtype=np.float32)
+        self.entries: List[Optional[Dict[str, Any]]] = [None] * self.capacity
+        self.slots: Dict[str, int] = {}
+        self.clock = 0
+        self.used: List[int] = [0] * self.capacity
+        # question_cache_version() of the rows loaded, and when it was last compared with the store
+        self.version: Tuple[int, int] = (0, 0)
+        self.checked_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def add(self, key: str, question: str, query: str, terms: str) -> None:
+        self.clock += 1
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = len(self.slots) if len(self.slots) < self.capacity else min(range(self.capacity), key=self.used.__getitem__)
+            old = self.entries[slot]
+            if old is not None:
+                self.slots.pop(old["key"], None)
+        self.df -= (self.tf[slot] > 0)
+        self.tf[slot] = 0.0
+        for h, v in _features(question).items():
+            self.tf[slot, h] = v
+        self.df += (self.tf[slot] > 0)
+        self.entries[slot] = {"key": key, "question": question, "query": query, "terms": terms}
+        self.slots[key] = slot
+        self.used[slot] = self.clock
+
+    def search(self, question: str, terms: str, threshold: float) -> Tuple[Optional[Dict[str, Any]], float]:
+        if not self.slots:
+            return None, 0.0
+        q = np.zeros(_DIM, dtype=np.float32)
+        for h, v in _features(question).items():
+            q[h] = v
+        if not q.any():
+            return None, 0.0
+        n = len(self.slots)
+        idf = np.log((1.0 + n) / (1.0 + self.df)) + 1.0
+        mat = self.tf * idf
+        qv = q * idf
+        norms = np.linalg.norm(mat, axis=1) * float(np.linalg.norm(qv))
+        sims = np.divide(mat @ qv, norms, out=np.zeros(self.capacity, dtype=np.float32), where=norms > 0)
+        for slot, entry in enumerate(self.entries):
+            if entry is None or entry["terms"] != terms:
+                sims[slot] = 0.0
+        best = int(np.argmax(sims))
+        score = float(sims[best])
+        if math.isnan(score) or score <= 0.0 or score < threshold:
+            return None, score
+        self.clock += 1
+        self.used[best] = self.clock
+        return self.entries[best], score
+
+
+_indexes: "OrderedDict[str, _Index]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _index(db, scope: str, capacity: int, reload_seconds: float) -> _Index:
+    index = _indexes.get(scope)
+    now = time.monotonic()
+    if index is not None and now - index.checked_at >= reload_seconds:
+        # Other workers share the table: reload when they added or trimmed entries
+        index.checked_at = now
+        if db.question_cache_version(scope) != index.version:
+            index = None
+    if index is None or index.capacity != max(1, capacity):
+        version = db.question_cache_version(scope)
+        index = _Index(capacity)
+        index.version, index.checked_at = version, now
+        # Oldest first so the most recently used rows end up most recently used here too
+        for row in reversed(db.list_cached_questions(scope, capacity)):
+            index.add(row["question_key"], row["question"], row["query"], row.get("key_terms") or "")
+        _indexes[scope] = index
+        while len(_indexes) > _MAX_SCOPES:
+            _indexes.popitem(last=False)
+    _indexes.move_to_end(scope)
+    return index
+
+
+def lookup(db, scope: str, question: str, columns: List[Dict[str, Any]], threshold: float,
+           capacity: int, reload_seconds: float = 5.0) -> Optional[Dict[str, Any]]:
+    """Best earlier question for `scope` with similarity >= threshold: {"query", "question", "similarity"}."""
+    if np is None or not scope or not question_key(question):
+        return None
+    with _lock:
+        entry, score = _index(db, scope, capacity, reload_seconds).search(question, key_terms(question, columns), threshold)
+    if entry is None:
+        return None
+    try:
+        db.touch_cached_question(scope, entry["key"])
+    except Exception:
+        pass
+    return {"query": entry["query"], "question": entry["question"], "similarity": round(score, 4)}
+
+
+def remember(db, scope: str, question: str, query: str, terms: str, capacity: int,
+             reload_seconds: float = 5.0) -> None:
+    """Add a question whose SQL ran successfully (terms from key_terms()) to the index and the app store."""
+    key = question_key(question)
+    if np is None or not scope or not key or not query:
+        return
+    with _lock:
+        _index(db, scope, capacity, reload_seconds).add(key, question, query, terms)
+    db.upsert_cached_question(scope, key, question, query, terms, capacity)
@@ -0,0 +1,275 @@
+"""Read-replica routing for data-source queries.
+
+A data source can list replica endpoints next to its primary (DATA_REPLICAS). A
+background probe measures each endpoint's connect + round-trip latency and, for
+replicas, replication lag. Reads go to the fastest healthy replica within
+DATA_REPLICA_MAX_LAG_SECONDS, fail over to the next one on connection errors and
+reach the primary only when no replica can serve them.
+"""
+import os
+import sqlite3
+import threading
+import time
+import types
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from utils import db_utils
+
+_CONN_FIELDS = ("DATA_DB_TYPE", "DATA_DSN", "DATA_HOST", "DATA_PORT", "DATA_NAME", "DATA_USER", "DATA_PASSWORD", "DATA_SSLMODE")
+# Probe latency is smoothed so a single slow round trip does not reorder the replicas
+_EWMA = 0.3
+
+
+def _is_connection_error(e: Exception) -> bool:
+    """Errors that say the endpoint is unreachable (worth trying another one), as opposed to bad SQL."""
+    if isinstance(e, sqlite3.OperationalError):
+        # SQLite reports syntax errors as OperationalError too
+        return any(m in str(e).lower() for m in ("unable to open", "disk i/o", "database is locked"))
+    errors: List[type] = []
+    if db_utils.psycopg2 is not None:
+        errors += [db_utils.psycopg2.OperationalError, db_utils.psycopg2.InterfaceError]
+    if db_utils.pymysql is not None:
+        errors += [db_utils.pymysql.err.OperationalError, db_utils.pymysql.err.InterfaceError]
+    return bool(errors) and isinstance(e, tuple(errors))
+
+
+def endpoint_settings(base, spec: str):
+    """Connection settings for one replica: `spec` is a DSN, host[:port], or a file path for SQLite."""
+    s = types.SimpleNamespace(**{k: getattr(base, k, "") for k in _CONN_FIELDS})
+    db_type = str(s.DATA_DB_TYPE).strip().lower()
+    if db_type == "sqlite":
+        s.DATA_NAME = spec
+    elif "://" in spec or "=" in spec:
+        s.DATA_DSN = spec
+    else:
+        host, _, port = spec.partition(":")
+        s.DATA_DSN, s.DATA_HOST = "", host
+        if port:
+            s.DATA_PORT = port
+    return s
+
+
+def endpoint_name(settings) -> str:
+    """Display name without credentials: host:port, or the file name for SQLite."""
+    if str(getattr(settings, "DATA_DB_TYPE", "")).strip().lower() == "sqlite":
+        return os.path.basename(str(getattr(settings, "DATA_NAME", ""))) or "sqlite"
+    dsn = str(getattr(settings, "DATA_DSN", "") or "")
+    if "://" in dsn:
+        u = urlparse(dsn)
+        return f"{u.hostname}:{u.port}" if u.port else str(u.hostname)
+    if "=" in dsn:
+        parts = dict(p.split("=", 1) for p in dsn.split() if "=" in p)
+        return f"{parts.get('host', 'localhost')}:{parts['port']}" if parts.get("port") else parts.get("host", "localhost")
+    host, port = getattr(settings, "DATA_HOST", "") or "localhost", getattr(settings, "DATA_PORT", "")
+    return f"{host}:{port}" if port else str(host)
+
+
+def _first_value(row: Any) -> Any:
+    if row is None:
+        return None
+    return next(iter(row.values())) if hasattr(row, "values") else row[0]
+
+
+def replication_lag(cur, db_type: str) -> Optional[float]:
+    """Seconds the endpoint is behind its primary (0 for a primary), None when unknown."""
+    if db_type in ("postgres", "postgresql"):
+        # An idle primary leaves the last replay timestamp old; a caught-up replica has replayed all it received
+        cur.execute(
+            "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END AS lag"
+        )
+        value = _first_value(cur.fetchone())
+        return float(value) if value is not None else None
+    if db_type == "mysql":
+        for stmt in ("SHOW REPLICA STATUS", "SHOW SLAVE STATUS"):
+            try:
+                cur.execute(stmt)
+            except Exception:
+                continue
+            row = cur.fetchone()
+            if not row:
+                return 0.0
+            value = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+            return float(value) if value is not None else None  # NULL: replication stopped
+        return None
+    return 0.0
+
+
+class Endpoint:
+    def __init__(self, name: str, role: str, settings):
+        self.name = name
+        self.role = role
+        self.settings = settings
+        self.healthy = True
+        self.latency_ms: Optional[float] = None
+        self.lag_seconds: Optional[float] = None
+        self.last_error = ""
+        self.probed_at: Optional[float] = None
+        self.queries = 0
+        self.errors = 0
+        self.query_ms_total = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "endpoint": self.name,
+            "role": self.role,
+            "healthy": self.healthy,
+            "latency_ms": round(self.latency_ms, 2) if self.latency_ms is not None else None,
+            "lag_seconds": self.lag_seconds,
+            "queries": self.queries,
+            "errors": self.errors,
+            "avg_query_ms": round(self.query_ms_total / self.queries, 2) if self.queries else None,
+            "last_error": self.last_error,
+            "probed_at": self.probed_at,
+        }
+
+
+class ReplicaRouter:
+    """Endpoints of one data source with their probe state and per-endpoint query counts."""
+
+    def __init__(self, primary_settings, specs: List[str], max_lag_seconds: float, probe_seconds: float):
+        self.db_type = str(getattr(primary_settings, "DATA_DB_TYPE", "")).strip().lower()
+        self.primary = Endpoint(endpoint_name(primary_settings), "primary", primary_settings)
+        self.replicas = []
+        for spec in specs:
+            s = endpoint_settings(primary_settings, spec)
+            self.replicas.append(Endpoint(endpoint_name(s), "replica", s))
+        self.max_lag_seconds = max_lag_seconds
+        self.probe_seconds = probe_seconds
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """First probe inline so the first query already has latencies to go by, then probe in the background."""
+        self.probe_all()
+        if self.probe_seconds > 0 and not self._stop.is_set():
+            threading.Thread(target=self._loop, name="replica-probe", daemon=True).start()
+
+    def probe(self, ep: Endpoint) -> None:
+        start = time.perf_counter()
+        try:
+            conn = db_utils.connect(ep.settings)
+            try:
+                cur = conn.cursor()
+                cur.execute("SELECT 1")
+                cur.fetchall()
+                lag = replication_lag(cur, self.db_type) if ep.role == "replica" else 0.0
+            finally:
+                conn.close()
+            elapsed = (time.perf_counter() - start) * 1000.0
+            with self._lock:
+                ep.latency_ms = elapsed if ep.latency_ms is None else (1 - _EWMA) * ep.latency_ms + _EWMA * elapsed
+                ep.lag_seconds = lag
+                ep.healthy = True
+                ep.last_error = ""
+        except Exception as e:
+            with self._lock:
+                ep.healthy = False
+                ep.last_error = str(e)
+        ep.probed_at = time.time()
+
+    def probe_all(self) -> None:
+        for ep in self.replicas + [self.primary]:
+            self.probe(ep)
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.probe_seconds):
+            self.probe_all()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _usable(self, ep: Endpoint) -> bool:
+        if not ep.healthy:
+            return False
+        if self.max_lag_seconds <= 0:
+            return True
+        # Unknown lag on a replica (e.g. MySQL reports NULL once replication stops) may be any staleness
+        return ep.lag_seconds is not None and ep.lag_seconds <= self.max_lag_seconds
+
+    def candidates(self) -> List[Endpoint]:
+        """Healthy replicas within the lag limit, fastest first, then the primary."""
+        with self._lock:
+            usable = [r for r in self.replicas if self._usable(r)]
+            usable.sort(key=lambda r: r.latency_ms if r.latency_ms is not None else float("inf"))
+        return usable + [self.primary]
+
+    def execute(self, run: Callable[[Any], Any]) -> Tuple[Any, Endpoint]:
+        """Call run(endpoint_settings) on the best endpoint, moving on after connection errors.
+
+        Other errors (bad SQL, QueryRejected) are the query's fault and are raised at once.
+        """
+        last: Optional[Exception] = None
+        for ep in self.candidates():
+            start = time.perf_counter()
+            try:
+                result = run(ep.settings)
+            except Exception as e:
+                with self._lock:
+                    ep.errors += 1
+                    ep.last_error = str(e)
+                    if ep.role == "replica" and _is_connection_error(e):
+                        ep.healthy = False  # until the next successful probe
+                if not _is_connection_error(e):
+                    raise
+                last = e
+                continue
+            with self._lock:
+                ep.queries += 1
+                ep.query_ms_total += (time.perf_counter() - start) * 1000.0
+            return result, ep
+        raise last if last is not None else RuntimeError("no data-source endpoint available")
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [ep.snapshot() for ep in [self.primary] + self.replicas]
+
+
+_routers: Dict[Tuple[str, ...], ReplicaRouter] = {}
+_routers_lock = threading.Lock()
+# Routers kept per process; the least recently created one is stopped beyond this
+_MAX_ROUTERS = 8
+
+
+def _source_key(settings) -> Tuple[str, ...]:
+    return tuple(str(getattr(settings, k, "") or "").strip() for k in _CONN_FIELDS)
+
+
+def configured_replicas(config, settings) -> str:
+    """config.DATA_REPLICAS when `settings` points at the configured data source, else "".
+
+    Replica endpoints are only ever taken from configuration: they are connected to
+    with the primary's credentials, so a caller must not be able to name them.
+    """
+    if _source_key(settings) != _source_key(config):
+        return ""
+    return str(getattr(config, "DATA_REPLICAS", "") or "")
+
+
+def router_for(settings, replicas: str, max_lag_seconds: float = 30.0,
+               probe_seconds: float = 15.0) -> Optional[ReplicaRouter]:
+    """Process-wide router for a data source, or None when it has no replicas (comma-separated specs)."""
+    specs = [s.strip() for s in (replicas or "").split(",") if s.strip()]
+    if not specs:
+        return None
+    key = _source_key(settings) + tuple(specs)
+    evicted: List[ReplicaRouter] = []
+    with _routers_lock:
+        router = _routers.get(key)
+        if router is not None:
+            return router
+        router = _routers[key] = ReplicaRouter(settings, specs, max_lag_seconds, probe_seconds)
+        while len(_routers) > _MAX_ROUTERS:
+            evicted.append(_routers.pop(next(iter(_routers))))
+    for old in evicted:
+        old.stop()
+    # Probing connects to every endpoint; do it outside the lock so an unreachable host only delays this caller
+    router.start()
+    return router
+
+
+def all_stats() -> List[Dict[str, Any]]:
+    with _routers_lock:
+        routers = list(_routers.values())
+    return [{"primary": r.primary.name, "endpoints": r.stats()} for r in routers]
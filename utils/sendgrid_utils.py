@@ -1,35 +1,142 @@
 import base64
+import gzip
 import os
-from typing import List, Dict, Any, Optional
+import shutil
+import threading
+from typing import List, Dict, Any, Optional, Tuple
 
+from app.config import settings
 
-def send_email(subject: str, body_text: str, to_emails: List[str], from_email: str, attachments: Optional[List[Dict[str, str]]] = None, api_key: Optional[str] = None) -> Dict[str, Any]:
+# Multiple of 3 so chunk encodings concatenate into one valid base64 string
+_B64_CHUNK = 3 * 256 * 1024
+
+_clients: Dict[Tuple[str, str], Any] = {}
+_clients_lock = threading.Lock()
+
+
+def _client(api_key: str, host: Optional[str]):
+    """SendGridAPIClient per (key, host), reused across sends."""
+    from sendgrid import SendGridAPIClient
+    key = (api_key, host or "")
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = SendGridAPIClient(api_key=api_key, host=host) if host else SendGridAPIClient(api_key=api_key)
+            _clients[key] = client
+        return client
+
+
+def encode_file_base64(path: str) -> str:
+    """Base64-encode a file chunk by chunk instead of reading it whole."""
+    parts: List[str] = []
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(_B64_CHUNK)
+            if not chunk:
+                break
+            parts.append(base64.b64encode(chunk).decode("ascii"))
+    return "".join(parts)
+
+
+def encoded_size(num_bytes: int) -> int:
+    return 4 * ((num_bytes + 2) // 3)
+
+
+def gzip_file(path: str) -> str:
+    """Stream-compress path to path + '.gz' (reused if already newer than the source)."""
+    out = path + ".gz"
+    if os.path.exists(out) and os.path.getmtime(out) >= os.path.getmtime(path):
+        return out
+    tmp = out + ".tmp"
+    with open(path, "rb") as src, gzip.open(tmp, "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, length=1024 * 1024)
+    os.replace(tmp, out)
+    return out
+
+
+def artifact_url(path: str) -> Optional[str]:
+    """Download URL for a file under the artifacts directory, or None if it is outside it or no public URL is set."""
+    if not settings.ARTIFACTS_BASE_URL:
+        return None
+    from app.artifacts import ROOT
+    root = os.path.abspath(ROOT)
+    full = os.path.abspath(path)
+    if os.path.commonpath([root, full]) != root:
+        return None
+    rel = os.path.relpath(full, root).replace(os.sep, "/")
+    return f"{settings.ARTIFACTS_BASE_URL.rstrip('/')}/{rel}"
+
+
+def prepare_attachments(attachments: Optional[List[Dict[str, str]]]) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """Decide how each attachment travels: (attach, link).
+
+    Large CSVs are gzipped first; files that would push the encoded total past
+    EMAIL_ATTACHMENT_MAX_BYTES are sent as download links instead. A missing file
+    raises FileNotFoundError rather than being left out of the email.
+    """
+    attach: List[Dict[str, str]] = []
+    link: List[Dict[str, str]] = []
+    budget = settings.EMAIL_ATTACHMENT_MAX_BYTES
+    for att in attachments or []:
+        path = att.get("file_path")
+        if not path or not os.path.exists(path):
+            raise FileNotFoundError(f"Attachment file not found: {path or att.get('file_name', '')}")
+        item = dict(att)
+        item.setdefault("file_name", os.path.basename(path))
+        is_csv = (item.get("mime_type") == "text/csv") or path.lower().endswith(".csv")
+        if is_csv and os.path.getsize(path) > settings.EMAIL_GZIP_THRESHOLD_BYTES:
+            item["file_path"] = gzip_file(path)
+            item["file_name"] = item["file_name"] + ".gz"
+            item["mime_type"] = "application/gzip"
+        size = encoded_size(os.path.getsize(item["file_path"]))
+        if size <= budget:
+            budget -= size
+            attach.append(item)
+        else:
+            item["url"] = artifact_url(item["file_path"]) or ""
+            link.append(item)
+    return attach, link
+
+
+def send_email(subject: str, body_text: str, to_emails: List[str], from_email: str, attachments: Optional[List[Dict[str, str]]] = None, api_key: Optional[str] = None, host: Optional[str] = None) -> Dict[str, Any]:
     if not api_key or not to_emails or not from_email:
         return {"status": "skipped", "log": {"reason": "missing_config"}}
     try:
-        from sendgrid import SendGridAPIClient
         from sendgrid.helpers.mail import Mail, Attachment, FileContent, FileName, FileType, Disposition
+        attach, link = prepare_attachments(attachments)
+        missing = [a["file_name"] for a in link if not a.get("url")]
+        if missing:
+            return {"status": "error", "log": {"error": f"attachments too large and not linkable: {', '.join(missing)}"}}
+        if link:
+            body_text += "\n\nSome files were too large to attach and can be downloaded here:\n" + "\n".join(
+                f"- {a['file_name']}: {a['url']}" for a in link
+            )
         message = Mail(
             from_email=from_email,
             to_emails=to_emails,
             subject=subject,
             plain_text_content=body_text,
         )
-        for att in attachments or []:
-            path = att.get("file_path")
-            if not path or not os.path.exists(path):
-                continue
-            with open(path, "rb") as f:
-                encoded = base64.b64encode(f.read()).decode()
+        for att in attach:
             a = Attachment(
-                FileContent(encoded),
-                FileName(att.get("file_name") or os.path.basename(path)),
+                FileContent(encode_file_base64(att["file_path"])),
+                FileName(att["file_name"]),
                 FileType(att.get("mime_type") or "application/octet-stream"),
                 Disposition("attachment"),
             )
             message.add_attachment(a)
-        sg = SendGridAPIClient(api_key=api_key)
-        resp = sg.send(message)
-        return {"status": "success", "data": {"status_code": resp.status_code}}
+        resp = _client(api_key, host).send(message)
+        return {
+            "status": "success",
+            "data": {
+                "status_code": resp.status_code,
+                "attached": [a["file_name"] for a in attach],
+                "linked": [a["url"] for a in link],
+            },
+        }
+    except FileNotFoundError as e:
+        # Retrying cannot bring the file back (e.g. removed by the artifacts GC)
+        return {"status": "error", "log": {"error": str(e), "retryable": False}}
     except Exception as e:
-        return {"status": "error", "log": {"error": str(e)}}
+        # python_http_client.HTTPError carries the response status (used to decide retries)
+        return {"status": "error", "log": {"error": str(e), "status_code": getattr(e, "status_code", None)}}
@@ -0,0 +1,291 @@
+"""Small SQL tokenizer behind the read-only guard, LIMIT handling and query cache keys.
+
+Comments, string literals and quoted identifiers are separate tokens, so keywords
+inside them ("-- drop", 'limit 5', "update") never affect validation or LIMIT
+detection. Analysis is memoized per query text.
+"""
+import functools
+import hashlib
+import re
+from typing import List, NamedTuple, Optional, Tuple
+
+# Statements and clauses a read-only query must not contain (outside strings, comments and quoted names);
+# INTO covers SELECT ... INTO new_table / OUTFILE
+FORBIDDEN = frozenset({
+    "insert", "update", "delete", "drop", "alter", "create", "truncate", "grant", "revoke", "merge", "into",
+})
+# Functions with side effects (file access, sequences, large objects, locks, other sessions, server
+# configuration, extensions) or that stall the server. This list is a first line only: execute_select
+# also runs every query in a read-only session
+FORBIDDEN_FUNCTIONS = frozenset({
+    "pg_read_file", "pg_read_binary_file", "pg_ls_dir", "lo_import", "lo_export", "dblink", "dblink_exec",
+    "pg_terminate_backend", "pg_cancel_backend", "set_config", "pg_sleep", "load_extension", "load_file",
+    "sleep", "benchmark", "setval", "nextval", "lo_unlink", "lo_create", "lo_creat", "lo_put", "lo_from_bytea",
+    "lo_truncate", "pg_advisory_lock", "pg_advisory_lock_shared", "pg_advisory_xact_lock",
+    "pg_advisory_xact_lock_shared", "pg_try_advisory_lock", "pg_try_advisory_lock_shared",
+    "pg_try_advisory_xact_lock", "pg_try_advisory_xact_lock_shared", "pg_advisory_unlock",
+    "pg_advisory_unlock_all", "pg_advisory_unlock_shared", "pg_reload_conf", "pg_rotate_logfile",
+    "pg_switch_wal", "pg_promote", "pg_notify", "get_lock", "release_lock", "release_all_locks",
+})
+
+_TOKEN = re.compile(
+    r"""
+    (?P<ws>\s+)
+  | (?P<comment>--[^\n]*|\#[^\n]*|/\*.*?\*/)
+  | (?P<string>[EeNnBbXx]?'(?:[^']|'')*'|\$(?P<tag>[A-Za-z_]*)\$.*?\$(?P=tag)\$)
+  | (?P<quoted>"(?:[^"]|"")*"|`(?:[^`]|``)*`)
+  | (?P<unterminated>['"`]|/\*|\$[A-Za-z_]*\$)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<param>[?]|[:@][A-Za-z_][A-Za-z0-9_]*|%\([A-Za-z_][A-Za-z0-9_]*\)s|%s|\$\d+)
+  | (?P<op>::|<>|!=|<=|>=|\|\||[(),;.*+\-/%<>=!~^&|\[\]])
+  | (?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+class Token(NamedTuple):
+    kind: str    # ws, comment, string, quoted, unterminated, number, word, param, op, other
+    text: str
+    depth: int   # parenthesis depth the token sits at
+
+    @property
+    def upper(self) -> str:
+        return self.text.upper()
+
+
+class SqlInfo(NamedTuple):
+    tokens: Tuple[Token, ...]          # every token, whitespace and comments included
+    significant: Tuple[int, ...]       # indexes of tokens other than whitespace/comments
+    normalized: str                    # canonical text: no comments, single spaces, keywords upper-cased
+    error: Optional[str]               # why the text is not a single read-only SELECT, or None
+    limit: Optional[Tuple[int, int]]   # token index range (start, end) of the top-level LIMIT/FETCH clause
+    limit_value: Optional[int]         # row count of that clause, when it is a literal
+
+
+def tokenize(sql: str) -> List[Token]:
+    out: List[Token] = []
+    depth = 0
+    for m in _TOKEN.finditer(sql or ""):
+        kind = m.lastgroup if m.lastgroup != "tag" else "string"
+        text = m.group(0)
+        if kind == "op" and text == ")":
+            depth = max(0, depth - 1)
+        out.append(Token(kind, text, depth))
+        if kind == "op" and text == "(":
+            depth += 1
+    return out
+
+
+def _find_limit(tokens: List[Token], sig: List[int]) -> Tuple[Optional[Tuple[int, int]], Optional[int]]:
+    """Top-level LIMIT n [OFFSET m] / LIMIT m, n / FETCH FIRST n ROWS ONLY of the outer query."""
+    for pos, i in enumerate(sig):
+        tok = tokens[i]
+        if tok.depth != 0 or tok.kind != "word":
+            continue
+        word = tok.upper
+        if word == "LIMIT":
+            end = pos + 1
+            value = None
+            if end < len(sig) and tokens[sig[end]].kind == "number":
+                value = _int(tokens[sig[end]].text)
+                end += 1
+                # MySQL "LIMIT offset, count"
+                if end + 1 < len(sig) and tokens[sig[end]].text == "," and tokens[sig[end + 1]].kind == "number":
+                    value = _int(tokens[sig[end + 1]].text)
+                    end += 2
+            elif end < len(sig) and tokens[sig[end]].kind in ("word", "param"):
+                end += 1  # LIMIT ALL / LIMIT %s
+            return (i, sig[end - 1] + 1 if end - 1 > pos else i + 1), value
+        if word == "FETCH" and pos + 1 < len(sig) and tokens[sig[pos + 1]].upper in ("FIRST", "NEXT"):
+            end = pos + 2
+            value = 1
+            if end < len(sig) and tokens[sig[end]].kind == "number":
+                value = _int(tokens[sig[end]].text)
+                end += 1
+            while end < len(sig) and tokens[sig[end]].upper in ("ROW", "ROWS", "ONLY", "WITH", "TIES"):
+                end += 1
+            return (i, sig[end - 1] + 1), value
+    return None, None
+
+
+def _int(text: str) -> Optional[int]:
+    try:
+        return int(text)
+    except ValueError:
+        return None
+
+
+@functools.lru_cache(maxsize=2048)
+def analyze(sql: str) -> SqlInfo:
+    tokens = tokenize(sql)
+    sig = [i for i, t in enumerate(tokens) if t.kind not in ("ws", "comment")]
+    # A single trailing semicolon ends the statement; anything after it is another statement
+    body = sig
+    if body and tokens[body[-1]].text == ";":
+        body = body[:-1]
+    normalized = " ".join(tokens[i].upper if tokens[i].kind == "word" else tokens[i].text for i in body)
+    error = None
+    for t in tokens:
+        # MySQL runs /*! ... */ and treats "--x" as two minus signs; other engines see comments.
+        # "#" starts a comment only in MySQL (Postgres has # operators), so what follows is ambiguous
+        if t.kind == "comment" and (t.text.startswith(("/*!", "#")) or (len(t.text) > 2 and t.text.startswith("--") and not t.text[2].isspace())):
+            error = "ambiguous comment"
+            break
+    if error:
+        pass
+    elif not body:
+        error = "empty query"
+    elif tokens[body[0]].upper not in ("SELECT", "WITH", "("):
+        error = "only SELECT queries are allowed"
+    else:
+        depth = 0
+        words = [tokens[i].upper if tokens[i].kind == "word" else "" for i in body]
+        for pos, i in enumerate(body):
+            t = tokens[i]
+            if t.text == ";":
+                error = "multiple statements are not allowed"
+            elif t.kind == "word" and t.text.lower() in FORBIDDEN:
+                error = f"forbidden keyword: {t.upper}"
+            elif t.kind == "word" and t.text.lower() in FORBIDDEN_FUNCTIONS:
+                error = f"forbidden function: {t.text.lower()}"
+            elif words[pos] == "SHARE" and (words[pos - 1:pos] == ["FOR"] or words[max(0, pos - 2):pos] == ["FOR", "KEY"]):
+                # Row locks block writers (FOR UPDATE is already refused by its keyword)
+                error = "locking clause: FOR SHARE"
+            elif words[pos:pos + 4] == ["LOCK", "IN", "SHARE", "MODE"]:
+                error = "locking clause: LOCK IN SHARE MODE"
+            elif t.kind == "unterminated":
+                error = "unterminated literal or comment"
+            elif t.kind in ("string", "quoted") and ("\\'" in t.text or '\\"' in t.text):
+                # Dialects disagree on backslash escapes, so the literal's end is ambiguous
+                error = "ambiguous escape in literal"
+            elif t.kind == "op" and t.text in "()":
+                depth += 1 if t.text == "(" else -1
+                if depth < 0:
+                    error = "unbalanced parentheses"
+            if error:
+                break
+        if error is None and depth != 0:
+            error = "unbalanced parentheses"
+        if error is None and tokens[body[0]].upper == "WITH" and not any(tokens[i].upper == "SELECT" for i in body):
+            error = "only SELECT queries are allowed"
+    limit, value = _find_limit(tokens, body) if error is None else (None, None)
+    return SqlInfo(tuple(tokens), tuple(body), normalized, error, limit, value)
+
+
+def validate(sql: str) -> Optional[str]:
+    """None when `sql` is a single read-only SELECT, else the reason it is not."""
+    return analyze(sql or "").error
+
+
+def is_safe_select(sql: str) -> bool:
+    return analyze(sql or "").error is None
+
+
+def normalize(sql: str) -> str:
+    return analyze(sql or "").normalized
+
+
+def cache_key(sql: str) -> str:
+    """Stable key for result/plan caches: equal for queries differing only in case of
+    keywords, whitespace, comments or a trailing semicolon."""
+    return hashlib.sha256(normalize(sql).encode("utf-8")).hexdigest()
+
+
+def _body_text(info: SqlInfo) -> str:
+    """Original text up to the last significant token (drops trailing comments and semicolon)."""
+    if not info.significant:
+        return ""
+    return "".join(t.text for t in info.tokens[:info.significant[-1] + 1])
+
+
+def ensure_limit(sql: str, max_rows: int) -> str:
+    """Append LIMIT max_rows to the outer query, or clamp its own LIMIT/FETCH to max_rows."""
+    info = analyze(sql or "")
+    if info.limit is None:
+        return f"{_body_text(info)} LIMIT {int(max_rows)}"
+    start, end = info.limit
+    if info.limit_value is not None and info.limit_value <= max_rows:
+        return _body_text(info)
+    clause = "".join(t.text for t in info.tokens[start:end])
+    if info.tokens[start].upper == "FETCH":
+        new_clause = f"FETCH FIRST {int(max_rows)} ROWS ONLY"
+    elif "," in clause:
+        new_clause = re.sub(r"(,\s*)\S+$", lambda m: f"{m.group(1)}{int(max_rows)}", clause)
+    else:
+        # "LIMIT ALL", "LIMIT %s" or a value above the cap; a following OFFSET is kept
+        new_clause = f"LIMIT {int(max_rows)}"
+    head = "".join(t.text for t in info.tokens[:start])
+    tail = "".join(t.text for t in info.tokens[end:info.significant[-1] + 1]) if end <= info.significant[-1] else ""
+    return f"{head}{new_clause}{tail}"
+
+
+def without_limit(sql: str) -> Tuple[str, Optional[int]]:
+    """(query without its top-level LIMIT/FETCH clause, that clause's row count).
+
+    The count is None when there is no clause or it is not a literal; an OFFSET is
+    removed along with the LIMIT it belongs to.
+    """
+    info = analyze(sql or "")
+    if info.limit is None:
+        return _body_text(info), None
+    start, end = info.limit
+    rest = [i for i in info.significant if i >= end]
+    if rest and info.tokens[rest[0]].upper == "OFFSET":
+        end = rest[1] + 1 if len(rest) > 1 else rest[0] + 1
+    head = "".join(t.text for t in info.tokens[:start]).rstrip()
+    tail = "".join(t.text for t in info.tokens[end:info.significant[-1] + 1]) if end <= info.significant[-1] else ""
+    return (head + tail).rstrip(), info.limit_value
+
+
+def references(sql: str, name: str) -> bool:
+    """Whether `name` (optionally schema-qualified) appears as an identifier in the query."""
+    parts = [p.strip('"`[]').lower() for p in (name or "").split(".") if p]
+    if not parts:
+        return False
+    idents = [t.text.strip('"`[]').lower() for t in analyze(sql or "").tokens if t.kind in ("word", "quoted")]
+    return parts[-1] in idents
+
+
+_CLAUSE_WORDS = frozenset({
+    "WHERE", "GROUP", "ORDER", "LIMIT", "OFFSET", "FETCH", "HAVING", "WINDOW", "UNION", "INTERSECT", "EXCEPT",
+    "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "OUTER", "CROSS", "NATURAL", "ON", "USING",
+})
+
+
+def qualify_table(sql: str, table: str) -> str:
+    """Point the outer FROM at `table` when the query does not mention it. The generated
+    name is kept as the alias (unless the query already has one) so column references
+    stay valid."""
+    if not table or references(sql, table):
+        return sql
+    info = analyze(sql or "")
+    sig, toks = info.significant, info.tokens
+    for pos, i in enumerate(sig):
+        if toks[i].depth != 0 or toks[i].upper != "FROM":
+            continue
+        # Span of the (possibly dotted) table name after FROM
+        end = pos + 1
+        if end >= len(sig) or toks[sig[end]].kind not in ("word", "quoted"):
+            return sql
+        while end + 2 < len(sig) and toks[sig[end + 1]].text == "." and toks[sig[end + 2]].kind in ("word", "quoted"):
+            end += 2
+        name = toks[sig[end]]
+        following = toks[sig[end + 1]] if end + 1 < len(sig) else None
+        has_alias = following is not None and following.kind in ("word", "quoted") and following.upper not in _CLAUSE_WORDS
+        head = "".join(t.text for t in toks[:sig[pos + 1]])
+        tail = "".join(t.text for t in toks[sig[end] + 1:])
+        alias = "" if has_alias else f" {name.text}"
+        return f"{head}{table}{alias}{tail}"
+    return sql
+
+
+def first_statement(text: str) -> str:
+    """Text up to the first semicolon that is not inside a literal or comment."""
+    out = []
+    for t in tokenize(text or ""):
+        if t.kind == "op" and t.text == ";":
+            break
+        out.append(t.text)
+    return "".join(out).strip()
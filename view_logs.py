@@ -11,40 +11,43 @@ print("Application Logs")
 print("=" * 70)
 
 try:
-    response = requests.get(f"{BASE_URL}/logs?limit=30")
-    if response.status_code == 200:
+    response = requests.get(f"{BASE_URL}/logs", params={"limit": 30})
+    # Errors are filtered server-side so they are found even when older than the latest page
+    errors_response = requests.get(f"{BASE_URL}/logs", params={"limit": 30, "level": "ERROR,EXCEPTION"})
+    if response.status_code == 200 and errors_response.status_code == 200:
         data = response.json()
         logs = data.get('logs', [])
+        error_logs = errors_response.json().get('logs', [])
         
         print(f"\nTotal logs: {len(logs)}")
         print("\nRecent Errors and Important Events:")
         print("-" * 70)
         
-        for log in logs:
+        seen_ids = {log.get('id') for log in error_logs}
+        important = error_logs + [log for log in logs if log.get('id') not in seen_ids and 'error' in log.get('event', '').lower()]
+        for log in important:
             level = log.get('level', '')
             event = log.get('event', '')
             node = log.get('node', '')
             timestamp = log.get('timestamp', '')
             run_id = log.get('run_id', '')[:8]
             
-            # Show errors, exceptions, and important events
-            if level in ['ERROR', 'EXCEPTION'] or 'error' in event.lower():
-                print(f"\n[{level}] {timestamp}")
-                print(f"  Node: {node}")
-                print(f"  Event: {event}")
-                print(f"  Run ID: {run_id}...")
-                
-                # Parse and display data
-                data_str = log.get('data', '{}')
-                try:
-                    log_data = json.loads(data_str) if isinstance(data_str, str) else data_str
-                    if 'error' in log_data:
-                        print(f"  Error: {log_data['error']}")
-                    if 'tried' in log_data:
-                        print(f"  Tried queries: {log_data['tried']}")
-                except:
-                    print(f"  Data: {data_str[:200]}")
-        
+            print(f"\n[{level}] {timestamp}")
+            print(f"  Node: {node}")
+            print(f"  Event: {event}")
+            print(f"  Run ID: {run_id}...")
+            
+            # Parse and display data
+            data_str = log.get('data', '{}')
+            try:
+                log_data = json.loads(data_str) if isinstance(data_str, str) else data_str
+                if 'error' in log_data:
+                    print(f"  Error: {log_data['error']}")
+                if 'tried' in log_data:
+                    print(f"  Tried queries: {log_data['tried']}")
+            except:
+                print(f"  Data: {str(data_str)[:200]}")
+    
         print("\n" + "-" * 70)
         print("\nAll Recent Events (last 10):")
         print("-" * 70)
@@ -59,7 +62,7 @@ try:
             print(f"  [{symbol}] {node:12} | {event:30} | {level}")
             
     else:
-        print(f"Error: Could not fetch logs (HTTP {response.status_code})")
+        print(f"Error: Could not fetch logs (HTTP {response.status_code}/{errors_response.status_code})")
         
 except requests.exceptions.ConnectionError:
     print("\nError: Cannot connect to backend at http://localhost:8010")
@@ -72,5 +75,6 @@ print("\n" + "=" * 70)
 print("\nTo see more logs:")
 print("  - Open: http://localhost:8010/logs in browser")
 print("  - Or run: curl http://localhost:8010/logs?limit=50")
+print("  - Filter:  curl 'http://localhost:8010/logs?run_id=<id>&level=ERROR,EXCEPTION&before_id=<id>'")
 print("=" * 70)
 